@@ -7,6 +7,7 @@ from dotenv import load_dotenv
 from openai import OpenAI
 from aipolabs import ACI, meta_functions
 from aipolabs.types.functions import FunctionDefinitionFormat
+from backend.function_registry import FunctionRegistry
 
 
 # Load environment variables
@@ -29,8 +30,6 @@ tools_meta = [
     meta_functions.ACIExecuteFunction.SCHEMA,
 ]
 
-brave_search_function_definition = aci.functions.get_definition("BRAVE_SEARCH__WEB_SEARCH")
-
 function_defintions = ["BRAVE_SEARCH__NEWS_SEARCH", "BRAVE_SEARCH__WEB_SEARCH", "BRAVE_SEARCH__IMAGE_SEARCH", "BRAVE_SEARCH__VIDEO_SEARCH",
                        "NOTION__GET_PAGE", "NOTION__SEARCH_PAGES",
                        "GMAIL__MESSAGES_LIST", "GMAIL__MESSAGES_GET", "GMAIL__SEND_EMAIL", "GMAIL__THREADS_GET", "GMAIL__THREADS_LIST",
@@ -38,7 +37,14 @@ function_defintions = ["BRAVE_SEARCH__NEWS_SEARCH", "BRAVE_SEARCH__WEB_SEARCH",
                         "SCRAPYBARA__TAKE_SCREENSHOT", "SCRAPYBARA__START_INSTANCE", "SCRAPYBARA__STOP_INSTANCE", "SCRAPYBARA__BROWSER_GET_CURRENT_URL", "SCRAPYBARA__GET_STREAM_URL", "SCRAPYBARA__LIST_ALL_INSTANCES", 
                        ]
 
-function_definitions_list = [aci.functions.get_definition(function_definition) for function_definition in function_defintions]
+# fetched concurrently on the first run, then read from the local file
+function_registry = FunctionRegistry(
+    aci,
+    function_defintions,
+    path=os.path.join(os.path.dirname(os.path.abspath(__file__)), "function_definitions_all.json"),
+)
+function_definitions_list = function_registry.definitions
+brave_search_function_definition = function_definitions_list[function_defintions.index("BRAVE_SEARCH__WEB_SEARCH")]
 # print(tools_meta)
 
 tools_retrieved: list[dict] = []
@@ -0,0 +1,163 @@
+import re
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Size of the hashed feature space; collisions are rare enough at this size for short questions
+VECTOR_DIM = 4096
+# Word features count more than character trigrams, which mostly absorb typos and inflections
+WORD_WEIGHT = 2.0
+DEFAULT_THRESHOLD = 0.8
+TOKEN = re.compile(r"\w+")
+# Request fillers that paraphrases add or drop without changing what is asked. Question words
+# stay, since "Who founded X?" and "When was X founded?" share every other word; "what" opens
+# too many unrelated questions to count as shared content, so only ASKS looks at it.
+STOP_WORDS = frozenset(
+    "a an and any are about can could did do does find for from give how i in info information is it "
+    "its know look me my of on or please references show some source sources tell that the there this "
+    "to up want was what whats which will with would you".split()
+)
+NUMBER = re.compile(r"\d+(?:[.,]\d+)*")
+# Question words that ask for a different kind of answer; questions asking different ones never match
+ASKS = frozenset("who what when where why".split())
+
+
+def normalize_question(text: str) -> str:
+    return " ".join(TOKEN.findall(text.lower()))
+
+
+def asks(text: str) -> frozenset:
+    return ASKS.intersection(normalize_question(text).split())
+
+
+def embed(text: str, dim: int = VECTOR_DIM) -> np.ndarray:
+    """Unit-length hashed vector of a question's content words and their character trigrams."""
+    # One-letter tokens are mostly split-off possessives and contractions ("Tokyo's" -> "tokyo s")
+    words = [word for word in normalize_question(text).split() if len(word) > 1 and word not in STOP_WORDS]
+    vector = np.zeros(dim, dtype=np.float32)
+    if not words:
+        return vector
+    trigrams = [padded[i:i + 3] for padded in (f" {word} " for word in words) for i in range(len(padded) - 2)]
+    np.add.at(vector, [zlib.crc32(gram.encode()) % dim for gram in trigrams], 1.0)
+    np.add.at(vector, [zlib.crc32(b"w:" + word.encode()) % dim for word in words], WORD_WEIGHT)
+    return vector / np.linalg.norm(vector)
+
+
+class AnswerCache:
+    def __init__(
+        self,
+        threshold: float = DEFAULT_THRESHOLD,
+        max_entries: int = 1000,
+        max_age: float = 6 * 60 * 60,
+        dim: int = VECTOR_DIM,
+    ):
+        """Finished research answers, looked up by how similar a new question is to past ones.
+
+        Questions are embedded with a hashed word/trigram vectorizer and compared by cosine
+        similarity against every cached question in one matrix product, which stays well under
+        a millisecond at the sizes kept here. Questions that mention different numbers
+        ("in 2020" vs "in 2021") or ask different things ("who" vs "when") never match.
+
+        Args:
+            threshold: Minimum cosine similarity for a hit.
+            max_entries: Answers kept; the least recently used go first.
+            max_age: Seconds after which an answer is no longer served.
+            dim: Size of the hashed vectors.
+        """
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.dim = dim
+        self.hits = 0
+        self.misses = 0
+        self._vectors = np.zeros((max_entries, dim), dtype=np.float32)
+        # Row -> entry; rows of None are free
+        self._entries: List[Optional[Dict[str, Any]]] = [None] * max_entries
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return sum(entry is not None for entry in self._entries)
+
+    def lookup(self, question: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        """Return ``(entry, similarity)`` for the closest fresh answer above the threshold."""
+        vector = embed(question, self.dim)
+        numbers = set(NUMBER.findall(question))
+        question_words = asks(question)
+        now = time.time()
+        with self._lock:
+            similarities = self._vectors @ vector
+            candidates = np.flatnonzero(similarities >= self.threshold)
+            for row in candidates[np.argsort(-similarities[candidates])]:
+                similarity = float(similarities[row])
+                entry = self._entries[row]
+                if entry is None:
+                    continue
+                if now - entry["created_at"] > self.max_age:
+                    self._remove(row)
+                    continue
+                if entry["numbers"] != numbers:
+                    continue
+                # A question that names no question word ("Tesla founder") may match either
+                if entry["asks"] and question_words and entry["asks"] != question_words:
+                    continue
+                entry["used_at"] = now
+                self.hits += 1
+                return entry, similarity
+            self.misses += 1
+        return None
+
+    def store(self, question: str, answer: Dict[str, Any]):
+        """Cache ``answer`` for ``question``, replacing the entry of an equivalent question."""
+        vector = embed(question, self.dim)
+        if not vector.any():
+            return
+        now = time.time()
+        entry = {
+            "question": question,
+            "answer": answer,
+            "numbers": set(NUMBER.findall(question)),
+            "asks": asks(question),
+            "created_at": now,
+            "used_at": now,
+        }
+        with self._lock:
+            row = self._row_for(vector, now)
+            self._vectors[row] = vector
+            self._entries[row] = entry
+
+    def clear(self):
+        with self._lock:
+            self._vectors[:] = 0
+            self._entries = [None] * self.max_entries
+            self.hits = self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+    def _row_for(self, vector: np.ndarray, now: float) -> int:
+        """Row of an entry with the same content words, else a free or expired row, else the LRU one."""
+        same = np.flatnonzero(self._vectors @ vector > 0.999)
+        if len(same):
+            return int(same[0])
+        oldest = 0
+        for row, entry in enumerate(self._entries):
+            if entry is None or now - entry["created_at"] > self.max_age:
+                return row
+            if entry["used_at"] < self._entries[oldest]["used_at"]:
+                oldest = row
+        return oldest
+
+    def _remove(self, row: int):
+        self._vectors[row] = 0
+        self._entries[row] = None
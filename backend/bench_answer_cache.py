@@ -0,0 +1,166 @@
+"""Answer cache benchmark: hit rate and lookup latency on a replayed log of paraphrased questions.
+
+Questions are drawn from a Zipf-like topic distribution and reworded at random (fillers,
+dropped question words, reordering, case, punctuation, a typo). Topics that differ only in
+one entity or number test for false hits, as do question pairs that differ only in the question
+word. A miss stores the question as a finished session.
+Finally, time to the final frame is compared for a miss and a hit through the stubbed pipeline.
+
+    python bench_answer_cache.py --queries 5000
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from answer_cache import AnswerCache
+from bench_stubs import FakeACI, FakeGrok, FakeOpenAI, load_main
+
+SUBJECTS = ["Tokyo", "Osaka", "Berlin", "Lagos", "Lima", "Toronto", "Mumbai", "Cairo", "Sydney", "Madrid"]
+ATTRIBUTES = ["population", "GDP", "average rainfall", "tallest building", "air quality"]
+YEARS = ["2020", "2023"]
+PREFIXES = ["", "", "Can you tell me ", "Please find sources on ", "I want to know ", "Tell me "]
+# Same words, different question: none may be answered from the other's entry
+NEAR_MISSES = [
+    ("Who founded Tesla?", "When was Tesla founded?"),
+    ("Where was Einstein born?", "When was Einstein born?"),
+    ("Why did the Roman Empire fall?", "When did the Roman Empire fall?"),
+    ("Who wrote Hamlet?", "When was Hamlet written?"),
+    ("Where is the Louvre?", "What is the Louvre?"),
+    ("Who won the 2022 World Cup?", "Where was the 2022 World Cup?"),
+]
+# Rewordings of one question that must still hit
+REWORDINGS = [
+    ("Who founded Tesla?", "Can you tell me who founded Tesla"),
+    ("When was Einstein born?", "tell me when einstein was born please"),
+]
+
+
+def topics():
+    return [(attribute, subject, year) for attribute in ATTRIBUTES for subject in SUBJECTS for year in YEARS]
+
+
+def paraphrase(topic, rng: random.Random) -> str:
+    attribute, subject, year = topic
+    text = rng.choice([
+        f"What is the {attribute} of {subject} in {year}?",
+        f"what's the {attribute} of {subject} in {year}",
+        f"{attribute} of {subject} {year}",
+        f"{subject} {attribute} in {year}",
+        f"What was {subject}'s {attribute} in {year}?",
+    ])
+    text = rng.choice(PREFIXES) + text
+    if rng.random() < 0.3:
+        text = text.upper() if rng.random() < 0.2 else text.lower()
+    if rng.random() < 0.2:
+        # Swap two letters in the longest word
+        words = text.split()
+        index = max(range(len(words)), key=lambda i: len(words[i]))
+        word = words[index]
+        if len(word) > 4:
+            position = rng.randrange(1, len(word) - 2)
+            words[index] = word[:position] + word[position + 1] + word[position] + word[position + 2:]
+        text = " ".join(words)
+    return text
+
+
+def replay(queries: int, threshold: float, seed: int = 7):
+    rng = random.Random(seed)
+    all_topics = topics()
+    weights = [1 / (rank + 1) for rank in range(len(all_topics))]
+    cache = AnswerCache(threshold=threshold, max_entries=len(all_topics) * 4)
+    seen = set()
+    hits = false_hits = repeat_queries = 0
+    latencies = []
+    for _ in range(queries):
+        topic = rng.choices(all_topics, weights)[0]
+        question = paraphrase(topic, rng)
+        repeat_queries += topic in seen
+        start = time.perf_counter()
+        cached = cache.lookup(question)
+        latencies.append(time.perf_counter() - start)
+        seen.add(topic)
+        if cached is None:
+            cache.store(question, {"topic": topic, "sources": []})
+        else:
+            hits += 1
+            false_hits += cached[0]["answer"]["topic"] != topic
+    latencies.sort()
+    return {
+        "hit_rate": hits / queries,
+        "reachable": repeat_queries / queries,
+        "false_hits": false_hits,
+        "entries": len(cache),
+        "p50_ms": 1000 * statistics.median(latencies),
+        "p99_ms": 1000 * latencies[int(0.99 * (len(latencies) - 1))],
+    }
+
+
+def question_words(threshold: float):
+    """False hits among NEAR_MISSES (both ways round) and misses among REWORDINGS."""
+    false_hits = []
+    for first, second in NEAR_MISSES + [(second, first) for first, second in NEAR_MISSES]:
+        cache = AnswerCache(threshold=threshold)
+        cache.store(first, {"sources": []})
+        if cache.lookup(second) is not None:
+            false_hits.append((first, second))
+    misses = []
+    for first, second in REWORDINGS:
+        cache = AnswerCache(threshold=threshold)
+        cache.store(first, {"sources": []})
+        if cache.lookup(second) is None:
+            misses.append((first, second))
+    return false_hits, misses
+
+
+async def time_to_final(main, message: str) -> float:
+    start = time.perf_counter()
+    final = asyncio.Event()
+
+    async def send(event):
+        if event["type"] == "final":
+            final.set()
+
+    task = asyncio.create_task(main.run_research(message, send))
+    await final.wait()
+    elapsed = time.perf_counter() - start
+    await task
+    return elapsed
+
+
+async def end_to_end(main):
+    main.answer_cache.clear()
+    miss = await time_to_final(main, "What is the population of Tokyo in 2020?")
+    hit = await time_to_final(main, "tokyo population 2020")
+    return miss, hit
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=5000)
+    parser.add_argument("--threshold", type=float, nargs="*", default=[0.7, 0.8, 0.9])
+    args = parser.parse_args()
+
+    for threshold in args.threshold:
+        result = replay(args.queries, threshold)
+        print(
+            f"threshold {threshold:.2f}: hit rate {result['hit_rate']:.1%} "
+            f"(repeated topics {result['reachable']:.1%}), false hits {result['false_hits']}, "
+            f"{result['entries']} entries, lookup p50 {result['p50_ms']:.3f}ms p99 {result['p99_ms']:.3f}ms"
+        )
+        false_hits, misses = question_words(threshold)
+        assert not false_hits, false_hits
+        assert not misses, misses
+        print(f"  {2 * len(NEAR_MISSES)} questions differing in one question word: no false hits")
+
+    main = load_main()
+    main.openai = FakeOpenAI(0.2, 4)
+    main.grok_client = FakeGrok(0.2)
+    main.aci = FakeACI(0.3)
+    miss, hit = asyncio.run(end_to_end(main))
+    print(f"time to final: miss {miss:.2f}s, hit {hit * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,49 @@
+"""Slow-client benchmark: a research job should finish in the same time however slow the socket is.
+
+Also reports how many events were coalesced into how many frames, and the bytes on the wire.
+
+    python bench_backpressure.py --client-latency 0.05
+"""
+import argparse
+import asyncio
+import time
+
+from bench_stubs import FakeACI, FakeGrok, FakeOpenAI, FakeWebSocket, load_main
+
+
+async def run_session(main, client_latency: float):
+    main.search_cache.clear()
+    main.answer_cache.clear()
+    main.job_queue.start()
+    ws = FakeWebSocket("question", latency=client_latency)
+    start = time.perf_counter()
+    await main.websocket_endpoint(ws)
+    delivered = time.perf_counter() - start
+    await main.job_queue.stop()
+    job = main.job_queue.store.get_job(ws.sent[0]["job_id"])
+    return job["updated_at"] - job["created_at"], delivered, ws
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--client-latency", type=float, default=0.05, help="seconds per frame for the slow client")
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--aci-latency", type=float, default=0.3)
+    parser.add_argument("--tool-calls", type=int, default=4)
+    args = parser.parse_args()
+
+    main = load_main()
+    main.openai = FakeOpenAI(args.llm_latency, args.tool_calls)
+    main.grok_client = FakeGrok(0.2)
+    main.aci = FakeACI(args.aci_latency)
+
+    for label, latency in (("fast client", 0.0), ("slow client", args.client_latency)):
+        job_time, delivered, ws = asyncio.run(run_session(main, latency))
+        print(
+            f"{label}: job {job_time:.2f}s, delivered {delivered:.2f}s, "
+            f"{len(ws.sent)} events in {ws.frames} frames, {ws.bytes / 1024:.1f} KiB"
+        )
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,94 @@
+"""HTTP /process and /process/batch throughput against stubbed backends.
+
+Serves the app with uvicorn, posts one query to /process, then a batch of ``--queries``
+questions (a share of them repeated, as in a re-verification run) to /process/batch, both as
+one JSON response and as NDJSON, and reports queries per second and time to the first streamed
+result.
+
+    python bench_batch.py --queries 1000 --concurrency 32
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+from bench_stubs import FakeACI, FakeGrok, FakeOpenAI, load_main
+from rate_limit import BACKGROUND, INTERACTIVE
+from replay import serve_in_thread
+
+
+def questions(count: int, repeated: float):
+    distinct = max(1, int(count * (1 - repeated)))
+    return [f"question {i % distinct}" for i in range(count)]
+
+
+async def run(main, base_url: str, messages, concurrency: int):
+    async with httpx.AsyncClient(base_url=base_url, timeout=None) as client:
+        single = await client.post("/process", json={"message": "single question"})
+        assert single.status_code == 200 and single.json()["sources"], single.text
+        assert main.job_queue.store.get_job(single.json()["job_id"])["priority"] == INTERACTIVE
+
+        report = {}
+        for stream in (False, True):
+            main.search_cache.clear()
+            main.answer_cache.clear()
+            body = {"messages": messages, "concurrency": concurrency, "stream": stream}
+            start = time.perf_counter()
+            first = None
+            if stream:
+                results = []
+                async with client.stream("POST", "/process/batch", json=body) as response:
+                    async for line in response.aiter_lines():
+                        if line:
+                            first = first or time.perf_counter() - start
+                            results.append(json.loads(line))
+                assert sorted(row["index"] for row in results) == list(range(len(messages)))
+            else:
+                results = (await client.post("/process/batch", json=body)).json()["results"]
+            elapsed = time.perf_counter() - start
+            assert all(row["status"] == "done" and row["sources"] for row in results), results[:3]
+            # Batch queries must not compete with interactive users for the providers
+            assert all(main.job_queue.store.get_job(row["job_id"])["priority"] == BACKGROUND for row in results)
+            report["ndjson" if stream else "json"] = (
+                elapsed,
+                first,
+                sum(row.get("joined", False) for row in results),
+                sum(row.get("cached", False) for row in results),
+            )
+    return report
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--repeated", type=float, default=0.2, help="share of queries repeating an earlier one")
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--aci-latency", type=float, default=0.02)
+    args = parser.parse_args()
+
+    main = load_main()
+    main.openai = FakeOpenAI(args.llm_latency, 2)
+    main.grok_client = FakeGrok(args.llm_latency)
+    main.aci = FakeACI(args.aci_latency)
+    main.PROCESS_BATCH_CONCURRENCY = max(main.PROCESS_BATCH_CONCURRENCY, args.concurrency)
+
+    # The server's lifespan starts the job queue on the server's loop
+    server, base_url = serve_in_thread(main.app)
+    messages = questions(args.queries, args.repeated)
+    report = asyncio.run(run(main, base_url, messages, args.concurrency))
+    server.should_exit = True
+    for label, (elapsed, first, joined, cached) in report.items():
+        line = (
+            f"{label}: {len(messages)} queries in {elapsed:.2f}s ({len(messages) / elapsed:.0f} queries/s), "
+            f"{joined} joined a running job, {cached} answered from the cache"
+        )
+        if first is not None:
+            line += f", first result after {first * 1000:.0f}ms"
+        print(line)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,51 @@
+"""Load benchmark: N concurrent WebSocket sessions against stubbed backends.
+
+With non-blocking I/O, N sessions should finish in roughly the time of one.
+
+    python bench_concurrency.py --sessions 20
+"""
+import argparse
+import asyncio
+import time
+
+from bench_stubs import FakeACI, FakeGrok, FakeOpenAI, FakeWebSocket, load_main
+
+
+async def run_sessions(main, sessions: int) -> float:
+    sockets = [FakeWebSocket(f"question {i}") for i in range(sessions)]
+    # Every session searches the same stub queries, so start cold to measure the backends
+    main.search_cache.clear()
+    main.answer_cache.clear()
+    main.job_queue.start()
+    start = time.perf_counter()
+    await asyncio.gather(*(main.websocket_endpoint(ws) for ws in sockets))
+    elapsed = time.perf_counter() - start
+    await main.job_queue.stop()
+    for ws in sockets:
+        assert ws.sent[-1]["type"] == "done", ws.sent[-1]
+        assert not any(event["type"] == "error" for event in ws.sent), ws.sent
+    return elapsed
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--aci-latency", type=float, default=0.3)
+    parser.add_argument("--grok-latency", type=float, default=0.2)
+    parser.add_argument("--tool-calls", type=int, default=4, help="parallel tool calls per model turn")
+    args = parser.parse_args()
+
+    main = load_main()
+    main.openai = FakeOpenAI(args.llm_latency, args.tool_calls)
+    main.grok_client = FakeGrok(args.grok_latency)
+    main.aci = FakeACI(args.aci_latency)
+
+    single = asyncio.run(run_sessions(main, 1))
+    many = asyncio.run(run_sessions(main, args.sessions))
+    print(f"1 session:  {single:.2f}s")
+    print(f"{args.sessions} sessions: {many:.2f}s ({many / single:.2f}x a single session)")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,98 @@
+"""Prompt size per turn over a simulated 10-turn session, before and after context management.
+
+"before" appends every raw tool result with json.dumps and resends the whole history;
+"after" uses ContextWindow.tool_message and ContextWindow.fit like websocket_endpoint does.
+
+    python bench_context.py --turns 10 --budget 12000
+"""
+import argparse
+import json
+
+from bench_stubs import make_tool_call
+from context_window import ContextWindow
+
+
+def fake_brave_result(turn: int, call: int, results: int) -> dict:
+    """A search response shaped like BRAVE_SEARCH__WEB_SEARCH, including the fields nobody reads."""
+    return {
+        "success": True,
+        "data": {
+            "type": "search",
+            "query": {"original": f"query {turn}.{call}", "more_results_available": True},
+            "web": {
+                "type": "search",
+                "results": [
+                    {
+                        "title": f"Result {turn}.{call}.{i} about the story",
+                        "url": f"https://news{i}.example.com/{turn}/{call}/article-{i}",
+                        "is_source_local": False,
+                        "is_source_both": False,
+                        "description": "A fairly long snippet describing the article in detail. " * 6,
+                        "page_age": "2025-02-01T10:00:00",
+                        "profile": {
+                            "name": f"News {i}",
+                            "url": f"https://news{i}.example.com",
+                            "long_name": f"news{i}.example.com",
+                            "img": f"https://imgs.search.brave.com/{'x' * 80}",
+                        },
+                        "language": "en",
+                        "family_friendly": True,
+                        "type": "search_result",
+                        "meta_url": {
+                            "scheme": "https",
+                            "netloc": f"news{i}.example.com",
+                            "hostname": f"news{i}.example.com",
+                            "favicon": f"https://imgs.search.brave.com/{'y' * 80}",
+                            "path": f"› {turn} › {call}",
+                        },
+                        "thumbnail": {"src": f"https://imgs.search.brave.com/{'z' * 80}", "original": "https://example.com/a.jpg"},
+                        "extra_snippets": ["Another snippet from the page body. " * 3] * 3,
+                    }
+                    for i in range(results)
+                ],
+            },
+        },
+    }
+
+
+def simulate(turns: int, calls_per_turn: int, results: int, window: ContextWindow, managed: bool) -> list[int]:
+    base = [{"role": "system", "content": "You are a source finding agent."}, {"role": "user", "content": "question"}]
+    chat_history: list[dict] = []
+    sizes = []
+    for turn in range(turns):
+        messages = base + chat_history
+        sizes.append(window.count(window.fit(messages) if managed else messages))
+
+        tool_calls = [make_tool_call(f"call_{turn}_{c}", "BRAVE_SEARCH__WEB_SEARCH", {"query": f"q{turn}.{c}"}) for c in range(calls_per_turn)]
+        chat_history.append({"role": "assistant", "tool_calls": tool_calls})
+        for call, tool_call in enumerate(tool_calls):
+            result = fake_brave_result(turn, call, results)
+            if managed:
+                chat_history.append(window.tool_message(tool_call.id, result))
+            else:
+                chat_history.append({"role": "tool", "tool_call_id": tool_call.id, "content": json.dumps(result)})
+    return sizes
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--calls-per-turn", type=int, default=2)
+    parser.add_argument("--results", type=int, default=10)
+    parser.add_argument("--budget", type=int, default=12000)
+    args = parser.parse_args()
+
+    window = ContextWindow(budget_tokens=args.budget)
+    before = simulate(args.turns, args.calls_per_turn, args.results, window, managed=False)
+    after = simulate(args.turns, args.calls_per_turn, args.results, window, managed=True)
+
+    # Without tiktoken the counts are the len/4 fallback, not real tokens
+    print(f"token counts: {window.counter.method}")
+    print(f"{'turn':>4} {'before':>10} {'after':>10}")
+    for turn, (b, a) in enumerate(zip(before, after), 1):
+        print(f"{turn:>4} {b:>10} {a:>10}")
+    print(f"{'sum':>4} {sum(before):>10} {sum(after):>10}  ({sum(after) / sum(before):.0%} of the prompt tokens)")
+
+
+if __name__ == "__main__":
+    main_cli()
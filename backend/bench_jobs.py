@@ -0,0 +1,227 @@
+"""Job queue checks: failing runs, delta batching, a slow store, dead workers, stuck jobs and priorities.
+
+A run that fails with SDK objects in its error event must still reach its subscriber and end
+FAILED, and a resume request with a position that isn't a sequence number must get an error
+and ``done`` rather than drop the connection. Streamed deltas must be merged into a few
+writes. With every store write slowed down, the event loop must stay responsive because the
+store runs on its own thread. A job left running by a worker that died must be picked up
+again once its lease lapses (and failed for good after the last attempt), and a subscriber to
+a job nobody runs must give up after ``max_idle`` rather than wait forever. Jobs submitted at
+a more urgent priority must be claimed before older, less urgent ones.
+
+    python bench_jobs.py --tokens 500
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from bench_stubs import FakeACI, FakeCompletions, FakeGrok, FakeOpenAI, FakeWebSocket, load_main, make_tool_call
+from jobs import DONE, FAILED, RUNNING, JobQueue, JobStore
+
+
+async def follow(queue: JobQueue, job_id: str):
+    return [event async for _, event in queue.subscribe(job_id)]
+
+
+async def failing_run():
+    async def runner(message, send, job_id, priority=0):
+        await send({"type": "progress", "content": "Searching..."})
+        await send({
+            "type": "error",
+            "content": "upstream broke",
+            "chat_history": [{"role": "assistant", "tool_calls": [make_tool_call("call_0", "SEARCH", {"q": message})]}],
+        })
+        raise RuntimeError("upstream broke")
+
+    queue = JobQueue(JobStore(), runner, workers=1)
+    queue.start()
+    job_id = await queue.submit("question")
+    events = await asyncio.wait_for(follow(queue, job_id), timeout=5)
+    await queue.stop()
+    assert [event["type"] for event in events] == ["progress", "error", "error"], events
+    assert isinstance(events[1]["chat_history"][0]["tool_calls"][0], str), events[1]
+    assert queue.store.get_job(job_id)["status"] == FAILED
+    print(f"failing run: {len(events)} events reached the subscriber, job {FAILED}")
+
+
+class FailingCompletions(FakeCompletions):
+    """Answers the first turn with tool calls, then fails."""
+
+    async def create(self, messages, stream=False, **kwargs):
+        if self.calls:
+            raise RuntimeError("model unavailable")
+        return await super().create(messages, stream=stream, **kwargs)
+
+
+async def failing_research(main):
+    main.search_cache.clear()
+    main.answer_cache.clear()
+    openai = main.openai
+    main.openai = FakeOpenAI(0.01, 2)
+    main.openai.chat.completions = FailingCompletions(0.01, 2)
+    main.job_queue.start()
+    ws = FakeWebSocket("a question that fails")
+    await main.websocket_endpoint(ws)
+    await main.job_queue.stop()
+    main.openai = openai
+    *_, error, done = ws.sent
+    assert error["type"] == "error" and error["content"] == "model unavailable", error
+    assert any(message.get("tool_calls") for message in error["chat_history"]), error
+    assert done == {"type": "done", "job_id": ws.sent[0]["job_id"]}, done
+    job = main.job_queue.store.get_job(ws.sent[0]["job_id"])
+    assert job is not None and job["status"] in (DONE, FAILED), job
+    print("failing research: error event with the tool-call history stored and delivered")
+
+
+async def bad_resume(main):
+    for after in ("abc", None, -1):
+        ws = FakeWebSocket(json.dumps({"type": "resume", "job_id": "some-job", "after": after}))
+        await main.websocket_endpoint(ws)
+        error, done = ws.sent
+        assert error["type"] == "error" and "Invalid resume position" in error["content"], error
+        assert done == {"type": "done", "job_id": "some-job"}, done
+    print("bad resume: an invalid position got an error and done rather than a dropped connection")
+
+
+async def streamed_deltas(tokens: int):
+    async def runner(message, send, job_id, priority=0):
+        for index in range(tokens):
+            await send({"type": "delta", "id": "answer", "content": f"t{index} "})
+            await asyncio.sleep(0.001)
+        await send({"type": "message", "content": "done"})
+
+    store = JobStore()
+    writes = []
+    append_events = store.append_events
+    store.append_events = lambda job_id, events: writes.append(len(events)) or append_events(job_id, events)
+    queue = JobQueue(store, runner, workers=1)
+    queue.start()
+    job_id = await queue.submit("question")
+    events = await asyncio.wait_for(follow(queue, job_id), timeout=30)
+    await queue.stop()
+    text = "".join(event["content"] for event in events if event["type"] == "delta")
+    assert text == "".join(f"t{index} " for index in range(tokens)), text[:80]
+    assert events[-1]["type"] == "message"
+    assert len(writes) < tokens / 5, len(writes)
+    print(f"deltas: {tokens} tokens in {len(writes)} writes, {len(events)} stored events")
+
+
+async def slow_store(path: str, jobs: int, delay: float):
+    async def runner(message, send, job_id, priority=0):
+        for index in range(20):
+            await send({"type": "delta", "id": "answer", "content": f"t{index} "})
+            await asyncio.sleep(0.005)
+        await send({"type": "message", "content": "done"})
+
+    store = JobStore(path)
+    append_events = store.append_events
+    # A busy disk or another process holding the write lock
+    store.append_events = lambda job_id, events: time.sleep(delay) or append_events(job_id, events)
+    queue = JobQueue(store, runner, workers=jobs)
+    queue.start()
+    lags = []
+    stop = asyncio.Event()
+
+    async def ticker():
+        while not stop.is_set():
+            before = time.perf_counter()
+            await asyncio.sleep(0.005)
+            lags.append(time.perf_counter() - before - 0.005)
+
+    tick = asyncio.create_task(ticker())
+    job_ids = [await queue.submit(f"question {index}") for index in range(jobs)]
+    results = await asyncio.wait_for(asyncio.gather(*(follow(queue, job_id) for job_id in job_ids)), timeout=60)
+    stop.set()
+    await tick
+    await queue.stop()
+    assert all(events[-1]["type"] == "message" for events in results)
+    assert max(lags) < delay, max(lags)
+    print(f"slow store: {jobs} jobs with {delay * 1000:.0f}ms writes, worst event-loop lag {max(lags) * 1000:.1f}ms")
+
+
+async def dead_worker(path: str):
+    async def runner(message, send, job_id, priority=0):
+        await send({"type": "message", "content": f"answer to {message}"})
+
+    store = JobStore(path)
+    # Claimed by workers that then died: one job was already tried twice, the other once
+    exhausted = store.create_job("exhausted")
+    assert store.claim_next("dead-1", lease=0.01)[0] == exhausted
+    time.sleep(0.05)
+    assert store.claim_next("dead-2", lease=0.2) == (exhausted, "exhausted", 2, 0)
+    retried = store.create_job("retried")
+    assert store.claim_next("dead-3", lease=0.2)[0] == retried
+    assert store.get_job(retried)["status"] == RUNNING
+
+    queue = JobQueue(store, runner, workers=2, lease=0.5, max_attempts=2)
+    queue.start()
+    start = time.perf_counter()
+    events = await asyncio.wait_for(follow(queue, retried), timeout=10)
+    recovered = time.perf_counter() - start
+    lost = await asyncio.wait_for(follow(queue, exhausted), timeout=10)
+    await queue.stop()
+    job = store.get_job(retried)
+    assert job["status"] == DONE and job["attempts"] == 2, job
+    assert events[0]["type"] == "progress" and "attempt 2" in events[0]["content"], events
+    assert events[-1]["content"] == "answer to retried"
+    assert store.get_job(exhausted)["status"] == FAILED and lost[-1]["type"] == "error", lost
+    print(f"dead worker: its job was rerun after {recovered:.2f}s; a job out of attempts failed")
+
+
+async def stuck_job(max_idle: float):
+    queue = JobQueue(JobStore(), None, workers=0, max_idle=max_idle)
+    queue.start()
+    job_id = await queue.submit("nobody runs this")
+    start = time.perf_counter()
+    events = await asyncio.wait_for(follow(queue, job_id), timeout=max_idle * 10)
+    waited = time.perf_counter() - start
+    await queue.stop()
+    assert [event["type"] for event in events] == ["error"], events
+    assert queue.store.events_since(job_id) == []
+    assert max_idle <= waited < max_idle + 1, waited
+    print(f"stuck job: subscriber gave up after {waited:.2f}s")
+
+
+async def priority_order(path: str):
+    store = JobStore(path)
+    background = store.create_job("batch query", priority=2)
+    interactive = store.create_job("user question", priority=0)
+    assert store.claim_next("worker")[::3] == (interactive, 0)
+    assert store.claim_next("worker")[::3] == (background, 2)
+    # A user asking what a batch is already researching makes that job urgent
+    queued, joined = store.create_or_join("repeated", "key", max_age=60, priority=2)
+    assert store.create_or_join("repeated", "key", max_age=60, priority=0) == (queued, True)
+    assert store.create_job("later batch query", priority=2)
+    assert store.claim_next("worker")[::3] == (queued, 0)
+    print("priorities: an interactive job was claimed before an older batch job")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokens", type=int, default=500)
+    parser.add_argument("--jobs", type=int, default=20)
+    parser.add_argument("--write-delay", type=float, default=0.02, help="seconds added to every store write")
+    parser.add_argument("--max-idle", type=float, default=0.3)
+    args = parser.parse_args()
+
+    main = load_main()
+    main.openai = FakeOpenAI(0.01, 2)
+    main.grok_client = FakeGrok(0.01)
+    main.aci = FakeACI(0.01)
+
+    directory = tempfile.mkdtemp()
+    asyncio.run(failing_run())
+    asyncio.run(failing_research(main))
+    asyncio.run(bad_resume(main))
+    asyncio.run(streamed_deltas(args.tokens))
+    asyncio.run(slow_store(os.path.join(directory, "slow.db"), args.jobs, args.write_delay))
+    asyncio.run(dead_worker(os.path.join(directory, "dead.db")))
+    asyncio.run(stuck_job(args.max_idle))
+    asyncio.run(priority_order(os.path.join(directory, "priority.db")))
+
+
+if __name__ == "__main__":
+    main_cli()
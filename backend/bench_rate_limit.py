@@ -0,0 +1,127 @@
+"""Rate-limit scheduler simulation on a fake clock: 429s, failed sessions and queueing by priority.
+
+Sessions arrive one per second. Each makes an interactive first call, then follow-up calls in
+sequence while background calls (Grok re-queries) run alongside, against a provider that allows
+``--rpm`` requests per minute and answers 429 above that. Runs in virtual time, so it is instant
+and deterministic. Finally a call that is answered 429 several times before it succeeds must
+leave the token bucket charged once, not once per attempt.
+
+    python bench_rate_limit.py --sessions 40 --rpm 60
+"""
+import argparse
+import asyncio
+import statistics
+
+from bench_stubs import FakeClock, FakeProvider, FakeRateLimitError
+from rate_limit import BACKGROUND, FOLLOW_UP, INTERACTIVE, Limit, RateLimitExceeded, Scheduler, session
+
+FOLLOW_UPS = 4
+BACKGROUND_CALLS = 2
+
+
+async def simulate(sessions: int, rpm: int, use_scheduler: bool):
+    clock = FakeClock()
+    provider = FakeProvider(clock, rpm)
+    scheduler = Scheduler({"llm": Limit(requests_per_minute=rpm)}, clock=clock) if use_scheduler else None
+    waits = {INTERACTIVE: [], FOLLOW_UP: [], BACKGROUND: []}
+    durations = []
+    failed = 0
+
+    async def call(priority: int):
+        start = clock.monotonic()
+        if scheduler is None:
+            await provider.request()
+        else:
+            await scheduler.call("llm", provider.request, priority)
+        # Time spent queued or backing off, on top of the provider's own latency
+        waits[priority].append(clock.monotonic() - start - provider.latency)
+
+    async def run_session(index: int):
+        nonlocal failed
+        await clock.sleep(index)
+        session.set(f"session-{index}")
+        start = clock.monotonic()
+        background = []
+        try:
+            await call(INTERACTIVE)
+            background = [asyncio.ensure_future(call(BACKGROUND)) for _ in range(BACKGROUND_CALLS)]
+            for _ in range(FOLLOW_UPS):
+                await call(FOLLOW_UP)
+            for result in await asyncio.gather(*background, return_exceptions=True):
+                if isinstance(result, Exception):
+                    raise result
+            durations.append(clock.monotonic() - start)
+        except Exception:
+            failed += 1
+            await asyncio.gather(*background, return_exceptions=True)
+
+    await clock.run(asyncio.gather(*(run_session(i) for i in range(sessions))))
+    return provider.rejected, failed, waits, durations
+
+
+async def retried_tokens(tpm: int, tokens: int, rejections: int) -> tuple[float, float]:
+    """Token balance after one call of ``tokens`` that gets ``rejections`` 429s before succeeding, and the time it took."""
+    clock = FakeClock()
+    scheduler = Scheduler({"llm": Limit(tokens_per_minute=tpm, burst=1.0)}, clock=clock)
+    attempts = 0
+
+    async def request():
+        nonlocal attempts
+        attempts += 1
+        if attempts <= rejections:
+            raise FakeRateLimitError(1.0)
+        return "ok"
+
+    await clock.run(scheduler.call("llm", request, tokens=tokens))
+    return scheduler.limiters["llm"].tokens.tokens, clock.monotonic()
+
+
+async def exhausted_tokens(tpm: int, tokens: int) -> float:
+    """Token balance after a call that is answered 429 until its retries run out."""
+    clock = FakeClock()
+    scheduler = Scheduler({"llm": Limit(tokens_per_minute=tpm, burst=1.0, max_retries=2)}, clock=clock)
+
+    async def request():
+        raise FakeRateLimitError(1.0)
+
+    try:
+        await clock.run(scheduler.call("llm", request, tokens=tokens))
+        raise AssertionError("RateLimitExceeded was not raised")
+    except RateLimitExceeded:
+        pass
+    return scheduler.limiters["llm"].tokens.tokens
+
+
+def describe(values) -> str:
+    if not values:
+        return "-"
+    ordered = sorted(values)
+    return f"p50 {statistics.median(ordered):.1f}s p95 {ordered[int(0.95 * (len(ordered) - 1))]:.1f}s"
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=40)
+    parser.add_argument("--rpm", type=int, default=60)
+    args = parser.parse_args()
+
+    for label, use_scheduler in (("direct", False), ("scheduler", True)):
+        rejected, failed, waits, durations = asyncio.run(simulate(args.sessions, args.rpm, use_scheduler))
+        print(f"{label}: {rejected} responses were 429, {failed}/{args.sessions} sessions failed")
+        if use_scheduler:
+            for name, priority in (("interactive", INTERACTIVE), ("follow-up", FOLLOW_UP), ("background", BACKGROUND)):
+                print(f"  {name} wait: {describe(waits[priority])}")
+            print(f"  session duration: {describe(durations)}")
+
+    tpm, tokens, rejections = 60000, 10000, 3
+    balance, elapsed = asyncio.run(retried_tokens(tpm, tokens, rejections))
+    # Charged once; the refill during the backoff may only add to that
+    assert tpm - tokens <= balance <= tpm - tokens + elapsed * tpm / 60, (balance, elapsed)
+    print(f"retries: a {tokens}-token call after {rejections} 429s left {balance:.0f} of {tpm} tokens")
+    balance = asyncio.run(exhausted_tokens(tpm, tokens))
+    assert balance >= tpm - 1, balance
+    print(f"retries: a {tokens}-token call that never got through left {balance:.0f} of {tpm} tokens")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,122 @@
+"""End-to-end benchmark on recorded provider traffic: no API keys, no network.
+
+Serves a fixture file (see replay.py) from a local replay server, points the backend's
+OpenAI, Grok, Deepseek and ACI clients at it and drives ``websocket_endpoint`` with many
+concurrent simulated clients asking the recorded questions. Reports throughput, latency
+percentiles to the first final frame and to the end of the session, and calls per query.
+
+fixtures/sample_session.jsonl is a small synthetic recording (four questions, typical
+latencies) so the suite runs out of the box; record real sessions for meaningful numbers.
+
+    python bench_replay.py --clients 20 --queries 200 --latency lognormal:1.0,0.4
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from replay import FixtureStore, LatencyModel, client_env, create_app, serve_in_thread
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "sample_session.jsonl")
+
+
+def percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def load_main(base_url: str, store: FixtureStore, warm_caches: bool):
+    """Import main.py with its API clients pointed at the replay server."""
+    os.environ.update(client_env(base_url))
+    for key in ("OPENAI_API_KEY", "AIPOLABS_KEY", "LINKED_ACCOUNT_OWNER_ID"):
+        os.environ[key] = "replay"
+    # Only enable the optional providers the fixtures have recordings for
+    recorded = {record["provider"] for record in store.records}
+    for provider, key in (("grok", "GROK_API_KEY"), ("deepseek", "DEEPSEEK_API_KEY")):
+        if provider in recorded:
+            os.environ[key] = "replay"
+        else:
+            os.environ.pop(key, None)
+    os.environ["ACI_DEFINITIONS_PATH"] = os.path.join(tempfile.mkdtemp(), "function_definitions.json")
+    # Fixtures record API calls only, not the source pages
+    os.environ["VERIFY_SOURCES"] = "false"
+    if not warm_caches:
+        # Every query pays for the full pipeline
+        os.environ["SEARCH_CACHE_SIZE"] = "0"
+        os.environ["ANSWER_CACHE"] = "false"
+        os.environ["SINGLE_FLIGHT"] = "false"
+    import main
+
+    main.function_registry.load()
+    return main
+
+
+async def run(main, questions, clients: int, queries: int):
+    from bench_stubs import FakeWebSocket
+
+    main.job_queue.start()
+    semaphore = asyncio.Semaphore(clients)
+    to_final, to_end, errors = [], [], 0
+
+    async def client(index: int):
+        nonlocal errors
+        async with semaphore:
+            ws = FakeWebSocket(questions[index % len(questions)])
+            start = time.perf_counter()
+            await main.websocket_endpoint(ws)
+            to_end.append(time.perf_counter() - start)
+            finals = [at for event, at in zip(ws.sent, ws.received_at) if event["type"] == "final"]
+            if finals:
+                to_final.append(finals[0] - start)
+            if any(event["type"] == "error" for event in ws.sent):
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(i) for i in range(queries)))
+    elapsed = time.perf_counter() - start
+    await main.job_queue.stop()
+    return elapsed, to_final, to_end, errors
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fixtures", default=FIXTURES)
+    parser.add_argument("--clients", type=int, default=20, help="concurrent WebSocket clients")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--latency", default="recorded", help="recorded, fixed:S, uniform:LO,HI or lognormal:MEDIAN,SIGMA")
+    parser.add_argument("--latency-scale", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--warm-caches", action="store_true", help="keep the search and answer caches and single-flight on")
+    args = parser.parse_args()
+
+    store = FixtureStore(args.fixtures)
+    questions = store.questions()
+    if not questions:
+        parser.error(f"no recorded questions in {args.fixtures}")
+    app = create_app("replay", store, LatencyModel(args.latency, args.seed, args.latency_scale))
+    server, base_url = serve_in_thread(app)
+    main = load_main(base_url, store, args.warm_caches)
+    # Definitions were fetched once at startup; count only calls made while answering
+    app.state.counts.clear()
+    llm_calls_before = sum(main.metrics.llm_calls.values.values())
+
+    elapsed, to_final, to_end, errors = asyncio.run(run(main, questions, args.clients, args.queries))
+    server.should_exit = True
+
+    llm_calls = sum(main.metrics.llm_calls.values.values()) - llm_calls_before
+    print(f"{args.queries} queries, {args.clients} clients, {len(questions)} distinct questions, latency {args.latency}")
+    print(f"throughput: {args.queries / elapsed:.2f} queries/s ({elapsed:.1f}s), {errors} errors")
+    for label, values in (("time to final", to_final), ("session", to_end)):
+        if values:
+            print(
+                f"{label}: p50 {percentile(values, 0.5):.2f}s  p95 {percentile(values, 0.95):.2f}s  "
+                f"p99 {percentile(values, 0.99):.2f}s"
+            )
+    per_provider = ", ".join(f"{name} {count / args.queries:.2f}" for name, count in sorted(app.state.counts.items()))
+    print(f"LLM calls per query: {llm_calls / args.queries:.2f}; upstream requests per query: {per_provider}")
+    print(f"fixture matches: {store.hits} exact, {store.misses} by endpoint")
+
+
+if __name__ == "__main__":
+    main_cli()
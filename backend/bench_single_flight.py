@@ -0,0 +1,107 @@
+"""Single-flight check: many clients asking the same question at once share one research job.
+
+100 clients send the same question (with varying case and spacing) at the same moment, and one
+more joins late. With single-flight on, exactly one pipeline must run and every client, the late
+one included, must receive the whole event stream. Then 100 identical tool calls must make one
+ACI call. Upstream calls are compared with single-flight off.
+
+    python bench_single_flight.py --clients 100
+"""
+import argparse
+import asyncio
+import time
+
+from bench_stubs import FakeACI, FakeGrok, FakeOpenAI, FakeWebSocket, load_main
+
+QUESTION = "Who won the 2026 city council election?"
+
+
+def variant(index: int) -> str:
+    return [QUESTION, QUESTION.lower(), f"  {QUESTION}  ", QUESTION.rstrip("?")][index % 4]
+
+
+async def identical_clients(main, clients: int, late_after: float):
+    main.search_cache.clear()
+    main.answer_cache.clear()
+    runs = []
+    runner = main.job_queue.runner
+
+    async def counting_runner(message, send, job_id, priority=0):
+        runs.append(job_id)
+        await runner(message, send, job_id, priority=priority)
+
+    main.job_queue.runner = counting_runner
+    main.job_queue.start()
+    llm_calls = main.openai.chat.completions.calls
+    aci_calls = main.aci.calls
+    sockets = [FakeWebSocket(variant(i)) for i in range(clients)]
+
+    async def late_client():
+        await asyncio.sleep(late_after)
+        await main.websocket_endpoint(sockets[-1])
+
+    sockets.append(FakeWebSocket(QUESTION))
+    start = time.perf_counter()
+    await asyncio.gather(*(main.websocket_endpoint(ws) for ws in sockets[:-1]), late_client())
+    elapsed = time.perf_counter() - start
+    await main.job_queue.stop()
+    main.job_queue.runner = runner
+    return {
+        "runs": len(runs),
+        "llm_calls": main.openai.chat.completions.calls - llm_calls,
+        "aci_calls": main.aci.calls - aci_calls,
+        "elapsed": elapsed,
+        "sockets": sockets,
+    }
+
+
+async def identical_tool_calls(main, calls: int) -> int:
+    main.search_cache.clear()
+    before = main.aci.calls
+    arguments = {"query": {"q": "city council election results"}}
+    results = await asyncio.gather(*(
+        main.handle_function_call("BRAVE_SEARCH__NEWS_SEARCH", arguments) for _ in range(calls)
+    ))
+    assert all(result == results[0] for result in results)
+    return main.aci.calls - before
+
+
+def stream_of(ws: FakeWebSocket):
+    """The job's events as the client saw them, minus the per-connection greeting."""
+    return [(event.get("seq"), event["type"]) for event in ws.sent if "seq" in event]
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--late-after", type=float, default=0.3, help="seconds before the late client joins")
+    args = parser.parse_args()
+
+    main = load_main()
+    main.ANSWER_CACHE = False
+    main.openai = FakeOpenAI(0.2, 4)
+    main.grok_client = FakeGrok(0.2)
+    main.aci = FakeACI(0.3)
+
+    for single_flight in (True, False):
+        main.SINGLE_FLIGHT = single_flight
+        result = asyncio.run(identical_clients(main, args.clients, args.late_after))
+        tool_aci_calls = asyncio.run(identical_tool_calls(main, args.clients))
+        label = "single-flight" if single_flight else "independent"
+        print(
+            f"{label}: {result['runs']} pipelines for {args.clients + 1} clients in {result['elapsed']:.2f}s, "
+            f"{result['llm_calls']} LLM calls, {result['aci_calls']} ACI calls; "
+            f"{args.clients} identical tool calls made {tool_aci_calls} ACI calls"
+        )
+        if single_flight:
+            assert result["runs"] == 1, result["runs"]
+            assert tool_aci_calls == 1, tool_aci_calls
+            expected = stream_of(result["sockets"][0])
+            assert any(kind == "final" for _, kind in expected)
+            for ws in result["sockets"]:
+                assert stream_of(ws) == expected, "a subscriber missed events"
+            assert result["sockets"][-1].sent[0]["content"].startswith("Joining")
+
+
+if __name__ == "__main__":
+    main_cli()
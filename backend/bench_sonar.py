@@ -0,0 +1,236 @@
+"""DeepseekSonar client against a local stub API: connection pooling, retries, 429s, timeouts and streaming.
+
+Serves a fake chat-completions endpoint under several paths (healthy, 503 twice for every
+third query, always 429, slower than the read timeout, and a slowly chunked SSE stream with a
+malformed event and malformed items) and checks that queries reuse pooled keep-alive
+connections, that 5xx responses are retried, that a 429 or a timeout surfaces as an error with
+``raise_errors`` and as an empty list without it, and that streamed sources reach the caller,
+and the provider fan-out, well before the stream ends. Through main's Deepseek provider a 429
+must reach the scheduler, and a streamed call's reserved tokens must be settled to its usage.
+
+    python bench_sonar.py --queries 40 --concurrency 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import zlib
+from collections import Counter, defaultdict
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from bench_stubs import load_main
+from rate_limit import Limit, RateLimitExceeded, Scheduler
+from replay import serve_in_thread
+
+# sonar.py lives at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from providers import Provider, ProviderOrchestrator, sources_from_result
+from sonar import DeepseekSonar, SourceStreamParser
+
+USAGE = {"prompt_tokens": 150, "completion_tokens": 90, "total_tokens": 240}
+SOURCES = [
+    {"title": f"Source {index}", "url": f"https://example.com/{index}", "type": "article", "summary": "A summary."}
+    for index in range(3)
+]
+
+
+def stub_app(latency: float, slow: float) -> FastAPI:
+    app = FastAPI()
+    app.state.requests = Counter()
+    app.state.attempts = Counter()
+    # mode -> client ports seen, one per TCP connection
+    app.state.ports = defaultdict(set)
+
+    @app.post("/{mode}/v1/chat/completions")
+    async def completions(mode: str, request: Request):
+        app.state.requests[mode] += 1
+        app.state.ports[mode].add(request.client.port)
+        await asyncio.sleep(slow if mode == "slow" else latency)
+        if mode == "flaky":
+            prompt = (await request.json())["messages"][-1]["content"]
+            app.state.attempts[prompt] += 1
+            if zlib.crc32(prompt.encode()) % 3 == 0 and app.state.attempts[prompt] <= 2:
+                return JSONResponse({"error": "overloaded"}, 503)
+        if mode == "limited":
+            return JSONResponse({"error": "rate limited"}, 429, headers={"Retry-After": "0.05"})
+        if mode == "stream":
+            return StreamingResponse(sse_events(latency), media_type="text/event-stream")
+        content = json.dumps(SOURCES)
+        return {
+            "choices": [{"message": {"content": content}}],
+            "usage": USAGE,
+        }
+
+    return app
+
+
+async def sse_events(latency: float):
+    """The sources as a JSON array in small content deltas, with one unparseable event and two bad items.
+
+    The second bad item has an unbalanced quote, which hides the source after it until the parser resyncs.
+    """
+    text = "```json\n[" + ", ".join(json.dumps(source) for source in SOURCES[:2])
+    text += ', {"title": broken}, {"title": "unterminated, "url": "https://example.com/x"}, '
+    text += json.dumps(SOURCES[2]) + "]\n```"
+    chunks = [text[index:index + 16] for index in range(0, len(text), 16)]
+    for index, chunk in enumerate(chunks):
+        if index == len(chunks) // 2:
+            yield "data: {not json\n\n"
+        yield "data: " + json.dumps({"choices": [{"delta": {"content": chunk}}]}) + "\n\n"
+        await asyncio.sleep(latency)
+    yield "data: " + json.dumps({"choices": [], "usage": USAGE}) + "\n\n"
+    yield "data: [DONE]\n\n"
+
+
+def client(base_url: str, mode: str, **options) -> DeepseekSonar:
+    sonar = DeepseekSonar(api_key="test", backoff_factor=0.01, **options)
+    sonar.base_url = f"{base_url}/{mode}"
+    return sonar
+
+
+async def run(app: FastAPI, base_url: str, queries: int, concurrency: int, read_timeout: float):
+    questions = [f"question {index}" for index in range(queries)]
+
+    pooled = client(base_url, "ok", pool_size=concurrency)
+    start = time.perf_counter()
+    results = await pooled.search_references_many(questions, max_concurrency=concurrency)
+    elapsed = time.perf_counter() - start
+    await pooled.aclose()
+    assert all(len(result) == len(SOURCES) for result in results), [len(result) for result in results]
+    assert len(app.state.ports["ok"]) <= concurrency, app.state.ports["ok"]
+    print(
+        f"pooled: {queries} queries at concurrency {concurrency} in {elapsed:.2f}s "
+        f"over {len(app.state.ports['ok'])} connections"
+    )
+
+    flaky = client(base_url, "flaky", pool_size=concurrency)
+    results = await flaky.search_references_many(questions, max_concurrency=concurrency)
+    await flaky.aclose()
+    assert all(len(result) == len(SOURCES) for result in results), [len(result) for result in results]
+    print(f"retries: {queries} queries all answered, {app.state.requests['flaky'] - queries} 503s retried")
+
+    limited = client(base_url, "limited", max_retries=2)
+    start = time.perf_counter()
+    assert await limited.async_search_references("question") == []
+    try:
+        await limited.async_search_references("question", raise_errors=True)
+        raise AssertionError("429 was not raised")
+    except httpx.HTTPStatusError as e:
+        assert e.response.status_code == 429
+    elapsed = time.perf_counter() - start
+    await limited.aclose()
+    # Each query: the first try and two retries, each retry after Retry-After
+    assert app.state.requests["limited"] == 6, app.state.requests["limited"]
+    assert elapsed >= 4 * 0.05, elapsed
+    print(f"429: {app.state.requests['limited']} requests for 2 queries in {elapsed:.2f}s, raised with raise_errors")
+
+    slow = client(base_url, "slow", max_retries=1, timeout=(1.0, read_timeout))
+    start = time.perf_counter()
+    assert await slow.async_search_references("question") == []
+    try:
+        await slow.async_search_references("question", raise_errors=True)
+        raise AssertionError("timeout was not raised")
+    except httpx.TimeoutException:
+        pass
+    elapsed = time.perf_counter() - start
+    await slow.aclose()
+    assert elapsed < 4 * (read_timeout + 0.1) + 0.5, elapsed
+    print(f"timeouts: 2 queries gave up after {elapsed:.2f}s with a {read_timeout:g}s read timeout and 1 retry")
+
+    parser = SourceStreamParser()
+    items = '[{"title": "unterminated, "url": "a"}, {"title": "ok", "url": "b"}, {"title": "ok", "url": "c"}]'
+    recovered = [source for index in range(0, len(items), 16) for source in parser.feed(items[index:index + 16])]
+    recovered += parser.finish()
+    assert [source["url"] for source in recovered] == ["b", "c"] and parser.skipped == 1, (recovered, parser.skipped)
+    print("parser: the sources after an unbalanced quote were recovered, 1 item skipped")
+
+    streamed = client(base_url, "stream")
+    start = time.perf_counter()
+    arrivals = []
+    async for source in streamed.stream_references("question"):
+        arrivals.append((time.perf_counter() - start, source))
+    total = time.perf_counter() - start
+    assert [source for _, source in arrivals] == SOURCES, arrivals
+    assert arrivals[0][0] < total / 2, (arrivals[0][0], total)
+    print(f"stream: first of {len(arrivals)} sources after {arrivals[0][0]:.2f}s of a {total:.2f}s stream")
+
+    async def search(query: str, on_sources):
+        sources = []
+        async for item in streamed.stream_references(query, raise_errors=True):
+            sources.extend(sources_from_result(item))
+            await on_sources(sources_from_result(item))
+        return sources
+
+    batches = []
+
+    async def on_sources(name: str, sources):
+        batches.append((time.perf_counter() - start, name, len(sources)))
+
+    orchestrator = ProviderOrchestrator([Provider("deepseek", search, streaming=True)], min_sources=100)
+    start = time.perf_counter()
+    merged = await orchestrator.search("another question", on_sources=on_sources)
+    total = time.perf_counter() - start
+    await streamed.aclose()
+    assert len(merged) == len(SOURCES) and sum(count for _, _, count in batches) == len(SOURCES), (merged, batches)
+    assert batches[0][0] < total / 2, (batches, total)
+    print(f"fan-out: {len(batches)} batches from a streaming provider, the first after {batches[0][0]:.2f}s of {total:.2f}s")
+
+    async def ignore(sources):
+        pass
+
+    main = load_main()
+    # Retries are the scheduler's: the client gives up on the first 429
+    main.scheduler = Scheduler({"deepseek": Limit(requests_per_minute=6000, max_retries=2)}, backoff_factor=0.01)
+    limited = client(base_url, "limited", max_retries=0)
+    before = app.state.requests["limited"]
+    try:
+        await main.deepseek_search(limited)("question", ignore)
+        raise AssertionError("RateLimitExceeded was not raised")
+    except RateLimitExceeded:
+        pass
+    await limited.aclose()
+    assert app.state.requests["limited"] - before == 3, app.state.requests["limited"] - before
+    assert main.scheduler.stats()["deepseek"]["rate_limited"] == 2, main.scheduler.stats()
+    print("scheduler: a Deepseek 429 paused the provider twice, then RateLimitExceeded")
+
+    # A small token bucket, so the settled usage shows in its balance
+    main.scheduler = Scheduler({"deepseek": Limit(tokens_per_minute=60, burst=1.0)})
+    streamed = client(base_url, "stream")
+    sources = await main.deepseek_search(streamed)("a third question", ignore)
+    await streamed.aclose()
+    balance = main.scheduler.limiters["deepseek"].tokens.tokens
+    assert len(sources) == len(SOURCES), sources
+    assert abs(balance - (60 - USAGE["total_tokens"])) < 5, balance
+    print(f"usage: the reserved estimate was settled to the {USAGE['total_tokens']} tokens the stream used")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--read-timeout", type=float, default=0.3)
+    args = parser.parse_args()
+
+    app = stub_app(args.latency, slow=args.read_timeout * 5)
+    server, base_url = serve_in_thread(app)
+
+    sync = client(base_url, "ok")
+    for index in range(10):
+        assert len(sync.search_references(f"sync question {index}")) == len(SOURCES)
+    sync.close()
+    assert len(app.state.ports["ok"]) == 1, app.state.ports["ok"]
+    print("sync: 10 queries over 1 keep-alive connection")
+    app.state.ports["ok"].clear()
+
+    asyncio.run(run(app, base_url, args.queries, args.concurrency, args.read_timeout))
+    server.should_exit = True
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,159 @@
+"""Source store benchmark: append rate, RAM and disk per source, filtered query and export times.
+
+Appends ``--sources`` synthetic sources (a few thousand domains, a handful of providers and
+types, Zipf-ish domain popularity) and reports the process's RSS growth, which must stay
+bounded however many rows are added. Then times filtered queries, per-provider stats and an
+npy export, and reads the export back as memory maps. Also compares the in-memory size of
+plain source dicts and Source records. Finally checks that a limit of 0 or less returns
+nothing and that /sources rejects limits outside 1..1000.
+
+    python bench_source_store.py --sources 2000000
+"""
+import argparse
+import math
+import os
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+from bench_stubs import load_main
+from source_store import Source, SourceStore, pq
+
+PROVIDERS = ["brave_search__web_search", "brave_search__news_search", "brave_web", "brave_news", "grok", "deepseek"]
+TYPES = ["news_result", "search_result", "article", "paper", "video", "blog", "discussion"]
+STATUSES = ["", "supported", "unsupported", "unreachable", "skipped"]
+NOW = 1_790_000_000.0
+DOMAINS = [f"site{i}.{['com', 'org', 'net', 'co.uk', 'gov'][i % 5]}" for i in range(5000)]
+
+
+def synthetic(count: int, seed: int = 1):
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(len(DOMAINS))]
+    picked = rng.choices(DOMAINS, weights, k=count)
+    for index, domain in enumerate(picked):
+        yield Source(
+            url=f"https://{domain}/story/{index}",
+            title=f"Story {index} about topic {index % 997}",
+            domain=domain,
+            type=TYPES[index % len(TYPES)],
+            provider=PROVIDERS[index % len(PROVIDERS)],
+            status=STATUSES[index % len(STATUSES)],
+            published=NOW - rng.random() * 5 * 365 * 86400 if index % 10 else math.nan,
+            score=rng.random(),
+            summary=f"Summary of story {index} with a few words of description.",
+            query=f"question {index // 20}",
+            found_at=NOW + index * 0.01,
+        )
+
+
+def as_dict(source: Source) -> dict:
+    data = source.to_dict()
+    # Separate string objects per dict, as parsed from JSON
+    return {key: "".join(value) if isinstance(value, str) else value for key, value in data.items()}
+
+
+def size_per_record(make, count: int = 20000) -> float:
+    sources = list(synthetic(count, seed=2))
+    tracemalloc.start()
+    kept = [make(source) for source in sources]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return size / count
+
+
+def rss_mb() -> float:
+    """Resident memory right now (Linux), not counting the store's memory-mapped files."""
+    with open("/proc/self/statm") as f:
+        _, resident, shared = (int(value) for value in f.read().split()[:3])
+    return (resident - shared) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def timed(function, *args, repeat: int = 5, **kwargs):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function(*args, **kwargs)
+    return result, (time.perf_counter() - start) / repeat * 1000
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sources", type=int, default=2_000_000)
+    args = parser.parse_args()
+
+    print(
+        f"in memory: {size_per_record(as_dict):.0f} bytes per source dict, "
+        f"{size_per_record(lambda source: Source(**{name: getattr(source, name) for name in Source.__slots__})):.0f} "
+        "bytes per Source record"
+    )
+
+    path = tempfile.mkdtemp(prefix="bench-sources-")
+    store = SourceStore(os.path.join(path, "store"), flush_rows=8192)
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    checkpoints = {args.sources // 4, args.sources // 2, args.sources}
+    batch = []
+    for index, source in enumerate(synthetic(args.sources), 1):
+        batch.append(source)
+        if len(batch) == 8192 or index == args.sources:
+            store.add_many(batch)
+            batch = []
+        if index in checkpoints:
+            print(f"  {index:>9} sources: RSS +{rss_mb() - rss_before:.0f} MB")
+    store.flush()
+    elapsed = time.perf_counter() - start
+    disk = sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(store.path) for name in names)
+    print(
+        f"appended {args.sources} sources in {elapsed:.1f}s ({args.sources / elapsed:.0f}/s), "
+        f"{disk / args.sources:.0f} bytes per source on disk"
+    )
+
+    year_ago = NOW - 365 * 86400
+    queries = {
+        "domain": dict(domain=DOMAINS[3]),
+        "domain + since": dict(domain=DOMAINS[3], since=year_ago),
+        "provider + min_score": dict(provider="grok", min_score=0.9),
+        "since + min_score + status": dict(since=year_ago, min_score=0.95, status="supported"),
+    }
+    for label, filters in queries.items():
+        count, count_ms = timed(store.count, **filters)
+        rows, query_ms = timed(store.query, limit=100, **filters)
+        assert all(row.domain == filters.get("domain", row.domain) for row in rows)
+        assert all(row.score >= filters.get("min_score", 0) for row in rows)
+        assert all(row.published >= filters["since"] for row in rows if "since" in filters)
+        print(f"{label}: {count} matches, count {count_ms:.1f}ms, top 100 {query_ms:.1f}ms")
+    assert store.query(limit=0) == [] and store.query(limit=-1) == []
+    stats, stats_ms = timed(store.stats, "provider", repeat=2)
+    print(f"stats by provider: {stats_ms:.0f}ms, e.g. grok {stats['grok']}")
+
+    export = os.path.join(path, "export")
+    start = time.perf_counter()
+    rows = store.export_npy(export)
+    print(f"npy export: {rows} rows in {time.perf_counter() - start:.1f}s")
+    scores = np.load(os.path.join(export, "score.npy"), mmap_mode="r")
+    assert len(scores) == args.sources
+    if pq is not None:
+        start = time.perf_counter()
+        store.export_parquet(os.path.join(path, "sources.parquet"))
+        print(f"parquet export: {time.perf_counter() - start:.1f}s")
+    else:
+        print("parquet export: skipped (pyarrow not installed)")
+    print(f"RSS +{rss_mb() - rss_before:.0f} MB after queries and export")
+    store.close()
+    shutil.rmtree(path, ignore_errors=True)
+
+    # The route rejects limits outside 1..1000 before touching the store
+    client = TestClient(load_main().app)
+    for limit in (-1, 0, 1001):
+        response = client.get("/sources", params={"limit": limit})
+        assert response.status_code == 422, (limit, response.status_code)
+    print("/sources: limits -1, 0 and 1001 rejected")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,231 @@
+"""Stubbed OpenAI / Grok / ACI backends and a fake WebSocket for offline benchmarks.
+
+Nothing in here talks to the network, so the benchmarks can run without API keys.
+"""
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import re
+import tempfile
+import time
+from types import SimpleNamespace
+
+from fastapi import WebSocketDisconnect
+
+
+def load_main():
+    """Import backend/main.py with dummy credentials and stub function definitions."""
+    for key in ("OPENAI_API_KEY", "AIPOLABS_KEY", "GROK_API_KEY", "LINKED_ACCOUNT_OWNER_ID"):
+        os.environ.setdefault(key, "bench")
+    # Keep stub definitions out of the real definitions file
+    os.environ["ACI_DEFINITIONS_PATH"] = os.path.join(tempfile.mkdtemp(), "function_definitions.json")
+    # Nor bench sources in the persistent source store
+    os.environ.setdefault("SOURCE_STORE_PATH", "")
+    # Stub sources point at real sites; don't fetch them
+    os.environ.setdefault("VERIFY_SOURCES", "false")
+
+    from aipolabs.resource.functions import FunctionsResource
+
+    FunctionsResource.get_definition = lambda self, name, *args, **kwargs: fake_definition(name)
+    import main
+    return main
+
+
+def fake_definition(name: str) -> dict:
+    return {
+        "type": "function",
+        "function": {
+            "name": name,
+            "description": "stub",
+            "parameters": {"type": "object", "properties": {"query": {"type": "string"}}},
+        },
+    }
+
+
+def make_tool_call(call_id: str, name: str, arguments: dict):
+    return SimpleNamespace(
+        id=call_id,
+        type="function",
+        function=SimpleNamespace(name=name, arguments=json.dumps(arguments)),
+    )
+
+
+def make_completion(content=None, tool_calls=None):
+    message = SimpleNamespace(content=content, tool_calls=tool_calls or None)
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+class FakeCompletions:
+    """Async chat.completions stand-in: one turn of tool calls, then a final answer."""
+
+    def __init__(self, latency: float, tool_calls_per_turn: int = 1):
+        self.latency = latency
+        self.tool_calls_per_turn = tool_calls_per_turn
+        self.calls = 0
+
+    async def create(self, messages, stream=False, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        if not any(m.get("role") == "tool" for m in messages if isinstance(m, dict)):
+            completion = make_completion(tool_calls=[
+                make_tool_call(f"call_{i}", "BRAVE_SEARCH__WEB_SEARCH", {"query": f"q{i}"})
+                for i in range(self.tool_calls_per_turn)
+            ])
+        else:
+            completion = make_completion(content="source_name: Example, source_url: https://example.com")
+        return stream_chunks(completion) if stream else completion
+
+
+async def stream_chunks(completion):
+    """Replay a completion as streamed chunks, the way the OpenAI SDK yields them."""
+    message = completion.choices[0].message
+    for token in re.findall(r"\S+\s*", message.content or ""):
+        delta = SimpleNamespace(content=token, tool_calls=None)
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+    for index, call in enumerate(message.tool_calls or []):
+        arguments = call.function.arguments
+        halves = (arguments[: len(arguments) // 2], arguments[len(arguments) // 2:])
+        for position, piece in enumerate(halves):
+            fragment = SimpleNamespace(
+                index=index,
+                id=call.id if position == 0 else None,
+                function=SimpleNamespace(name=call.function.name if position == 0 else None, arguments=piece),
+            )
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=None, tool_calls=[fragment]))])
+
+
+class FakeOpenAI:
+    def __init__(self, latency: float, tool_calls_per_turn: int = 1):
+        self.chat = SimpleNamespace(completions=FakeCompletions(latency, tool_calls_per_turn))
+
+
+class FakeGrok:
+    def __init__(self, latency: float, verdict: str = "yes"):
+        self.latency = latency
+        self.verdict = verdict
+        self.chat = SimpleNamespace(completions=self)
+
+    async def create(self, **kwargs):
+        await asyncio.sleep(self.latency)
+        return make_completion(content=self.verdict)
+
+
+class FakeACI:
+    """Blocking ACI stand-in, like the real synchronous SDK."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+
+    def handle_function_call(self, name, arguments, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency)
+        return {"results": [{"title": f"{name} result", "url": "https://example.com/a", "description": "stub"}]}
+
+
+class FakeWebSocket:
+    """Sends one message to the endpoint, records every event sent back, then disconnects.
+
+    ``sent`` holds events with batch frames expanded; ``frames`` counts frames on the wire.
+    """
+
+    def __init__(self, message: str, latency: float = 0.0):
+        self.message = message
+        self.latency = latency
+        self.sent: list[dict] = []
+        self.frames = 0
+        self.bytes = 0
+        # perf_counter() at which each entry of ``sent`` arrived
+        self.received_at: list[float] = []
+        self._delivered = False
+
+    async def accept(self):
+        pass
+
+    async def receive_text(self) -> str:
+        if self._delivered:
+            raise WebSocketDisconnect()
+        self._delivered = True
+        return self.message
+
+    async def send_json(self, data):
+        self.sent.append(data)
+
+    async def send_text(self, text: str):
+        # A slow client: each frame takes ``latency`` seconds to go out
+        await asyncio.sleep(self.latency)
+        self.frames += 1
+        self.bytes += len(text.encode())
+        frame = json.loads(text)
+        events = frame["events"] if frame.get("type") == "batch" else [frame]
+        self.sent.extend(events)
+        self.received_at.extend([time.perf_counter()] * len(events))
+
+    async def send_bytes(self, data: bytes):
+        await self.send_text(data.decode())
+
+
+class FakeClock:
+    """Virtual time for the rate-limit scheduler; ``run`` jumps straight to the next sleeper's deadline."""
+
+    def __init__(self):
+        self.now = 0.0
+        self._sleepers: list = []
+        self._order = itertools.count()
+
+    def monotonic(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._sleepers, (self.now + max(0.0, seconds), next(self._order), future))
+        await future
+
+    def advance(self, seconds: float):
+        self.now += seconds
+        while self._sleepers and self._sleepers[0][0] <= self.now:
+            _, _, future = heapq.heappop(self._sleepers)
+            if not future.done():
+                future.set_result(None)
+
+    async def run(self, awaitable):
+        """Await ``awaitable``, advancing time whenever every task is waiting on the clock."""
+        task = asyncio.ensure_future(awaitable)
+        while not task.done():
+            for _ in range(20):  # let every runnable task get to its next await
+                await asyncio.sleep(0)
+            if self._sleepers and not task.done():
+                self.advance(max(0.0, self._sleepers[0][0] - self.now))
+        return task.result()
+
+
+class FakeRateLimitError(Exception):
+    """Shaped like an SDK error for a 429: ``status_code`` plus a response carrying Retry-After."""
+
+    def __init__(self, retry_after: float):
+        super().__init__("429 Too Many Requests")
+        self.status_code = 429
+        self.response = SimpleNamespace(status_code=429, headers={"retry-after": f"{retry_after:g}"})
+
+
+class FakeProvider:
+    """An API enforcing ``requests_per_minute`` over a sliding minute; over the limit it answers 429."""
+
+    def __init__(self, clock: FakeClock, requests_per_minute: int, latency: float = 1.0):
+        self.clock = clock
+        self.requests_per_minute = requests_per_minute
+        self.latency = latency
+        self.calls: list[float] = []
+        self.rejected = 0
+
+    async def request(self):
+        now = self.clock.monotonic()
+        self.calls = [at for at in self.calls if now - at < 60]
+        if len(self.calls) >= self.requests_per_minute:
+            self.rejected += 1
+            raise FakeRateLimitError(60 - (now - self.calls[0]))
+        self.calls.append(now)
+        await self.clock.sleep(self.latency)
+        return "ok"
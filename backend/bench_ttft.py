@@ -0,0 +1,127 @@
+"""Time-to-first-token harness against a local fake OpenAI-compatible server.
+
+Starts a server on localhost that generates tokens at a fixed rate (streamed as SSE when
+requested), then compares when the first token reaches the client in streaming mode versus
+waiting for the full completion.
+
+    python bench_ttft.py --tokens 200 --token-delay 0.01
+"""
+import argparse
+import asyncio
+import json
+import socket
+import statistics
+import threading
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from openai import AsyncOpenAI
+
+from bench_stubs import load_main
+
+
+def create_fake_openai_app(tokens: int, token_delay: float, first_token_delay: float) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        words = [f"word{i} " for i in range(tokens)]
+
+        def chunk(delta: dict, finish_reason=None) -> str:
+            payload = {
+                "id": "chatcmpl-bench",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get("model", "fake"),
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            return f"data: {json.dumps(payload)}\n\n"
+
+        if body.get("stream"):
+            async def events():
+                await asyncio.sleep(first_token_delay)
+                yield chunk({"role": "assistant", "content": ""})
+                for word in words:
+                    yield chunk({"content": word})
+                    await asyncio.sleep(token_delay)
+                yield chunk({}, finish_reason="stop")
+                yield "data: [DONE]\n\n"
+
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        await asyncio.sleep(first_token_delay + token_delay * tokens)
+        return JSONResponse({
+            "id": "chatcmpl-bench",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "".join(words)},
+                "finish_reason": "stop",
+            }],
+        })
+
+    return app
+
+
+def start_server(app: FastAPI) -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return port
+
+
+async def measure(main, streaming: bool, runs: int) -> tuple[list[float], list[float]]:
+    main.STREAM_RESPONSES = streaming
+    first_token, total = [], []
+    for _ in range(runs):
+        start = time.perf_counter()
+        first = None
+
+        async def on_delta(token):
+            nonlocal first
+            if first is None:
+                first = time.perf_counter() - start
+
+        content, _ = await main.get_completion([{"role": "user", "content": "hi"}], on_delta=on_delta)
+        elapsed = time.perf_counter() - start
+        # Without streaming the client sees nothing until the whole completion has arrived
+        first_token.append(first if first is not None else elapsed)
+        total.append(elapsed)
+    return first_token, total
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokens", type=int, default=200)
+    parser.add_argument("--token-delay", type=float, default=0.01)
+    parser.add_argument("--first-token-delay", type=float, default=0.1)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    port = start_server(create_fake_openai_app(args.tokens, args.token_delay, args.first_token_delay))
+    main = load_main()
+
+    async def run_all():
+        main.openai = AsyncOpenAI(api_key="bench", base_url=f"http://127.0.0.1:{port}/v1")
+        for streaming in (False, True):
+            first_token, total = await measure(main, streaming, args.runs)
+            label = "streaming" if streaming else "blocking "
+            print(
+                f"{label}: time to first token {statistics.median(first_token) * 1000:7.1f} ms, "
+                f"full response {statistics.median(total) * 1000:7.1f} ms"
+            )
+
+    asyncio.run(run_all())
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,141 @@
+"""Source page verification against a local HTTP fixture server.
+
+Serves a mix of pages (articles that back up their snippet, off-topic pages, 404s, pages that
+never finish, multi-megabyte pages, PDFs and redirects) from two host names with random latency,
+verifies them all as one query's sources and checks every outcome, the byte cap and the time taken.
+Malformed source URLs must be marked per source rather than abort the run.
+
+    python bench_verify.py --urls 60
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from fastapi import FastAPI
+from fastapi.responses import HTMLResponse, RedirectResponse, Response, StreamingResponse
+
+from page_verifier import SKIPPED, SUPPORTED, UNREACHABLE, UNSUPPORTED, PageVerifier, is_public_url
+from replay import serve_in_thread
+
+QUESTION = "How much did the Riverside bridge repair cost?"
+CLAIM = "The Riverside bridge repair cost 4.2 million dollars and finished in March, the council said."
+KINDS = ["supported", "json_ld", "unsupported", "missing", "slow", "huge", "pdf", "redirect"]
+# Kind -> outcome the verifier should report
+EXPECTED = {
+    "supported": SUPPORTED, "json_ld": SUPPORTED, "unsupported": UNSUPPORTED, "missing": UNREACHABLE,
+    "slow": UNREACHABLE, "huge": SUPPORTED, "pdf": SKIPPED, "redirect": SUPPORTED, "malformed": UNREACHABLE,
+}
+# A broken IPv6 literal, an out-of-range port and a stray bracket in the host
+MALFORMED = ["http://[::1/broken", "https://example.com:99999/story", "http://exa[mple.com/story"]
+BOILERPLATE = "<nav>Home News Sport Weather Riverside bridge council repair million</nav>"
+
+
+def article(body: str, head: str = "") -> str:
+    return (
+        f"<html><head><title>Local news</title>{head}</head><body>{BOILERPLATE}"
+        f"<article><h1>Council update</h1><p>{body}</p></article>"
+        "<footer>Copyright</footer><script>var tracking = 'bridge repair cost million';</script></body></html>"
+    )
+
+
+def fixture_app(latency: tuple, rng: random.Random) -> FastAPI:
+    app = FastAPI()
+    app.state.huge_chunks = 0
+
+    @app.get("/{kind}/{index}")
+    async def page(kind: str, index: int):
+        await asyncio.sleep(rng.uniform(*latency))
+        if kind == "supported":
+            return HTMLResponse(article(
+                f"Officials said the Riverside bridge repair cost 4.2 million dollars. Work finished in March. ({index})",
+                '<meta property="article:published_time" content="2026-03-14T09:00:00Z">',
+            ))
+        if kind == "json_ld":
+            return HTMLResponse(article(
+                "The council said the repair of the Riverside bridge finished in March at a cost of 4.2 million dollars.",
+                '<script type="application/ld+json">{"@type": "NewsArticle", "datePublished": "2026-03-15"}</script>',
+            ))
+        if kind == "unsupported":
+            return HTMLResponse(article("The farmers market opens on Saturday with twenty new stalls and live music."))
+        if kind == "missing":
+            return Response("not found", 404)
+        if kind == "slow":
+            await asyncio.sleep(30)
+            return HTMLResponse(article(CLAIM))
+        if kind == "huge":
+            async def chunks():
+                yield article(CLAIM, '<meta name="date" content="2026-03-16">').replace("</body></html>", "").encode()
+                for _ in range(5000):  # ~5 MB of filler
+                    app.state.huge_chunks += 1
+                    yield b"<p>" + b"filler text " * 85 + b"</p>"
+                    await asyncio.sleep(0)
+            return StreamingResponse(chunks(), media_type="text/html")
+        if kind == "pdf":
+            return Response(b"%PDF-1.7", media_type="application/pdf")
+        return RedirectResponse(f"/supported/{index}")
+
+    return app
+
+
+async def run(base_urls, count: int, verifier: PageVerifier, deadline: float):
+    sources = []
+    for index in range(count):
+        kind = KINDS[index % len(KINDS)]
+        sources.append({
+            "title": f"Bridge story {index}",
+            "url": f"{base_urls[index % len(base_urls)]}/{kind}/{index}",
+            "description": CLAIM,
+            "kind": kind,
+        })
+    sources += [{"title": "Broken link", "url": url, "description": CLAIM, "kind": "malformed"} for url in MALFORMED]
+    start = time.perf_counter()
+    outcomes = await verifier.verify(sources, claim=QUESTION, deadline=deadline)
+    elapsed = time.perf_counter() - start
+    await verifier.close()
+    return sources, outcomes, elapsed
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--urls", type=int, default=60)
+    parser.add_argument("--latency", type=float, nargs=2, default=[0.05, 0.4], help="page latency range in seconds")
+    parser.add_argument("--per-host", type=int, default=8)
+    parser.add_argument("--timeout", type=float, default=2.0, help="seconds allowed per page")
+    parser.add_argument("--deadline", type=float, default=5.0, help="seconds allowed for the whole query")
+    parser.add_argument("--max-bytes", type=int, default=256 * 1024)
+    args = parser.parse_args()
+
+    app = fixture_app(tuple(args.latency), random.Random(0))
+    server, base_url = serve_in_thread(app)
+    port = base_url.rsplit(":", 1)[1]
+    # Two host names for the same server, so per-host limits apply to each half of the URLs
+    base_urls = [base_url, f"http://localhost:{port}"]
+    verifier = PageVerifier(per_host=args.per_host, max_bytes=args.max_bytes, timeout=args.timeout, allow_private=True)
+    sources, outcomes, elapsed = asyncio.run(run(base_urls, args.urls, verifier, args.deadline))
+    server.should_exit = True
+
+    print(f"{args.urls} pages from {len(base_urls)} hosts in {elapsed:.2f}s: {outcomes}")
+    for source in sources:
+        verification = source["verification"]
+        assert verification["status"] == EXPECTED[source["kind"]], (source["url"], verification)
+        if source["kind"] in ("supported", "json_ld", "huge"):
+            assert source["date"].startswith("2026-03"), source
+            assert "4.2 million" in verification["evidence"], verification
+        if source["kind"] == "huge":
+            assert verification["bytes"] <= args.max_bytes, verification
+        if source["kind"] == "redirect":
+            assert "/supported/" in verification["final_url"], verification
+    huge_pages = sum(source["kind"] == "huge" for source in sources)
+    print(f"huge pages: {app.state.huge_chunks / max(1, huge_pages):.0f} of 5000 filler chunks generated per page")
+    assert elapsed < args.deadline + 0.5, elapsed
+    assert not is_public_url(base_url) and not is_public_url("file:///etc/passwd") and is_public_url("https://apnews.com/x")
+
+    # Without allow_private, malformed URLs aren't public and are never fetched
+    malformed = [{"url": url} for url in MALFORMED]
+    assert asyncio.run(PageVerifier().verify(malformed)) == {SKIPPED: len(MALFORMED)}, malformed
+    print(f"malformed URLs: {len(MALFORMED)} unreachable when fetched, skipped by a public-only verifier")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,175 @@
+import json
+from typing import Any, Dict, List, Optional
+
+try:
+    import tiktoken
+except ImportError:  # fall back to a character-based estimate
+    tiktoken = None
+
+# Fields of a search result the model needs to cite a source; everything else is dropped
+RESULT_FIELDS = ("title", "url", "description", "snippet", "page_age", "age", "type")
+MAX_DESCRIPTION_CHARS = 300
+# Rough number of tokens each message adds on top of its content
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+class TokenCounter:
+    def __init__(self, model: str = "gpt-4o"):
+        self.encoding = None
+        if tiktoken is not None:
+            try:
+                self.encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                self.encoding = tiktoken.get_encoding("o200k_base")
+
+    @property
+    def method(self) -> str:
+        """How tokens are counted, for logs and benchmark output."""
+        if self.encoding is not None:
+            return f"tiktoken {self.encoding.name}"
+        return "estimated at 4 characters per token (tiktoken is not installed)"
+
+    def count_text(self, text: str) -> int:
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+        return (len(text) + 3) // 4
+
+    def count_message(self, message: Dict) -> int:
+        return MESSAGE_OVERHEAD_TOKENS + self.count_text(message_text(message))
+
+    def count_messages(self, messages: List[Dict]) -> int:
+        return sum(self.count_message(message) for message in messages)
+
+
+def message_text(message: Dict) -> str:
+    text = message.get("content") or ""
+    for tool_call in message.get("tool_calls") or []:
+        function = tool_call["function"] if isinstance(tool_call, dict) else tool_call.function
+        if isinstance(function, dict):
+            text += function.get("name", "") + function.get("arguments", "")
+        else:
+            text += function.name + function.arguments
+    return text
+
+
+def compact_result(value: Any) -> Any:
+    """Strip a search result down to titles, URLs, snippets and dates.
+
+    Any dict that has a ``url`` is treated as a single result and reduced to RESULT_FIELDS;
+    other containers are walked recursively so both ``data.results`` and ``data.web.results``
+    shaped responses are handled.
+    """
+    if isinstance(value, list):
+        return [compact_result(item) for item in value]
+    if not isinstance(value, dict):
+        return value
+    if "url" in value:
+        compact = {}
+        for field in RESULT_FIELDS:
+            field_value = value.get(field)
+            if not field_value:
+                continue
+            if isinstance(field_value, str) and len(field_value) > MAX_DESCRIPTION_CHARS:
+                field_value = field_value[:MAX_DESCRIPTION_CHARS] + "..."
+            compact[field] = field_value
+        return compact
+    return {
+        key: compact_result(item)
+        for key, item in value.items()
+        if isinstance(item, (dict, list)) or key in ("success", "error")
+    }
+
+
+def outline_result(value: Any) -> List[str]:
+    """One "title - url" line per result, used once a compact result no longer fits."""
+    if isinstance(value, list):
+        return [line for item in value for line in outline_result(item)]
+    if not isinstance(value, dict):
+        return []
+    if "url" in value:
+        return [f"{value.get('title', '')} - {value['url']}"]
+    return [line for item in value.values() for line in outline_result(item)]
+
+
+class ContextWindow:
+    def __init__(self, budget_tokens: int = 12000, model: str = "gpt-4o"):
+        """Keeps the prompt sent on each turn under a token budget.
+
+        Args:
+            budget_tokens: Maximum number of prompt tokens per request.
+            model: Model name used to pick the tokenizer.
+        """
+        self.budget_tokens = budget_tokens
+        self.counter = TokenCounter(model)
+
+    def tool_message(self, tool_call_id: str, result: Any) -> Dict:
+        """Build the chat history entry for a tool result, keeping only the fields the model uses."""
+        return {
+            "role": "tool",
+            "tool_call_id": tool_call_id,
+            "content": json.dumps(compact_result(result), separators=(",", ":")),
+        }
+
+    def fit(self, messages: List[Dict]) -> List[Dict]:
+        """Return a copy of ``messages`` that fits in the budget.
+
+        The leading system/user messages and the most recent assistant turn with its tool
+        results are always kept. Older tool results are reduced to "title - url" outlines,
+        then replaced by a placeholder, and finally old assistant text is truncated.
+        """
+        messages = list(messages)
+        counts = [self.counter.count_message(message) for message in messages]
+        total = sum(counts)
+        if total <= self.budget_tokens:
+            return messages
+
+        older = range(self._first_history_index(messages), self._last_turn_index(messages))
+
+        def replace(index: int, content: str):
+            nonlocal total
+            messages[index] = {**messages[index], "content": content}
+            new_count = self.counter.count_message(messages[index])
+            total += new_count - counts[index]
+            counts[index] = new_count
+
+        for index in older:
+            if total <= self.budget_tokens:
+                return messages
+            if messages[index].get("role") == "tool":
+                replace(index, "\n".join(outline_result(self._load(messages[index]["content"]))))
+        for index in older:
+            if total <= self.budget_tokens:
+                return messages
+            if messages[index].get("role") == "tool":
+                replace(index, "[earlier search results omitted]")
+        for index in older:
+            if total <= self.budget_tokens:
+                return messages
+            content = messages[index].get("content")
+            if messages[index].get("role") == "assistant" and content and len(content) > 200:
+                replace(index, content[:200] + "...")
+        return messages
+
+    def count(self, messages: List[Dict]) -> int:
+        return self.counter.count_messages(messages)
+
+    @staticmethod
+    def _first_history_index(messages: List[Dict]) -> int:
+        index = 0
+        while index < len(messages) and messages[index].get("role") in ("system", "user"):
+            index += 1
+        return index
+
+    @staticmethod
+    def _last_turn_index(messages: List[Dict]) -> int:
+        for index in range(len(messages) - 1, -1, -1):
+            if messages[index].get("role") == "assistant" and messages[index].get("tool_calls"):
+                return index
+        return len(messages)
+
+    @staticmethod
+    def _load(content: Optional[str]) -> Any:
+        try:
+            return json.loads(content or "")
+        except ValueError:
+            return content
@@ -0,0 +1,151 @@
+import asyncio
+import json
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+try:
+    import orjson
+except ImportError:  # fall back to the standard library encoder
+    orjson = None
+
+import metrics
+
+# Fields of a search result the UI shows; everything else stays on the server
+CLIENT_RESULT_FIELDS = ("type", "title", "url", "description", "page_age", "date")
+MAX_CLIENT_DESCRIPTION_CHARS = 400
+MAX_CLIENT_RESULTS = 20
+# Frames that may be dropped when a client falls behind; the final frame repeats every source
+DROPPABLE_TYPES = ("progress",)
+
+
+def summarize_result(value: Any, max_results: int = MAX_CLIENT_RESULTS) -> Any:
+    """Shrink a tool result for display: only the shown fields, capped descriptions and lists.
+
+    Lists of results longer than ``max_results`` are cut, and a ``truncated`` count is added
+    next to them so the UI can say how many were left out.
+    """
+    if isinstance(value, list):
+        return [summarize_result(item, max_results) for item in value[:max_results]]
+    if not isinstance(value, dict):
+        return value
+    if "url" in value:
+        summary = {field: value[field] for field in CLIENT_RESULT_FIELDS if value.get(field)}
+        description = summary.get("description")
+        if isinstance(description, str) and len(description) > MAX_CLIENT_DESCRIPTION_CHARS:
+            summary["description"] = description[:MAX_CLIENT_DESCRIPTION_CHARS] + "..."
+        profile = value.get("profile")
+        if isinstance(profile, dict) and profile.get("long_name"):
+            summary["profile"] = {"long_name": profile["long_name"]}
+        return summary
+    summary = {key: summarize_result(item, max_results) for key, item in value.items()}
+    for key, item in value.items():
+        if isinstance(item, list) and len(item) > max_results:
+            summary["truncated"] = summary.get("truncated", 0) + len(item) - max_results
+    return summary
+
+
+def encode(event: Dict) -> bytes:
+    """Compact JSON for a frame, via orjson when it is installed."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(event)
+        except TypeError:  # e.g. non-string keys; let the standard encoder try
+            pass
+    return json.dumps(event, separators=(",", ":"), default=str).encode()
+
+
+class EventChannel:
+    def __init__(self, websocket, max_queue: int = 256, binary: bool = False):
+        """Outbound frames for one WebSocket connection, sent by a background task.
+
+        ``put`` never waits for the client: events go on a queue that a sender task drains,
+        merging consecutive text deltas and sending everything pending as one ``batch`` frame.
+        Once ``max_queue`` events are waiting, the oldest progress frames are dropped; deltas,
+        messages, final and error frames are always kept.
+
+        Args:
+            websocket: Accepted Starlette/FastAPI WebSocket.
+            max_queue: Pending events before progress frames are dropped.
+            binary: Send frames as binary (UTF-8 JSON bytes) rather than text.
+        """
+        self.websocket = websocket
+        self.max_queue = max_queue
+        self.binary = binary
+        self.dropped = 0
+        self._queue: deque = deque()
+        self._ready = asyncio.Event()
+        self._error: Optional[BaseException] = None
+        self._closing = False
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._send_loop())
+
+    def put(self, event: Dict):
+        """Queue ``event`` for the client; raises the send error once the connection has failed."""
+        if self._error is not None:
+            raise self._error
+        last = self._queue[-1] if self._queue else None
+        if (
+            last is not None
+            and event.get("type") == "delta"
+            and last.get("type") == "delta"
+            and last.get("id") == event.get("id")
+        ):
+            # Tokens of one message are merged into a single delta while they wait
+            self._queue[-1] = {**event, "content": last["content"] + event["content"]}
+        else:
+            self._queue.append(event)
+        if len(self._queue) > self.max_queue:
+            self._drop_oldest()
+        self._ready.set()
+
+    async def close(self, timeout: float = 5.0):
+        """Flush what is queued (for at most ``timeout`` seconds) and stop the sender."""
+        self._closing = True
+        self._ready.set()
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), timeout)
+        except (asyncio.TimeoutError, Exception):
+            self._task.cancel()
+
+    def _drop_oldest(self):
+        for index, queued in enumerate(self._queue):
+            if queued.get("type") in DROPPABLE_TYPES:
+                del self._queue[index]
+                self.dropped += 1
+                metrics.ws_events_dropped.inc()
+                return
+
+    def _take_pending(self) -> List[Dict]:
+        events = list(self._queue)
+        self._queue.clear()
+        self._ready.clear()
+        return events
+
+    async def _send_loop(self):
+        try:
+            while True:
+                await self._ready.wait()
+                events = self._take_pending()
+                if events:
+                    await self._send(events)
+                if self._closing and not self._queue:
+                    return
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Surface the failure (usually WebSocketDisconnect) to the next put()
+            self._error = e
+
+    async def _send(self, events: List[Dict]):
+        frame = events[0] if len(events) == 1 else {"type": "batch", "events": events}
+        data = encode(frame)
+        metrics.ws_frames.inc()
+        with metrics.span("websocket_send", events=len(events)):
+            if self.binary:
+                await self.websocket.send_bytes(data)
+            else:
+                await self.websocket.send_text(data.decode())
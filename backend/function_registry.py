@@ -0,0 +1,127 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from aipolabs.types.functions import FunctionDefinitionFormat
+
+# Bump when the layout of the definitions file changes; older files are then refetched
+REGISTRY_VERSION = 1
+
+
+class FunctionRegistry:
+    def __init__(
+        self,
+        aci,
+        names: List[str],
+        path: str,
+        max_age: float = 24 * 60 * 60,
+        max_workers: int = 8,
+        format: FunctionDefinitionFormat = FunctionDefinitionFormat.OPENAI,
+    ):
+        """ACI function definitions backed by a local file.
+
+        Definitions are read from ``path`` the first time they are needed. Only names that are
+        missing from the file are fetched from ACI (concurrently) before returning; a file older
+        than ``max_age`` is used as-is and refreshed on a background thread.
+
+        Args:
+            aci: ACI client used to fetch definitions.
+            names: Function names to expose to the model, in order.
+            path: JSON file the definitions are stored in.
+            max_age: Seconds after which stored definitions are considered stale.
+            max_workers: Maximum number of definitions fetched at the same time.
+            format: Definition format requested from ACI.
+        """
+        self.aci = aci
+        self.names = list(names)
+        self.path = path
+        self.max_age = max_age
+        self.max_workers = max_workers
+        self.format = format
+        self._definitions: Optional[Dict[str, dict]] = None
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+        self._refresh_thread: Optional[threading.Thread] = None
+
+    @property
+    def definitions(self) -> List[dict]:
+        """Definitions for ``names``, in order, loading them on first access."""
+        if self._definitions is None:
+            self.load()
+        return [self._definitions[name] for name in self.names]
+
+    def load(self) -> None:
+        with self._lock:
+            if self._definitions is not None:
+                return
+            stored, fetched_at = self._read_file()
+            missing = [name for name in self.names if name not in stored]
+            if missing:
+                stored.update(self._fetch(missing))
+                fetched_at = fetched_at if len(missing) < len(self.names) else time.time()
+                self._write_file(stored, fetched_at)
+            self._definitions = stored
+            self._fetched_at = fetched_at
+        self.refresh_if_stale()
+
+    def is_stale(self) -> bool:
+        return time.time() - self._fetched_at > self.max_age
+
+    def refresh_if_stale(self) -> None:
+        """Refetch every definition on a background thread if the stored ones are too old."""
+        if not self.is_stale() or (self._refresh_thread and self._refresh_thread.is_alive()):
+            return
+        self._refresh_thread = threading.Thread(target=self.refresh, name="aci-definitions", daemon=True)
+        self._refresh_thread.start()
+
+    def refresh(self) -> None:
+        try:
+            fetched = self._fetch(self.names)
+        except Exception as e:
+            print(f"Failed to refresh ACI function definitions: {str(e)}")
+            return
+        fetched_at = time.time()
+        with self._lock:
+            self._definitions = {**(self._definitions or {}), **fetched}
+            self._fetched_at = fetched_at
+            self._write_file(self._definitions, fetched_at)
+
+    def _fetch(self, names: List[str]) -> Dict[str, dict]:
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(names))) as executor:
+            definitions = executor.map(
+                lambda name: self.aci.functions.get_definition(name, format=self.format), names
+            )
+            return dict(zip(names, definitions))
+
+    def _read_file(self) -> "tuple[Dict[str, dict], float]":
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}, 0.0
+        if data.get("version") != REGISTRY_VERSION or data.get("format") != self.format.value:
+            return {}, 0.0
+        return data.get("definitions", {}), data.get("fetched_at", 0.0)
+
+    def _write_file(self, definitions: Dict[str, dict], fetched_at: float) -> None:
+        data = {
+            "version": REGISTRY_VERSION,
+            "format": self.format.value,
+            "fetched_at": fetched_at,
+            "definitions": definitions,
+        }
+        # Write to a temporary file first so a crash never leaves a truncated registry behind
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Failed to write ACI function definitions to {self.path}: {str(e)}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
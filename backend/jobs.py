@@ -0,0 +1,483 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+from uuid import uuid4
+
+from event_channel import encode
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+FINISHED = (DONE, FAILED)
+
+# How often subscribers poll the store for events written by another process
+POLL_INTERVAL = 0.1
+# Jobs run by this process wake their subscribers directly; this is only a safety net
+LOCAL_POLL_INTERVAL = 1.0
+# How long streamed deltas are held so several tokens go out in one write
+EVENT_FLUSH_INTERVAL = 0.025
+JOB_COLUMNS = ("id", "message", "status", "worker", "created_at", "updated_at", "lease_until", "attempts", "priority")
+
+
+class JobStore:
+    def __init__(self, path: str = ":memory:"):
+        """Research jobs and their event logs, kept in SQLite.
+
+        With a file ``path`` several processes (socket servers and workers) can share the store;
+        ``:memory:`` keeps everything inside the current process. The methods block, so
+        ``JobQueue`` calls them on its own thread rather than on the event loop.
+        """
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._lock = threading.Lock()
+        with self._lock:
+            if path != ":memory:":
+                self._db.execute("PRAGMA journal_mode=WAL")
+                # Safe with WAL: a commit is durable once the WAL is synced at the next checkpoint
+                self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, message TEXT NOT NULL, status TEXT NOT NULL, worker TEXT, "
+                "created_at REAL NOT NULL, updated_at REAL NOT NULL, key TEXT, lease_until REAL, "
+                "attempts INTEGER NOT NULL DEFAULT 0, priority INTEGER NOT NULL DEFAULT 0);"
+                "CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);"
+                "CREATE TABLE IF NOT EXISTS job_events ("
+                "job_id TEXT NOT NULL, seq INTEGER NOT NULL, data TEXT NOT NULL, PRIMARY KEY (job_id, seq));"
+            )
+            # Stores created before jobs were keyed, leased and prioritised
+            columns = [row[1] for row in self._db.execute("PRAGMA table_info(jobs)")]
+            for column, definition in (
+                ("key", "TEXT"), ("lease_until", "REAL"), ("attempts", "INTEGER NOT NULL DEFAULT 0"),
+                ("priority", "INTEGER NOT NULL DEFAULT 0"),
+            ):
+                if column not in columns:
+                    self._db.execute(f"ALTER TABLE jobs ADD COLUMN {column} {definition}")
+            self._db.execute("CREATE INDEX IF NOT EXISTS jobs_key ON jobs (key, status)")
+            self._db.commit()
+
+    def create_job(self, message: str, priority: int = 0) -> str:
+        job_id = uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, message, status, created_at, updated_at, priority) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, message, QUEUED, now, now, priority),
+            )
+            self._db.commit()
+        return job_id
+
+    def create_or_join(self, message: str, key: str, max_age: float, priority: int = 0) -> Tuple[str, bool]:
+        """The unfinished job with ``key`` created in the last ``max_age`` seconds, else a new one.
+
+        Returns ``(job_id, joined)``. The lookup and insert share one write transaction, so
+        processes sharing the store can't both start a job for the same key. Joining a job
+        raises its priority to ``priority`` if that is more urgent.
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT id FROM jobs WHERE key = ? AND status IN (?, ?) AND created_at > ? "
+                    "ORDER BY created_at DESC LIMIT 1",
+                    (key, QUEUED, RUNNING, now - max_age),
+                ).fetchone()
+                if row is None:
+                    job_id = uuid4().hex
+                    self._db.execute(
+                        "INSERT INTO jobs (id, message, status, created_at, updated_at, key, priority) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (job_id, message, QUEUED, now, now, key, priority),
+                    )
+                else:
+                    self._db.execute("UPDATE jobs SET priority = MIN(priority, ?) WHERE id = ?", (priority, row[0]))
+                self._db.commit()
+            except BaseException:
+                self._db.rollback()
+                raise
+        return (row[0], True) if row else (job_id, False)
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            return self._get_job(job_id)
+
+    def claim_next(
+        self, worker: str, lease: float = 30.0, max_attempts: int = 2
+    ) -> Optional[Tuple[str, str, int, int]]:
+        """Atomically mark the next claimable job as running for ``worker``.
+
+        Returns ``(job_id, message, attempt, priority)``. Claimable are queued jobs, and running
+        jobs whose lease ran out (their worker died) that have been tried fewer than
+        ``max_attempts`` times; the most urgent (lowest ``priority``) go first, oldest first
+        within a priority. The claim holds for ``lease`` seconds unless ``renew`` extends it.
+        """
+        now = time.time()
+        claimable = "(status = ? OR (status = ? AND COALESCE(lease_until, 0) < ? AND attempts < ?))"
+        with self._lock:
+            row = self._db.execute(
+                "UPDATE jobs SET status = ?, worker = ?, updated_at = ?, lease_until = ?, attempts = attempts + 1 "
+                f"WHERE id = (SELECT id FROM jobs WHERE {claimable} ORDER BY priority, created_at LIMIT 1) "
+                f"AND {claimable} RETURNING id, message, attempts, priority",
+                (RUNNING, worker, now, now + lease, *(QUEUED, RUNNING, now, max_attempts) * 2),
+            ).fetchone()
+            self._db.commit()
+        return row
+
+    def renew(self, job_id: str, worker: str, lease: float) -> bool:
+        """Extend ``worker``'s lease on a running job; False if the job is no longer its own."""
+        now = time.time()
+        with self._lock:
+            updated = self._db.execute(
+                "UPDATE jobs SET lease_until = ?, updated_at = ? WHERE id = ? AND worker = ? AND status = ?",
+                (now + lease, now, job_id, worker, RUNNING),
+            ).rowcount
+            self._db.commit()
+        return updated == 1
+
+    def expire(self, max_attempts: int) -> List[str]:
+        """Fail running jobs whose lease ran out after their last allowed attempt; returns their IDs."""
+        now = time.time()
+        with self._lock:
+            expired = [row[0] for row in self._db.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? "
+                "WHERE status = ? AND COALESCE(lease_until, 0) < ? AND attempts >= ? RETURNING id",
+                (FAILED, now, RUNNING, now, max_attempts),
+            ).fetchall()]
+            for job_id in expired:
+                self._append(job_id, [{
+                    "type": "error",
+                    "content": f"The job stopped responding after {max_attempts} attempt(s)",
+                }])
+            self._db.commit()
+        return expired
+
+    def set_status(self, job_id: str, status: str, worker: Optional[str] = None):
+        """Set a job's status; with ``worker``, only if that worker still holds the job."""
+        with self._lock:
+            if worker is None:
+                self._db.execute("UPDATE jobs SET status = ?, updated_at = ? WHERE id = ?", (status, time.time(), job_id))
+            else:
+                self._db.execute(
+                    "UPDATE jobs SET status = ?, updated_at = ? WHERE id = ? AND worker = ?",
+                    (status, time.time(), job_id, worker),
+                )
+            self._db.commit()
+
+    def append_event(self, job_id: str, event: Dict) -> int:
+        return self.append_events(job_id, [event])
+
+    def append_events(self, job_id: str, events: List[Dict]) -> int:
+        """Append ``events`` in one transaction; returns the last one's sequence number."""
+        with self._lock:
+            seq = self._append(job_id, events)
+            self._db.commit()
+        return seq
+
+    def events_since(self, job_id: str, after: int = 0) -> List[Tuple[int, Dict]]:
+        with self._lock:
+            return self._events_since(job_id, after)
+
+    def poll(self, job_id: str, after: int = 0) -> Tuple[Optional[Dict], List[Tuple[int, Dict]]]:
+        """The job and its events after ``after``, read together.
+
+        The status is read first, so events written just before the job finished aren't missed.
+        """
+        with self._lock:
+            return self._get_job(job_id), self._events_since(job_id, after)
+
+    def prune(self, older_than: float):
+        """Delete finished jobs (and their events) last updated before ``older_than``."""
+        with self._lock:
+            self._db.execute(
+                "DELETE FROM job_events WHERE job_id IN (SELECT id FROM jobs WHERE status IN (?, ?) AND updated_at < ?)",
+                (*FINISHED, older_than),
+            )
+            self._db.execute("DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?", (*FINISHED, older_than))
+            self._db.commit()
+
+    def _get_job(self, job_id: str) -> Optional[Dict]:
+        row = self._db.execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return None if row is None else dict(zip(JOB_COLUMNS, row))
+
+    def _events_since(self, job_id: str, after: int) -> List[Tuple[int, Dict]]:
+        rows = self._db.execute(
+            "SELECT seq, data FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq", (job_id, after)
+        ).fetchall()
+        return [(seq, json.loads(data)) for seq, data in rows]
+
+    def _append(self, job_id: str, events: List[Dict]) -> int:
+        seq = self._db.execute(
+            "SELECT COALESCE(MAX(seq), 0) FROM job_events WHERE job_id = ?", (job_id,)
+        ).fetchone()[0]
+        # Same encoding as the WebSocket frames, so anything a client can be sent can be logged
+        rows = [(job_id, seq + offset, encode(event).decode()) for offset, event in enumerate(events, 1)]
+        self._db.executemany("INSERT INTO job_events (job_id, seq, data) VALUES (?, ?, ?)", rows)
+        return seq + len(events)
+
+
+class JobQueue:
+    def __init__(
+        self,
+        store: JobStore,
+        runner: Callable[..., Awaitable[None]],
+        workers: int = 4,
+        retention: float = 60 * 60,
+        max_join_age: float = 5 * 60,
+        lease: float = 30.0,
+        max_attempts: int = 2,
+        max_idle: float = 5 * 60,
+    ):
+        """Runs research jobs on a pool of worker tasks, independently of any client connection.
+
+        Store calls run on one dedicated thread, so a slow or locked SQLite file holds up the
+        queue's own reads and writes but never the event loop.
+
+        Args:
+            store: Where jobs and their events are kept.
+            runner: Coroutine function ``runner(message, send, job_id, priority=...)`` that does
+                the work; every event it sends is appended to the job's log. ``priority`` is the
+                one the job was submitted with.
+            workers: Number of worker tasks in this process. Use 0 for a process that only
+                accepts jobs and streams their events while other processes run them.
+            retention: Seconds finished jobs are kept for replay.
+            max_join_age: Seconds after which an unfinished job is no longer joined by
+                identical requests (it is likely stuck on a worker that died).
+            lease: Seconds a worker's claim on a job lasts; it is renewed while the job runs,
+                and a job whose worker died is picked up again once it lapses.
+            max_attempts: Times a job is started before a lapsed lease fails it for good.
+            max_idle: Seconds ``subscribe`` follows a job that shows no sign of progress (no
+                events, no lease renewals) before giving up on it.
+        """
+        self.store = store
+        self.runner = runner
+        self.workers = workers
+        self.retention = retention
+        self.max_join_age = max_join_age
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.max_idle = max_idle
+        self.joined = 0
+        self.worker_id = uuid4().hex[:8]
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="jobs")
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self._housekept_at = 0.0
+        # Jobs this process is running
+        self._running: set = set()
+        # job_id -> Event set whenever this process appends to that job's log
+        self._listeners: Dict[str, List[asyncio.Event]] = {}
+
+    def start(self):
+        # Created here so the queue binds to the loop it runs on
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._work(i)) for i in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, message: str, priority: int = 0) -> str:
+        """Queue ``message``; of the waiting jobs, those with the lowest ``priority`` are started first."""
+        job_id = await self._call(self.store.create_job, message, priority)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job_id
+
+    async def submit_or_join(self, message: str, key: str, priority: int = 0) -> Tuple[str, bool]:
+        """Attach to the running job for ``key`` if there is one, else queue ``message``.
+
+        Returns ``(job_id, joined)``. Subscribers of a joined job replay its events from the start.
+        """
+        job_id, joined = await self._call(self.store.create_or_join, message, key, self.max_join_age, priority)
+        if joined:
+            self.joined += 1
+        elif self._wakeup is not None:
+            self._wakeup.set()
+        return job_id, joined
+
+    async def get_job(self, job_id: str) -> Optional[Dict]:
+        return await self._call(self.store.get_job, job_id)
+
+    async def subscribe(self, job_id: str, after: int = 0) -> AsyncIterator[Tuple[int, Dict]]:
+        """Yield ``(seq, event)`` for every event after ``after``, following the job until it finishes.
+
+        If the job shows no progress for ``max_idle`` seconds (say it is queued with no worker
+        running), an error event that isn't part of the log is yielded, with the last ``seq``
+        seen, and the subscription ends.
+        """
+        notified = asyncio.Event()
+        self._listeners.setdefault(job_id, []).append(notified)
+        last_state = None
+        idle_since = time.monotonic()
+        try:
+            while True:
+                # Cleared before reading, so an append that lands during the read still wakes us
+                notified.clear()
+                job, events = await self._call(self.store.poll, job_id, after)
+                for seq, event in events:
+                    after = seq
+                    yield seq, event
+                if job is None or job["status"] in FINISHED:
+                    return
+                state = (job["status"], job["lease_until"])
+                if events or state != last_state:
+                    last_state = state
+                    idle_since = time.monotonic()
+                elif time.monotonic() - idle_since > self.max_idle:
+                    yield after, {
+                        "type": "error",
+                        "content": f"Job {job_id} made no progress for {self.max_idle:g} seconds",
+                    }
+                    return
+                # Jobs run here notify their subscribers; jobs run by other processes are polled
+                timeout = LOCAL_POLL_INTERVAL if job_id in self._running else POLL_INTERVAL
+                try:
+                    await asyncio.wait_for(notified.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._listeners[job_id].remove(notified)
+            if not self._listeners[job_id]:
+                del self._listeners[job_id]
+
+    async def _call(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, partial(function, *args))
+
+    def _notify(self, job_id: str):
+        for notified in self._listeners.get(job_id, ()):
+            notified.set()
+
+    async def _work(self, index: int):
+        worker = f"{self.worker_id}-{index}"
+        while True:
+            # Cleared before claiming, so a job submitted meanwhile isn't slept through
+            self._wakeup.clear()
+            claimed = await self._call(self.store.claim_next, worker, self.lease, self.max_attempts)
+            if claimed is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=1.0)
+                except asyncio.TimeoutError:
+                    await self._housekeeping()
+                continue
+            await self._run(worker, *claimed)
+
+    async def _housekeeping(self):
+        # Once a second for the whole queue, not once per idle worker
+        if time.monotonic() - self._housekept_at < 1.0:
+            return
+        self._housekept_at = time.monotonic()
+        for job_id in await self._call(self.store.expire, self.max_attempts):
+            print(f"Job {job_id} failed: its worker stopped responding")
+            self._notify(job_id)
+        await self._call(self.store.prune, time.time() - self.retention)
+
+    async def _run(self, worker: str, job_id: str, message: str, attempt: int, priority: int):
+        log = _EventLog(self, job_id)
+        if attempt > 1:
+            await log.send({
+                "type": "progress",
+                "content": f"Restarting the job after its worker stopped responding (attempt {attempt})",
+            })
+        self._running.add(job_id)
+        run = asyncio.create_task(self.runner(message, log.send, job_id, priority=priority))
+        heartbeat = asyncio.create_task(self._heartbeat(job_id, worker, run))
+        status = DONE
+        lease_lost = False
+        try:
+            await run
+        except asyncio.CancelledError:
+            if heartbeat.done() and not heartbeat.cancelled() and heartbeat.result():
+                # Another worker has the job now; its events and status are no longer ours to write
+                lease_lost = True
+            else:
+                status = FAILED
+                raise
+        except Exception as e:
+            print(f"Job {job_id} failed: {str(e)}")
+            status = FAILED
+            await log.send({"type": "error", "content": str(e)})
+        finally:
+            heartbeat.cancel()
+            self._running.discard(job_id)
+            if not lease_lost:
+                try:
+                    await log.close()
+                except Exception as e:
+                    print(f"Job {job_id}: could not write its last events: {str(e)}")
+                    status = FAILED
+                await self._call(self.store.set_status, job_id, status, worker)
+            self._notify(job_id)
+
+    async def _heartbeat(self, job_id: str, worker: str, run: asyncio.Task) -> bool:
+        """Renew the job's lease until cancelled; returns True after cancelling ``run`` if the lease was lost."""
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            try:
+                renewed = await self._call(self.store.renew, job_id, worker, self.lease)
+            except Exception as e:
+                print(f"Job {job_id}: could not renew its lease: {str(e)}")
+                continue
+            if not renewed:
+                print(f"Job {job_id}: lease lost to another worker, stopping")
+                run.cancel()
+                return True
+
+
+class _EventLog:
+    def __init__(self, queue: JobQueue, job_id: str):
+        """A running job's outgoing events, written to the store in batches on the store thread.
+
+        ``send`` only queues the event. Consecutive deltas of one message are merged, and a
+        batch ending in a delta waits up to EVENT_FLUSH_INTERVAL for more tokens, so a
+        streamed answer costs a few writes rather than one per token. Any other event is
+        written straight away, together with whatever is queued before it.
+        """
+        self.queue = queue
+        self.job_id = job_id
+        self._pending: List[Dict] = []
+        self._urgent = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    async def send(self, event: Dict):
+        if self._task is not None and self._task.done() and not self._task.cancelled() and self._task.exception():
+            # The last write failed; let the job fail rather than lose events silently
+            raise self._task.exception()
+        last = self._pending[-1] if self._pending else None
+        if (
+            last is not None
+            and event.get("type") == "delta"
+            and last.get("type") == "delta"
+            and last.get("id") == event.get("id")
+        ):
+            self._pending[-1] = {**event, "content": last["content"] + event["content"]}
+        else:
+            self._pending.append(event)
+        if event.get("type") != "delta":
+            self._urgent.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._drain())
+
+    async def close(self):
+        """Write everything still queued."""
+        self._urgent.set()
+        if self._task is not None:
+            await self._task
+
+    async def _drain(self):
+        while self._pending:
+            if self._pending[-1].get("type") == "delta" and not self._urgent.is_set():
+                try:
+                    await asyncio.wait_for(self._urgent.wait(), timeout=EVENT_FLUSH_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+            self._urgent.clear()
+            events, self._pending = self._pending, []
+            await self.queue._call(self.queue.store.append_events, self.job_id, events)
+            self.queue._notify(self.job_id)
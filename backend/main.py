@@ -1,16 +1,58 @@
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, Query, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 import json
+import math
 import os
 import asyncio
 import re
+import sys
+import time
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
 from dotenv import load_dotenv
-from openai import OpenAI
+from uuid import uuid4
+from openai import AsyncOpenAI
+from openai.types.chat import ChatCompletionMessageToolCall
+from openai.types.chat.chat_completion_message_tool_call import Function
 from aipolabs import ACI, meta_functions
 from aipolabs.types.functions import FunctionDefinitionFormat
+# sonar.py lives at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sonar import DeepseekSonar
+from search_cache import SearchCache
+from answer_cache import AnswerCache
+from function_registry import FunctionRegistry
+from context_window import ContextWindow
+from source_index import SourceIndex
+from source_store import DICTIONARY_COLUMNS, Source, SourceStore
+import metrics
+import rate_limit
+from rate_limit import BACKGROUND, FOLLOW_UP, INTERACTIVE, Limit, RateLimitExceeded, Scheduler
+from jobs import FAILED, JobQueue, JobStore
+from single_flight import SingleFlight, query_key
+from search_cache import make_key
+from event_channel import EventChannel, encode, summarize_result
+from credibility import AMBIGUOUS_BAND, parse_timestamp, score_sources
+from page_verifier import UNREACHABLE, UNSUPPORTED, PageVerifier
+from providers import Provider, ProviderOrchestrator, llm_search, source_list_messages, sources_from_result
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Read (or on first run, fetch) the ACI definitions off the event loop so startup stays fast
+    await asyncio.get_running_loop().run_in_executor(None, function_registry.load)
+    job_queue.start()
+    yield
+    await job_queue.stop()
+    for task in list(answer_refreshes.values()):
+        task.cancel()
+    await asyncio.gather(*answer_refreshes.values(), return_exceptions=True)
+    source_store.close()
+
+app = FastAPI(lifespan=lifespan)
 
 # Enable CORS - update to include WebSocket
 app.add_middleware(
@@ -24,16 +66,97 @@ app.add_middleware(
 # Load environment variables
 load_dotenv()
 LINKED_ACCOUNT_OWNER_ID = os.getenv("LINKED_ACCOUNT_OWNER_ID")
-openai = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Retries are left to the rate-limit scheduler so that 429 backoff is shared across sessions
+openai = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
 aci = ACI(api_key=os.getenv("AIPOLABS_KEY"))
 
+# The ACI SDK is synchronous, so tool calls run on a bounded pool instead of the event loop
+ACI_MAX_WORKERS = int(os.getenv("ACI_MAX_WORKERS", "16"))
+aci_executor = ThreadPoolExecutor(max_workers=ACI_MAX_WORKERS, thread_name_prefix="aci")
+# Maximum number of tool calls from a single model turn that run at the same time
+TOOL_FANOUT_LIMIT = int(os.getenv("TOOL_FANOUT_LIMIT", "4"))
+# Every source found is appended to a columnar store for analysis, kept across restarts in
+# SOURCE_STORE_PATH (several processes may share one); set it empty to drop the store on shutdown
+source_store = SourceStore(
+    os.getenv("SOURCE_STORE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "sources")) or None
+)
+SOURCE_STORE = os.getenv("SOURCE_STORE", "true").lower() == "true"
+# Identical questions, and identical tool calls, that arrive while one is running join it instead of
+# starting their own upstream calls
+SINGLE_FLIGHT = os.getenv("SINGLE_FLIGHT", "true").lower() == "true"
+tool_calls_in_flight = SingleFlight()
+# Search results shared across sessions; set SEARCH_CACHE_PATH to keep them across restarts
+search_cache = SearchCache(
+    max_entries=int(os.getenv("SEARCH_CACHE_SIZE", "1024")),
+    path=os.getenv("SEARCH_CACHE_PATH") or None,
+)
+# Finished answers reused for near-identical questions; entries older than
+# ANSWER_CACHE_REFRESH_AFTER are still served but re-researched in the background
+ANSWER_CACHE = os.getenv("ANSWER_CACHE", "true").lower() == "true"
+ANSWER_CACHE_REFRESH_AFTER = float(os.getenv("ANSWER_CACHE_REFRESH_AFTER", str(15 * 60)))
+answer_cache = AnswerCache(
+    threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.8")),
+    max_entries=int(os.getenv("ANSWER_CACHE_SIZE", "1000")),
+    max_age=float(os.getenv("ANSWER_CACHE_MAX_AGE", str(6 * 60 * 60))),
+)
+# Background refreshes in flight, by question
+answer_refreshes: dict[str, asyncio.Task] = {}
+# Outbound calls per provider. Set <PROVIDER>_RPM / <PROVIDER>_TPM to your account's quota to queue
+# calls locally instead of hitting 429s; 429s are retried with a backoff shared by all sessions either way
+def provider_limit(name: str) -> Limit:
+    rpm, tpm = os.getenv(f"{name}_RPM"), os.getenv(f"{name}_TPM")
+    return Limit(requests_per_minute=float(rpm) if rpm else None, tokens_per_minute=float(tpm) if tpm else None)
+
+scheduler = Scheduler({name.lower(): provider_limit(name) for name in ("OPENAI", "GROK", "DEEPSEEK", "ACI")})
+# Completion tokens reserved per model call until the real usage is known
+COMPLETION_TOKEN_RESERVE = int(os.getenv("COMPLETION_TOKEN_RESERVE", "1000"))
+# Prompt tokens allowed per model call; older tool results are compacted to stay under it
+context_window = ContextWindow(budget_tokens=int(os.getenv("CONTEXT_TOKEN_BUDGET", "12000")))
+# Grok re-queries allowed per request, and the wall-clock limit for the whole request
+MAX_REFINEMENT_ROUNDS = int(os.getenv("MAX_REFINEMENT_ROUNDS", "2"))
+RESEARCH_DEADLINE_SECONDS = float(os.getenv("RESEARCH_DEADLINE_SECONDS", "180"))
+# Query the other source providers alongside the agent loop
+PROVIDER_FANOUT = os.getenv("PROVIDER_FANOUT", "true").lower() == "true"
+# Skip the Grok check when this many sources already score above the ambiguous band
+CONFIDENT_SOURCES = int(os.getenv("CONFIDENT_SOURCES", "5"))
+# Fetch the collected source pages before the final answer and check they back up their snippets
+VERIFY_SOURCES = os.getenv("VERIFY_SOURCES", "true").lower() == "true"
+# Pages checked per request, and how long the whole check may take
+VERIFY_MAX_SOURCES = int(os.getenv("VERIFY_MAX_SOURCES", "60"))
+VERIFY_DEADLINE_SECONDS = float(os.getenv("VERIFY_DEADLINE_SECONDS", "5"))
+page_verifier = PageVerifier(
+    max_concurrency=int(os.getenv("VERIFY_CONCURRENCY", "32")),
+    per_host=int(os.getenv("VERIFY_PER_HOST", "4")),
+    max_bytes=int(os.getenv("VERIFY_MAX_PAGE_BYTES", str(512 * 1024))),
+    timeout=float(os.getenv("VERIFY_FETCH_TIMEOUT", "4")),
+)
+# Forward model tokens to the client as "delta" frames while they are generated
+STREAM_RESPONSES = os.getenv("STREAM_RESPONSES", "true").lower() == "true"
+# Events queued per WebSocket before progress frames are dropped for a slow client
+WS_MAX_QUEUE = int(os.getenv("WS_MAX_QUEUE", "256"))
+# Send frames as binary UTF-8 JSON instead of text
+WS_BINARY_FRAMES = os.getenv("WS_BINARY_FRAMES", "false").lower() == "true"
+# Queries of one /process/batch request researched at the same time, and queries allowed per batch
+PROCESS_BATCH_CONCURRENCY = int(os.getenv("PROCESS_BATCH_CONCURRENCY", "32"))
+PROCESS_BATCH_MAX = int(os.getenv("PROCESS_BATCH_MAX", "10000"))
+
 class MessageRequest(BaseModel):
     message: str
+    # Stream the job's events as NDJSON instead of returning the finished result
+    stream: bool = False
+
+class BatchRequest(BaseModel):
+    messages: list[str]
+    # Stream each result as an NDJSON line as soon as it finishes, instead of one JSON list at the end
+    stream: bool = False
+    # Lower than PROCESS_BATCH_CONCURRENCY to go easier on the providers
+    concurrency: Optional[int] = None
 
 prompt = (
     "You are a source finding agent who finds references and links to sources. "
     "You can use the web search tool to find sources. "
     "Always search for at least 5 sources to ensure you have enough information to answer the user's query. "
+    "When you need several searches (for example web, news and video), request them all at once as parallel tool calls. "
     "If an initial search does not find what the user is looking for, try again with a different query and query parameters. "
     "If you find a source, return the source in a list of dictionaries with the following format: "
     "source_name, source_url, source_type, source_description, source_date"
@@ -42,142 +165,822 @@ prompt = (
 function_defintions = ["BRAVE_SEARCH__NEWS_SEARCH", "BRAVE_SEARCH__WEB_SEARCH", "BRAVE_SEARCH__IMAGE_SEARCH", "BRAVE_SEARCH__VIDEO_SEARCH",
                                              ]
 
-function_definitions_list = [aci.functions.get_definition(function_definition) for function_definition in function_defintions]
+# Definitions are read from a local file on first use instead of being fetched on every import
+function_registry = FunctionRegistry(
+    aci,
+    function_defintions,
+    path=os.getenv("ACI_DEFINITIONS_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "function_definitions.json")),
+)
 
-from openai import OpenAI
-    
-grok_client = OpenAI(
+grok_client = AsyncOpenAI(
   api_key=os.getenv("GROK_API_KEY"),
-  base_url="https://api.x.ai/v1",
+  base_url=os.getenv("GROK_BASE_URL", "https://api.x.ai/v1"),
   organization=os.getenv("OPENAI_ORGANIZATION"),
+  max_retries=0,
 )
 
-def grok_search(query: str):
-    completion = grok_client.chat.completions.create(
-        model="grok-2-latest",
-        messages=[{
-            "role": "user", 
-            "content": "does this response give a satisfactory and correct answer to the user's query? If yes, respond with 'yes' ONLY. If no, respond with a new query to search for the correct answer : " + query
-        }],
+async def grok_search(query: str):
+    messages = [{
+        "role": "user", 
+        "content": "does this response give a satisfactory and correct answer to the user's query? If yes, respond with 'yes' ONLY. If no, respond with a new query to search for the correct answer : " + query
+    }]
+    estimate = context_window.count(messages) + COMPLETION_TOKEN_RESERVE
+    completion, sent_at = await scheduled_call(
+        "grok",
+        lambda: grok_client.chat.completions.create(model="grok-2-latest", messages=messages),
+        priority=BACKGROUND,
+        tokens=estimate,
     )
+    metrics.observe("grok", time.perf_counter() - sent_at)
+    usage = getattr(completion, "usage", None)
+    settle_usage("grok", "grok-2-latest", estimate, usage)
     return completion.choices[0].message.content
 
+def brave_search(function_name: str):
+    async def search(query: str):
+        return sources_from_result(
+            await handle_function_call(function_name, {"query": {"q": query}}, priority=BACKGROUND)
+        )
+    return search
+
+async def grok_sources(query: str) -> list[dict]:
+    """Grok as a source provider, reserving and settling its tokens like every other Grok call."""
+    usage = []
+    estimate = context_window.count(source_list_messages(query)) + COMPLETION_TOKEN_RESERVE
+    # The client is looked up per call so a replaced grok_client is picked up
+    sources, _ = await scheduled_call(
+        "grok",
+        lambda: llm_search(grok_client, "grok-2-latest", on_usage=usage.append)(query),
+        priority=BACKGROUND,
+        tokens=estimate,
+    )
+    settle_usage("grok", "grok-2-latest", estimate, usage[-1] if usage else None)
+    return sources
+
+def deepseek_search(sonar: DeepseekSonar):
+    async def search(query: str, on_sources):
+        usage = []
+        estimate = context_window.count(sonar.prompt_messages(query)) + COMPLETION_TOKEN_RESERVE
+        # Survives the scheduler's retries, so a stream restarted after a dropped connection
+        # doesn't report its sources twice
+        reported: list[dict] = []
+
+        # Each source is shown as soon as it has streamed in
+        async def stream():
+            async for item in sonar.stream_references(query, raise_errors=True, on_usage=usage.append):
+                seen = {source.get("url") for source in reported}
+                found = [source for source in sources_from_result(item) if source.get("url") not in seen]
+                if found:
+                    reported.extend(found)
+                    await on_sources(found)
+            return reported
+
+        sources, _ = await scheduled_call("deepseek", stream, priority=BACKGROUND, tokens=estimate)
+        if usage:
+            settle_usage("deepseek", "deepseek-chat", estimate, usage[-1])
+        else:
+            # Served from the search cache; no tokens were spent
+            scheduler.settle("deepseek", estimate, 0)
+        return sources
+    return search
+
+def build_provider_orchestrator() -> ProviderOrchestrator:
+    # Not hedged: a duplicate ACI call would only join the first one in tool_calls_in_flight
+    providers = [
+        Provider("brave_web", brave_search("BRAVE_SEARCH__WEB_SEARCH"), hedge=False),
+        Provider("brave_news", brave_search("BRAVE_SEARCH__NEWS_SEARCH"), hedge=False),
+    ]
+    if os.getenv("GROK_API_KEY"):
+        providers.append(Provider("grok", grok_sources, weight=0.5))
+    if os.getenv("DEEPSEEK_API_KEY"):
+        # No retries in the client: a 429 must reach the scheduler, which backs off every queued Deepseek call
+        sonar = DeepseekSonar(cache=search_cache, max_retries=0)
+        providers.append(Provider("deepseek", deepseek_search(sonar), weight=0.5, streaming=True))
+    return ProviderOrchestrator(
+        providers,
+        min_sources=int(os.getenv("PROVIDER_MIN_SOURCES", "8")),
+        timeout=float(os.getenv("PROVIDER_TIMEOUT", "20")),
+    )
+
+def is_satisfied(verdict: Optional[str]) -> bool:
+    """True when Grok accepted the answer, tolerating case, whitespace and punctuation ("Yes.", "yes\\n")."""
+    return bool(verdict) and re.fullmatch(r"\W*yes\W*", verdict, flags=re.IGNORECASE) is not None
+
+provider_orchestrator = build_provider_orchestrator()
+
+async def scheduled_call(provider: str, request, priority: int = FOLLOW_UP, tokens: float = 0.0):
+    """``scheduler.call`` that records the wait for the provider's limits as the ``<provider>_queue`` stage.
+
+    Returns ``(result, sent_at)``: ``sent_at`` is the ``perf_counter`` time the request that
+    succeeded was sent, so the provider's own latency can be timed without the wait.
+    """
+    queued_at = time.perf_counter()
+    attempts: list[float] = []
+
+    def send():
+        attempts.append(time.perf_counter())
+        return request()
+
+    result = await scheduler.call(provider, send, priority=priority, tokens=tokens)
+    metrics.observe(f"{provider}_queue", attempts[-1] - queued_at)
+    return result, attempts[-1]
+
+def settle_usage(provider: str, model: str, estimate: float, usage):
+    """Record a call's token usage and correct ``provider``'s token bucket from ``estimate`` to it."""
+    metrics.record_usage(model, usage)
+    if usage is not None:
+        scheduler.settle(provider, estimate, metrics.token_count(usage, "total"))
+
+async def get_completion(messages: list[dict], on_delta=None, priority: int = FOLLOW_UP):
+    """Get the next assistant turn as ``(content, tool_calls)``.
+
+    In streaming mode every content token is passed to ``on_delta`` as it arrives, and
+    tool calls are rebuilt from their streamed fragments so the tool loop works unchanged.
+    The call waits its turn in ``scheduler`` at ``priority``; that wait is timed as
+    ``openai_queue`` and left out of the ``openai`` and ``openai_first_token`` stages.
+    """
+    estimate = context_window.count(messages) + COMPLETION_TOKEN_RESERVE
+    if not STREAM_RESPONSES:
+        response, sent_at = await scheduled_call(
+            "openai",
+            lambda: openai.chat.completions.create(
+                model="gpt-4o",
+                messages=messages,
+                tools=function_registry.definitions,
+            ),
+            priority=priority,
+            tokens=estimate,
+        )
+        metrics.observe("openai", time.perf_counter() - sent_at)
+        usage = getattr(response, "usage", None)
+        settle_usage("openai", "gpt-4o", estimate, usage)
+        message = response.choices[0].message
+        return message.content, message.tool_calls or []
+
+    # Timed from when the request is sent, not from when create() returns the response headers
+    stream, sent_at = await scheduled_call(
+        "openai",
+        lambda: openai.chat.completions.create(
+            model="gpt-4o",
+            messages=messages,
+            tools=function_registry.definitions,
+            stream=True,
+            stream_options={"include_usage": True},
+        ),
+        priority=priority,
+        tokens=estimate,
+    )
+    first_token_seen = False
+    usage = None
+    content_parts: list[str] = []
+    partial_calls: dict[int, dict] = {}
+    try:
+        async for chunk in stream:
+            # With include_usage the last chunk carries the token counts and no choices
+            usage = getattr(chunk, "usage", None) or usage
+            if not chunk.choices:
+                continue
+            if not first_token_seen:
+                first_token_seen = True
+                metrics.observe("openai_first_token", time.perf_counter() - sent_at)
+            delta = chunk.choices[0].delta
+            if delta.content:
+                content_parts.append(delta.content)
+                if on_delta:
+                    await on_delta(delta.content)
+            # Tool calls arrive as fragments keyed by index: id and name once, arguments in pieces
+            for fragment in delta.tool_calls or []:
+                call = partial_calls.setdefault(fragment.index, {"id": None, "name": "", "arguments": ""})
+                if fragment.id:
+                    call["id"] = fragment.id
+                if fragment.function:
+                    call["name"] += fragment.function.name or ""
+                    call["arguments"] += fragment.function.arguments or ""
+    finally:
+        metrics.observe("openai", time.perf_counter() - sent_at)
+    settle_usage("openai", "gpt-4o", estimate, usage)
+
+    tool_calls = [
+        ChatCompletionMessageToolCall(
+            id=call["id"],
+            type="function",
+            function=Function(name=call["name"], arguments=call["arguments"] or "{}"),
+        )
+        for _, call in sorted(partial_calls.items())
+    ]
+    return "".join(content_parts) or None, tool_calls
+
+async def handle_function_call(name: str, arguments: dict, priority: int = FOLLOW_UP):
+    """Run an ACI function call on the executor so it doesn't block the event loop.
+
+    Successful results are served from and stored in ``search_cache``; a call with the same
+    arguments as one already in flight waits for that one's result.
+    """
+    cached = await search_cache.aget(name, arguments)
+    if cached is not None:
+        return cached
+
+    async def execute():
+        loop = asyncio.get_running_loop()
+        result, sent_at = await scheduled_call(
+            "aci",
+            lambda: loop.run_in_executor(
+                aci_executor,
+                partial(
+                    aci.handle_function_call,
+                    name,
+                    arguments,
+                    linked_account_owner_id=LINKED_ACCOUNT_OWNER_ID,
+                    allowed_apps_only=True,
+                    format=FunctionDefinitionFormat.OPENAI,
+                ),
+            ),
+            priority=priority,
+        )
+        metrics.observe("aci", time.perf_counter() - sent_at, function=name)
+        if not (isinstance(result, dict) and result.get("success") is False):
+            await search_cache.aset(name, arguments, result)
+        return result
+
+    if not SINGLE_FLIGHT:
+        return await execute()
+    key = make_key(name, arguments)
+    if key in tool_calls_in_flight:
+        metrics.coalesced.inc(kind="tool_call")
+    return await tool_calls_in_flight.do(key, execute)
+
+async def run_tool_calls(tool_calls, on_result=None, priority: int = FOLLOW_UP):
+    """Run every tool call from one model turn concurrently, at most TOOL_FANOUT_LIMIT at a time.
+
+    Results are returned in the same order as ``tool_calls`` so they can be appended to the
+    chat history by ``tool_call_id``; ``on_result`` is awaited as each individual call finishes.
+    A failing call produces an error result instead of aborting its siblings. The calls are
+    scheduled at ``priority``.
+    """
+    semaphore = asyncio.Semaphore(TOOL_FANOUT_LIMIT)
+
+    async def run(tool_call):
+        async with semaphore:
+            try:
+                result = await handle_function_call(
+                    tool_call.function.name,
+                    json.loads(tool_call.function.arguments),
+                    priority=priority,
+                )
+            except Exception as e:
+                result = {"success": False, "error": str(e)}
+        if on_result:
+            await on_result(tool_call, result)
+        return result
+
+    return await asyncio.gather(*(run(tool_call) for tool_call in tool_calls))
+
 @app.get("/")
 async def root():
     return {"message": "WebSocket server is running"}
 
+@app.get("/metrics")
+async def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return search_cache.stats()
+
+@app.get("/limits")
+async def limits():
+    return scheduler.stats()
+
+@app.get("/cache/answers")
+async def answer_cache_stats():
+    return answer_cache.stats()
+
+@app.get("/sources")
+async def sources_query(
+    domain: Optional[str] = None,
+    provider: Optional[str] = None,
+    type: Optional[str] = None,
+    status: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    min_score: Optional[float] = None,
+    limit: int = Query(100, ge=1, le=1000),
+):
+    """Stored sources matching the filters, most recently found first; dates are ISO dates or years."""
+    bounds = {}
+    for name, value in (("since", since), ("until", until)):
+        if value is not None:
+            bounds[name] = parse_timestamp(value)
+            if math.isnan(bounds[name]):
+                raise HTTPException(status_code=400, detail=f"Can't parse {name}={value!r} as a date")
+    filters = dict(domain=domain, provider=provider, type=type, status=status, min_score=min_score, **bounds)
+    matches = await asyncio.to_thread(source_store.query, limit=limit, **filters)
+    return {"sources": [source.to_dict() for source in matches]}
+
+@app.get("/sources/stats")
+async def sources_stats(by: str = "provider"):
+    if by not in DICTIONARY_COLUMNS:
+        raise HTTPException(status_code=400, detail=f"by must be one of {', '.join(DICTIONARY_COLUMNS)}")
+    return await asyncio.to_thread(source_store.stats, by)
+
+async def run_research(
+    message: str,
+    send,
+    request_id: Optional[str] = None,
+    use_answer_cache: bool = True,
+    priority: int = INTERACTIVE,
+):
+    """Run the search / verify loop for one user message, reporting events through ``send``.
+
+    ``send`` is awaited with each event dict (progress, delta, message, final or error). Grok
+    re-queries are capped at MAX_REFINEMENT_ROUNDS and the whole request at RESEARCH_DEADLINE_SECONDS.
+    Timing spans recorded during the run are tagged with ``request_id``. A finished answer to a
+    near-identical question is replayed from ``answer_cache`` unless ``use_answer_cache`` is False.
+    The first model turn is scheduled at ``priority`` and later calls no more urgently than
+    FOLLOW_UP, so nobody waits on a run started with BACKGROUND.
+    """
+    metrics.request_id.set(request_id or uuid4().hex)
+    # Sessions take turns for rate-limited providers
+    rate_limit.session.set(metrics.request_id.get())
+    if use_answer_cache and ANSWER_CACHE and await send_cached_answer(message, send):
+        metrics.requests_total.inc(outcome="cached")
+        return
+    metrics.sessions_in_flight.inc()
+    outcome = "ok"
+    chat_history: list[dict] = []
+    # The last message and final source list, kept for the answer cache
+    answer: dict = {}
+
+    async def send_and_record(event: dict):
+        if event["type"] == "message":
+            answer["content"] = event["content"]
+        elif event["type"] == "final":
+            answer["sources"] = event["sources"]
+        await send(event)
+
+    # Sources already sent to the model and the client during this request
+    source_index = SourceIndex()
+    fanout_task = None
+    if PROVIDER_FANOUT and provider_orchestrator.providers:
+        fanout_task = asyncio.create_task(search_providers(message, send, source_index))
+    try:
+        with metrics.span("request"):
+            await asyncio.wait_for(
+                research_loop(message, send_and_record, chat_history, source_index, fanout_task, priority),
+                timeout=RESEARCH_DEADLINE_SECONDS,
+            )
+        if ANSWER_CACHE and "sources" in answer:
+            answer_cache.store(message, answer)
+    except asyncio.TimeoutError:
+        outcome = "timeout"
+        print(f"Research deadline of {RESEARCH_DEADLINE_SECONDS}s exceeded")
+        await send({
+            "type": "error",
+            "content": f"Request did not finish within {RESEARCH_DEADLINE_SECONDS:g} seconds",
+            "chat_history": plain_history(chat_history)
+        })
+    except RateLimitExceeded as e:
+        outcome = "rate_limited"
+        print(f"Giving up on request: {str(e)}")
+        await send({
+            "type": "error",
+            "content": str(e),
+            "chat_history": plain_history(chat_history)
+        })
+    except Exception as e:
+        outcome = "error"
+        print(f"Error during conversation: {str(e)}")
+        await send({
+            "type": "error",
+            "content": str(e),
+            "chat_history": plain_history(chat_history)
+        })
+    finally:
+        if fanout_task is not None:
+            fanout_task.cancel()
+        metrics.sessions_in_flight.dec()
+        metrics.requests_total.inc(outcome=outcome)
+
+def plain_history(chat_history: list[dict]) -> list[dict]:
+    """``chat_history`` as plain JSON-ready dicts; assistant turns hold the SDK's tool-call objects."""
+    return [
+        {**message, "tool_calls": [call.model_dump() for call in message["tool_calls"]]}
+        if "tool_calls" in message else message
+        for message in chat_history
+    ]
+
+async def send_cached_answer(message: str, send) -> bool:
+    """Replay a cached answer to a similar question, refreshing it in the background if it is old."""
+    with metrics.span("answer_cache"):
+        cached = answer_cache.lookup(message)
+    if cached is None:
+        return False
+    entry, similarity = cached
+    await send({
+        "type": "progress",
+        "content": f"Reusing the answer to a similar question ({similarity:.2f}): {entry['question']}"
+    })
+    if entry["answer"].get("content"):
+        await send({
+            "type": "message",
+            "id": uuid4().hex,
+            "content": entry["answer"]["content"]
+        })
+    await send({
+        "type": "final",
+        "content": "Task Completed",
+        "sources": entry["answer"]["sources"],
+        "cached": True
+    })
+    if time.time() - entry["created_at"] > ANSWER_CACHE_REFRESH_AFTER and entry["question"] not in answer_refreshes:
+        question = entry["question"]
+        task = asyncio.create_task(run_research(question, discard_event, use_answer_cache=False, priority=BACKGROUND))
+        answer_refreshes[question] = task
+        task.add_done_callback(partial(refresh_finished, question))
+    return True
+
+def refresh_finished(question: str, task: asyncio.Task):
+    answer_refreshes.pop(question, None)
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Background refresh of {question!r} failed: {str(task.exception())}")
+
+async def discard_event(event: dict):
+    pass
+
+async def search_providers(message: str, send, source_index: SourceIndex) -> list[dict]:
+    """Fan the query out to every provider, sending each provider's new sources as they arrive."""
+    async def send_sources(provider_name: str, sources: list[dict]):
+        filtered, new_sources, _ = source_index.filter_result(sources)
+        if not new_sources:
+            return
+        results = [{**source, "page_age": source.get("date", "")} for source in filtered]
+        function_result_str = encode(summarize_result({"provider": provider_name, "data": {"results": results}})).decode()
+        await send({
+            "type": "progress",
+            "content": f"Function Result: {function_result_str}"
+        })
+
+    with metrics.span("provider_fanout"):
+        return await provider_orchestrator.search(message, on_sources=send_sources)
+
+def provider_sources_message(sources: list[dict]) -> dict:
+    summary = [
+        {"title": source.get("title", ""), "url": source["url"], "providers": source["providers"]}
+        for source in sources
+    ]
+    return {
+        "role": "system",
+        "content": "Sources already found by other search providers (the user has seen them): "
+        + json.dumps(summary, separators=(",", ":")),
+    }
+
+async def research_loop(
+    message: str,
+    send,
+    chat_history: list[dict],
+    source_index: SourceIndex,
+    fanout_task=None,
+    priority: int = INTERACTIVE,
+):
+    question = message
+    follow_up = max(priority, FOLLOW_UP)
+    refinement_round = 0
+    # Sources already written to source_store
+    recorded = 0
+    first_turn = True
+    while True:  # Inner conversation loop
+        # Hand the parallel providers' merged results to the model once they are in
+        if fanout_task is not None and fanout_task.done():
+            try:
+                chat_history.append(provider_sources_message(fanout_task.result()))
+            except Exception as e:
+                # The fan-out is optional; carry on with the agent's own searches
+                print(f"Provider fan-out failed: {str(e)}")
+            fanout_task = None
+
+        # Get OpenAI response, streaming tokens to the client as they arrive
+        message_id = uuid4().hex
+
+        async def send_delta(token: str):
+            await send({
+                "type": "delta",
+                "id": message_id,
+                "content": token
+            })
+
+        content, tool_calls = await get_completion(
+            context_window.fit([
+                {
+                    "role": "system",
+                    "content": prompt,
+                },
+                {
+                    "role": "user",
+                    "content": message,
+                },
+            ]
+            + chat_history),
+            on_delta=send_delta,
+            # The user is waiting on the first turn; later turns yield to other users' first turns
+            priority=priority if first_turn else follow_up,
+        )
+        first_turn = False
+
+        if content:
+            await send({
+                "type": "message",
+                "id": message_id,
+                "content": content
+            })
+
+            chat_history.append({"role": "assistant", "content": content})
+
+
+        if tool_calls:
+            # Send function call progress
+            for tool_call in tool_calls:
+                await send({
+                    "type": "progress",
+                    "content": f"Function Call: {tool_call.function.name}\nArguments: {tool_call.function.arguments}"
+                })
+            chat_history.append({
+                "role": "assistant",
+                "tool_calls": tool_calls
+            })
+
+            filtered_results = {}
+
+            async def send_result(tool_call, function_result):
+                # Drop sources already seen in an earlier search, then send what's new right away
+                filtered, new_sources, duplicates = source_index.filter_result(
+                    function_result, provider=tool_call.function.name.lower()
+                )
+                filtered_results[tool_call.id] = filtered
+                if duplicates and not new_sources:
+                    await send({
+                        "type": "progress",
+                        "content": f"Function Result: no new sources ({duplicates} already found)"
+                    })
+                    return
+                function_result_str = encode(summarize_result(filtered)).decode()
+                await send({
+                    "type": "progress",
+                    "content": f"Function Result: {function_result_str}"
+                })
+
+            await run_tool_calls(tool_calls, send_result, follow_up)
+            for tool_call in tool_calls:
+                chat_history.append(context_window.tool_message(tool_call.id, filtered_results[tool_call.id]))
+
+        else:
+            # Convert chat history messages to string for grok
+            chat_summary = "\n".join([
+                f"{msg.get('role')}: {msg.get('content', '')}" 
+                for msg in chat_history 
+                if msg.get('content')
+            ])
+            sources = source_index.sources
+            if VERIFY_SOURCES and sources:
+                await verify_sources(question, sources, send)
+            # Score every collected source locally; only spend a Grok call when the result is in doubt
+            with metrics.span("scoring", sources=len(sources)):
+                scores = score_sources(sources)
+            # Pages that failed the check count against confidence and go to the end of the list
+            failed = [source.get("verification", {}).get("status") in (UNREACHABLE, UNSUPPORTED) for source in sources]
+            ranked = [
+                source for _, _, source in sorted(zip(failed, scores.tolist(), sources), key=lambda row: (row[0], -row[1]))
+            ]
+            confident = sum(score > AMBIGUOUS_BAND[1] and not bad for score, bad in zip(scores.tolist(), failed))
+            if SOURCE_STORE:
+                # Off the loop: the store's lock may be held by a /sources scan, and flushes write files
+                await asyncio.to_thread(
+                    source_store.add_many, [Source.from_dict(source, query=question) for source in sources[recorded:]]
+                )
+                recorded = len(sources)
+
+            # Verify while the results are being delivered rather than after
+            verdict_task = None
+            if confident < CONFIDENT_SOURCES:
+                verdict_task = asyncio.create_task(grok_search(chat_summary))
+            try:
+                await send({
+                    "type": "final",
+                    "content": f"Task Completed",
+                    "sources": ranked
+                })
+            except BaseException:
+                if verdict_task is not None:
+                    verdict_task.cancel()
+                raise
+            if verdict_task is None:
+                break
+            verdict = await verdict_task
+            if is_satisfied(verdict):
+                break
+            refinement_round += 1
+            if refinement_round > MAX_REFINEMENT_ROUNDS:
+                print(f"Stopping after {MAX_REFINEMENT_ROUNDS} refinement rounds")
+                break
+            await send({
+                "type": "progress",
+                "content": f"Refining search ({refinement_round}/{MAX_REFINEMENT_ROUNDS}): {verdict}"
+            })
+            message = verdict
+
+async def verify_sources(question: str, sources: list[dict], send):
+    """Fetch the pages of up to VERIFY_MAX_SOURCES sources, attaching a ``verification`` dict to each.
+
+    The check only informs the ranking: if it fails, the answer goes out with the sources unchecked.
+    """
+    try:
+        with metrics.span("verify", sources=len(sources)):
+            outcomes = await page_verifier.verify(
+                sources[:VERIFY_MAX_SOURCES], claim=question, deadline=VERIFY_DEADLINE_SECONDS
+            )
+    except Exception as e:
+        print(f"Source verification failed: {str(e)}")
+        return
+    if not outcomes:
+        return
+    for outcome, count in outcomes.items():
+        metrics.pages_verified.inc(count, outcome=outcome)
+    await send({
+        "type": "progress",
+        "content": "Checked source pages: " + ", ".join(f"{count} {outcome}" for outcome, count in sorted(outcomes.items()))
+    })
+
+# Research runs as jobs so it survives disconnects; point JOB_STORE_PATH at a shared SQLite
+# file and set JOB_WORKERS=0 to leave the work to separate `python worker.py` processes
+job_queue = JobQueue(
+    JobStore(os.getenv("JOB_STORE_PATH", ":memory:")),
+    run_research,
+    workers=int(os.getenv("JOB_WORKERS", "64")),
+    # Seconds a worker's claim on a job lasts without a heartbeat; a dead worker's jobs are retried after it
+    lease=float(os.getenv("JOB_LEASE_SECONDS", "30")),
+    # Seconds a client follows a job that makes no progress before it is told so
+    max_idle=float(os.getenv("JOB_SUBSCRIBE_IDLE_SECONDS", "300")),
+)
+
+async def submit_job(message: str, priority: int = INTERACTIVE) -> tuple[str, bool]:
+    """Queue research for ``message`` at ``priority``; returns ``(job_id, joined)``.
+
+    With SINGLE_FLIGHT an identical question already being researched is joined instead, and
+    its earlier events are replayed to the new subscriber from the job log.
+    """
+    if not SINGLE_FLIGHT:
+        return await job_queue.submit(message, priority), False
+    job_id, joined = await job_queue.submit_or_join(message, query_key(message), priority)
+    if joined:
+        metrics.coalesced.inc(kind="request")
+    return job_id, joined
+
+async def collect_result(message: str, priority: int = INTERACTIVE) -> dict:
+    """Research ``message`` as a job and return the finished answer rather than its events."""
+    job_id, joined = await submit_job(message, priority)
+    result = {"job_id": job_id, "message": message, "joined": joined, "status": "done", "answer": None, "sources": []}
+    finished = False
+    async for _, event in job_queue.subscribe(job_id):
+        if event["type"] == "message":
+            result["answer"] = event["content"]
+        elif event["type"] == "final":
+            # A refinement round sends a newer final list
+            finished = True
+            result["sources"] = event["sources"]
+            result["cached"] = bool(event.get("cached"))
+        elif event["type"] == "error":
+            result["error"] = event["content"]
+    job = await job_queue.get_job(job_id)
+    if not finished and ("error" in result or job is None or job["status"] == FAILED):
+        result["status"] = "failed"
+    return result
+
+async def process_batch(messages: list[str], concurrency: int):
+    """Yield ``(index, result)`` for every message as its research finishes, ``concurrency`` at a time."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(index: int, message: str):
+        async with semaphore:
+            try:
+                # Nobody is watching a batch query arrive; interactive users' requests go first
+                return index, await collect_result(message, BACKGROUND)
+            except Exception as e:
+                return index, {"message": message, "status": "failed", "error": str(e)}
+
+    tasks = [asyncio.create_task(run(index, message)) for index, message in enumerate(messages)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # The client went away; queries not yet submitted are dropped, submitted jobs finish
+        for task in tasks:
+            task.cancel()
+
+def ndjson(rows) -> StreamingResponse:
+    async def lines():
+        async for row in rows:
+            yield encode(row) + b"\n"
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@app.post("/process")
+async def process(request: MessageRequest):
+    """Research one message over HTTP; the same job pipeline as the WebSocket, without a socket."""
+    if request.stream:
+        job_id, _ = await submit_job(request.message)
+
+        async def events():
+            async for seq, event in job_queue.subscribe(job_id):
+                yield {**event, "job_id": job_id, "seq": seq}
+        return ndjson(events())
+    result = await collect_result(request.message)
+    if result["status"] == "failed":
+        raise HTTPException(status_code=502, detail=result.get("error") or "Research failed")
+    return result
+
+@app.post("/process/batch")
+async def process_batch_endpoint(request: BatchRequest):
+    """Research many messages, at most ``concurrency`` at a time, sharing caches and in-flight jobs."""
+    if len(request.messages) > PROCESS_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"At most {PROCESS_BATCH_MAX} messages per batch")
+    concurrency = max(1, min(request.concurrency or PROCESS_BATCH_CONCURRENCY, PROCESS_BATCH_CONCURRENCY))
+    rows = process_batch(request.messages, concurrency)
+    if request.stream:
+        async def indexed():
+            async for index, result in rows:
+                yield {"index": index, **result}
+        return ndjson(indexed())
+    results: list = [None] * len(request.messages)
+    async for index, result in rows:
+        results[index] = result
+    return {"results": results}
+
+def parse_client_message(text: str) -> dict:
+    """Accept plain text, {"message": ...} or {"type": "resume", "job_id": ..., "after": seq}."""
+    try:
+        data = json.loads(text)
+    except ValueError:
+        data = None
+    if isinstance(data, dict) and (data.get("type") == "resume" or "message" in data):
+        return data
+    return {"message": text}
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     print("WebSocket connection attempt...")
     await websocket.accept()
     print("WebSocket connection accepted")
+    # Frames are queued and sent by a separate task, so a slow client never holds up a job
+    channel = EventChannel(websocket, max_queue=WS_MAX_QUEUE, binary=WS_BINARY_FRAMES)
+    channel.start()
     
     try:
         while True:  # Keep connection alive
             try:
                 # Wait for message with timeout
-                message = await asyncio.wait_for(
+                text = await asyncio.wait_for(
                     websocket.receive_text(),
                     timeout=60.0  # Disconnect if no message received in 60 seconds
                 )
-                print(f"Received message: {message}")
-
-                await websocket.send_json({
-                    "type": "progress",
-                    "content": "Processing your request..."
-                })
+                print(f"Received message: {text}")
+                request = parse_client_message(text)
 
-                chat_history: list[dict] = []
-                # Process the conversation
-                try:
-                    while True:  # Inner conversation loop
-                        # Get OpenAI response
-                        response = openai.chat.completions.create(
-                            model="gpt-4o",
-                            messages=[
-                                {
-                                    "role": "system",
-                                    "content": prompt,
-                                },
-                                {
-                                    "role": "user",
-                                    "content": message,
-                                },
-                            ]
-                            + chat_history,
-                            tools=function_definitions_list,
-                        )
-
-                        content = response.choices[0].message.content
-                        tool_call = (
-                            response.choices[0].message.tool_calls[0] 
-                            if response.choices[0].message.tool_calls 
-                            else None
-                        )
-                        if content:
-                            await websocket.send_json({
-                                "type": "message",
-                                "content": content
-                            })
-
-                            chat_history.append({"role": "assistant", "content": content})
-
-
-                        if tool_call:
-                            # Send function call progress
-                            await websocket.send_json({
-                                "type": "progress",
-                                "content": f"Function Call: {tool_call.function.name}\nArguments: {tool_call.function.arguments}"
-                            })
-                            chat_history.append({
-                                "role": "assistant",
-                                "tool_calls": [tool_call]
-                            })
-
-                            function_result = aci.handle_function_call(
-                                tool_call.function.name,
-                                json.loads(tool_call.function.arguments),
-                                linked_account_owner_id=LINKED_ACCOUNT_OWNER_ID,
-                                allowed_apps_only=True,
-                                format=FunctionDefinitionFormat.OPENAI,
-                            )
-
-                            function_result_str = json.dumps(function_result, indent=2)
-                        
-                            # Send function result
-                            await websocket.send_json({
-                                "type": "progress",
-                                "content": f"Function Result: {function_result_str}"
-                            })
-                            chat_history.append({"role": "tool", "tool_call_id": tool_call.id, "content": json.dumps(function_result)})
-
-                        else:
-                            await websocket.send_json({
-                                "type": "final",
-                                "content": f"Task Completed"
-                            })
-                            # Convert chat history messages to string for grok
-                            chat_summary = "\n".join([
-                                f"{msg.get('role')}: {msg.get('content', '')}" 
-                                for msg in chat_history 
-                                if msg.get('content')
-                            ])
-                            response = grok_search(chat_summary)
-                            if response == "yes":
-                                break
-                            else:
-                                message = response
-                                continue
-
-
-                except Exception as e:
-                    print(f"Error during conversation: {str(e)}")
-                    await websocket.send_json({
-                        "type": "error",
-                        "content": str(e),
-                        "chat_history": chat_history
+                after = 0
+                if request.get("type") == "resume":
+                    # Replay a job's events after the last one the client saw, then keep following it
+                    job_id = request.get("job_id", "")
+                    try:
+                        after = int(request.get("after", 0))
+                    except (TypeError, ValueError, OverflowError):
+                        after = -1
+                    if after < 0:
+                        channel.put({
+                            "type": "error",
+                            "content": f"Invalid resume position {request.get('after')!r}"
+                        })
+                        channel.put({"type": "done", "job_id": job_id})
+                        continue
+                    if await job_queue.get_job(job_id) is None:
+                        channel.put({
+                            "type": "error",
+                            "content": f"Unknown job {job_id}"
+                        })
+                        # Pruned or never existed; nothing to resume
+                        channel.put({"type": "done", "job_id": job_id})
+                        continue
+                else:
+                    job_id, joined = await submit_job(request["message"])
+                    channel.put({
+                        "type": "progress",
+                        "content": "Joining an identical request in progress..." if joined else "Processing your request...",
+                        "request_id": job_id,
+                        "job_id": job_id
                     })
 
+                # Stream the job's events; if the socket drops the job keeps running
+                async for seq, event in job_queue.subscribe(job_id, after):
+                    channel.put({**event, "job_id": job_id, "seq": seq})
+                # The job has ended (refinement rounds included), so the client can stop tracking it
+                channel.put({"type": "done", "job_id": job_id})
+
             except asyncio.TimeoutError:
                 print("Client timed out - no message received in 60 seconds")
                 break
@@ -187,6 +990,8 @@ async def websocket_endpoint(websocket: WebSocket):
 
     except Exception as e:
         print(f"WebSocket error: {str(e)}")
+    finally:
+        await channel.close()
 
 
 if __name__ == "__main__":
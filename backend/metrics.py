@@ -0,0 +1,135 @@
+import json
+import os
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+# Request ID of the research run the current task belongs to
+request_id: ContextVar[str] = ContextVar("request_id", default="-")
+
+# Print one JSON line per finished span; off by default to keep the hot path cheap
+TRACE_SPANS = os.getenv("TRACE_SPANS", "false").lower() == "true"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(sorted(labels.items()))
+        self.values[key] = self.values.get(key, 0.0) + amount
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_format_labels(labels)} {value:g}" for labels, value in self.values.items()]
+        return "\n".join(lines)
+
+
+class Gauge(Counter):
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def render(self) -> str:
+        return super().render().replace(f"# TYPE {self.name} counter", f"# TYPE {self.name} gauge")
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        # labels -> (per-bucket counts incl. +Inf, sum, count)
+        self.series: Dict[Labels, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in self.series.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f"{self.name}_bucket{_format_labels(labels, ('le', le))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {total:g}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return "\n".join(lines)
+
+
+stage_latency = Histogram("origins_stage_latency_seconds", "Latency of each pipeline stage")
+llm_tokens = Counter("origins_llm_tokens_total", "Tokens used per model call, by model and kind")
+llm_calls = Counter("origins_llm_calls_total", "Model calls, by model")
+sessions_in_flight = Gauge("origins_sessions_in_flight", "Research requests currently running")
+requests_total = Counter("origins_requests_total", "Finished research requests, by outcome")
+ws_frames = Counter("origins_ws_frames_total", "WebSocket frames sent to clients")
+ws_events_dropped = Counter("origins_ws_events_dropped_total", "Progress events dropped for slow clients")
+pages_verified = Counter("origins_pages_verified_total", "Source pages checked against their claims, by outcome")
+coalesced = Counter("origins_coalesced_total", "Requests and tool calls that joined an identical one in flight, by kind")
+
+
+@contextmanager
+def span(stage: str, **attributes):
+    """Time a pipeline stage into ``stage_latency``; with TRACE_SPANS, also print it as JSON."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start, **attributes)
+
+
+def observe(stage: str, duration: float, **attributes):
+    """Record ``duration`` seconds for ``stage``, for stages timed by hand rather than with ``span``."""
+    stage_latency.observe(duration, stage=stage)
+    if TRACE_SPANS:
+        print(json.dumps({
+            "request_id": request_id.get(),
+            "stage": stage,
+            "duration_ms": round(duration * 1000, 2),
+            **attributes,
+        }))
+
+
+def token_count(usage, kind: str) -> int:
+    """``usage.<kind>_tokens`` from an SDK usage object or a raw API ``usage`` dict."""
+    key = f"{kind}_tokens"
+    value = usage.get(key) if isinstance(usage, dict) else getattr(usage, key, None)
+    return value or 0
+
+
+def record_usage(model: str, usage) -> None:
+    """Count prompt/completion tokens from an OpenAI-style ``usage`` object or dict (may be None)."""
+    llm_calls.inc(model=model)
+    if usage is None:
+        return
+    llm_tokens.inc(token_count(usage, "prompt"), model=model, kind="prompt")
+    llm_tokens.inc(token_count(usage, "completion"), model=model, kind="completion")
+
+
+def render() -> str:
+    metrics = (
+        stage_latency, llm_tokens, llm_calls, sessions_in_flight, requests_total, ws_frames, ws_events_dropped,
+        coalesced, pages_verified,
+    )
+    return "\n".join(metric.render() for metric in metrics) + "\n"
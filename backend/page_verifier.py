@@ -0,0 +1,355 @@
+import asyncio
+import codecs
+import ipaddress
+import math
+import re
+import time
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+from credibility import parse_timestamp, source_date
+from source_index import canonicalize_url
+
+USER_AGENT = "Mozilla/5.0 (compatible; OriginsSourceCheck/1.0)"
+# Text kept per page; enough to find the claim without holding long pages in memory
+MAX_TEXT_CHARS = 50_000
+# Share of a claim's terms a page must contain to count as supporting it
+SUPPORT_THRESHOLD = 0.5
+# Characters of the best-matching passage included as evidence
+EVIDENCE_CHARS = 300
+
+# Elements whose text is boilerplate rather than the page's content
+SKIPPED_TAGS = {"script", "style", "noscript", "template", "svg", "nav", "header", "footer", "aside", "form",
+                "button", "select", "iframe"}
+# Elements that start a new block of text
+BLOCK_TAGS = {"p", "div", "br", "li", "tr", "td", "h1", "h2", "h3", "h4", "h5", "h6", "blockquote", "pre",
+              "article", "section", "main", "figcaption", "dd", "dt"}
+# <meta> names/properties carrying the publish date, most specific first
+DATE_META = ("article:published_time", "og:published_time", "datepublished", "parsely-pub-date",
+             "sailthru.date", "dc.date", "dc.date.issued", "dcterms.created", "pubdate", "publish-date", "date")
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+JSON_LD_DATE = re.compile(r'"datePublished"\s*:\s*"([^"]+)"')
+TERM = re.compile(r"[^\W_]{4,}|\d+(?:[.,]\d+)*")
+PASSAGE_END = re.compile(r"(?<=[.!?])\s+|\n")
+
+# Verification outcomes
+SUPPORTED = "supported"
+UNSUPPORTED = "unsupported"
+UNREACHABLE = "unreachable"
+SKIPPED = "skipped"
+TIMEOUT = "timeout"
+
+
+class PageExtractor(HTMLParser):
+    def __init__(self, max_chars: int = MAX_TEXT_CHARS):
+        """Incremental HTML parser keeping the visible text, title and publish date of a page.
+
+        Feed it chunks as they arrive; nothing but the extracted text (up to ``max_chars``) is kept.
+        """
+        super().__init__(convert_charrefs=True)
+        self.max_chars = max_chars
+        self.title = ""
+        self.published = ""
+        self._dates: Dict[str, str] = {}
+        self._blocks: List[str] = []
+        self._current: List[str] = []
+        self._chars = 0
+        self._skip_depth = 0
+        self._in_title = False
+        self._json_ld: Optional[List[str]] = None
+
+    @property
+    def full(self) -> bool:
+        return self._chars >= self.max_chars
+
+    @property
+    def has_date(self) -> bool:
+        return bool(self._dates)
+
+    def feed_text(self, text: str):
+        """Add plain (non-HTML) text."""
+        self.handle_data(text)
+
+    def handle_starttag(self, tag, attrs):
+        attributes = {name: value or "" for name, value in attrs}
+        if tag == "meta":
+            name = (attributes.get("property") or attributes.get("name") or attributes.get("itemprop") or "").lower()
+            if name in DATE_META and attributes.get("content"):
+                self._dates.setdefault(name, attributes["content"])
+        elif tag == "time" and attributes.get("datetime"):
+            self._dates.setdefault("time", attributes["datetime"])
+        elif tag == "title":
+            self._in_title = True
+        elif tag == "script" and attributes.get("type", "").lower() == "application/ld+json":
+            self._json_ld = []
+        if tag in SKIPPED_TAGS and tag not in VOID_TAGS:
+            self._skip_depth += 1
+        elif tag in BLOCK_TAGS:
+            self._end_block()
+
+    def handle_endtag(self, tag):
+        if tag == "title":
+            self._in_title = False
+        elif tag == "script" and self._json_ld is not None:
+            match = JSON_LD_DATE.search("".join(self._json_ld))
+            if match:
+                self._dates.setdefault("json-ld", match.group(1))
+            self._json_ld = None
+        if tag in SKIPPED_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+        elif tag in BLOCK_TAGS:
+            self._end_block()
+
+    def handle_data(self, data):
+        if self._json_ld is not None:
+            self._json_ld.append(data)
+        elif self._in_title:
+            self.title += data
+        elif not self._skip_depth and not self.full:
+            self._current.append(data)
+            self._chars += len(data)
+
+    def _end_block(self):
+        text = " ".join("".join(self._current).split())
+        if text:
+            self._blocks.append(text)
+        self._current = []
+
+    def finish(self):
+        self.close()
+        self._end_block()
+        self.title = " ".join(self.title.split())
+        for name in ("json-ld", *DATE_META, "time"):
+            value = self._dates.get(name, "").strip()
+            if value and not math.isnan(parse_timestamp(value)):
+                self.published = value
+                break
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self._blocks)[: self.max_chars]
+
+
+def terms(text: str) -> Set[str]:
+    return set(TERM.findall(re.sub(r"<[^>]+>", " ", text).lower()))
+
+
+def support_of(claim: str, text: str) -> Tuple[float, str]:
+    """Share of the claim's terms found in ``text``, and the passage containing the most of them."""
+    claim_terms = terms(claim)
+    if not claim_terms:
+        return 0.0, ""
+    page_terms = terms(text)
+    best, best_overlap = "", 0
+    for passage in PASSAGE_END.split(text):
+        overlap = len(claim_terms & terms(passage))
+        if overlap > best_overlap:
+            best, best_overlap = passage, overlap
+    return len(claim_terms & page_terms) / len(claim_terms), best[:EVIDENCE_CHARS]
+
+
+def is_public_url(url: str) -> bool:
+    """False for non-HTTP URLs, malformed ones and hosts that are loopback, private or link-local addresses."""
+    try:
+        parts = urlsplit(url)
+        hostname = parts.hostname
+        parts.port  # Validated on access
+    except ValueError:  # e.g. an unbalanced "[" in the host or a port out of range
+        return False
+    if parts.scheme not in ("http", "https") or not hostname:
+        return False
+    host = hostname.lower()
+    if host == "localhost" or host.endswith(".localhost"):
+        return False
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return True
+    return address.is_global
+
+
+class PageVerifier:
+    def __init__(
+        self,
+        max_concurrency: int = 32,
+        per_host: int = 4,
+        max_bytes: int = 512 * 1024,
+        timeout: float = 4.0,
+        allow_private: bool = False,
+    ):
+        """Fetches source pages and checks that they back up what was said about them.
+
+        Args:
+            max_concurrency: Pages fetched at the same time across all hosts.
+            per_host: Pages fetched at the same time from any one host.
+            max_bytes: Bytes read per page; the rest of a longer page is never downloaded.
+            timeout: Seconds allowed per page, including redirects.
+            allow_private: Also fetch loopback and private addresses (for local fixture servers).
+                Only literal addresses are checked; names resolving to private addresses are not.
+        """
+        self.max_concurrency = max_concurrency
+        self.per_host = per_host
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.allow_private = allow_private
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop = None
+        self._hosts: Dict[str, asyncio.Semaphore] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _session(self) -> httpx.AsyncClient:
+        # Pooled connections are bound to the loop that opened them
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            self._client = httpx.AsyncClient(
+                follow_redirects=True,
+                max_redirects=5,
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency),
+                headers={"User-Agent": USER_AGENT, "Accept": "text/html,application/xhtml+xml,text/plain;q=0.8"},
+                event_hooks={"request": [self._check_request]},
+            )
+            self._loop = loop
+            self._hosts = {}
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._client
+
+    async def _check_request(self, request: httpx.Request):
+        # Runs for every redirect too, so a public page can't bounce the fetch to an internal one
+        if not self.allow_private and not is_public_url(str(request.url)):
+            raise httpx.UnsupportedProtocol(f"Refusing to fetch {request.url}")
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def fetch(self, url: str) -> Dict:
+        """Stream ``url`` through a PageExtractor; returns the fetch outcome and what was extracted."""
+        client = self._session()
+        result = {"url": url, "status": UNREACHABLE}
+        try:
+            host = (urlsplit(url).hostname or "").lower()
+        except ValueError:
+            result["error"] = "InvalidURL"
+            return result
+        host_semaphore = self._hosts.setdefault(host, asyncio.Semaphore(self.per_host))
+        async with self._semaphore, host_semaphore:
+            start = time.perf_counter()
+            try:
+                await asyncio.wait_for(self._read(client, url, result), timeout=self.timeout)
+            # InvalidURL is not an HTTPError; ValueError covers UnicodeError and URLs httpx can't parse
+            except (httpx.HTTPError, httpx.InvalidURL, asyncio.TimeoutError, ValueError, LookupError) as e:
+                result["status"] = UNREACHABLE
+                result["error"] = type(e).__name__
+            result["elapsed_ms"] = round((time.perf_counter() - start) * 1000)
+        return result
+
+    async def _read(self, client: httpx.AsyncClient, url: str, result: Dict):
+        async with client.stream("GET", url) as response:
+            result["http_status"] = response.status_code
+            result["final_url"] = str(response.url)
+            content_type = response.headers.get("content-type", "").lower()
+            if response.status_code >= 400:
+                return
+            if "html" not in content_type and "text/plain" not in content_type:
+                result["status"] = SKIPPED
+                result["content_type"] = content_type.split(";")[0]
+                return
+            extractor = PageExtractor()
+            decoder = codecs.getincrementaldecoder(response.charset_encoding or "utf-8")(errors="replace")
+            received = 0
+            async for chunk in response.aiter_bytes():
+                chunk = chunk[: self.max_bytes - received]
+                received += len(chunk)
+                if "html" in content_type:
+                    extractor.feed(decoder.decode(chunk))
+                else:
+                    extractor.feed_text(decoder.decode(chunk))
+                # Stop downloading once the cap is hit or nothing more would be kept
+                if received >= self.max_bytes or (extractor.full and extractor.has_date):
+                    break
+            extractor.finish()
+        result.update({
+            "status": "fetched",
+            "bytes": received,
+            "title": extractor.title,
+            "published": extractor.published,
+            "text": extractor.text,
+        })
+
+    async def verify(self, sources: List[Dict], claim: str = "", deadline: Optional[float] = None) -> Dict[str, int]:
+        """Fetch every source's page and attach a ``verification`` dict to it.
+
+        A page supports a source when it contains most of the terms of the source's
+        description (or of ``claim``, the user's question, when there is no description). A
+        publish date found on the page fills in a missing ``date``. Sources already verified
+        are skipped; pages still loading after ``deadline`` seconds are marked as timed out.
+        Returns the number of sources per outcome.
+        """
+        pending = [
+            source for source in sources
+            if "verification" not in source and (source.get("url") or source.get("source_url"))
+        ]
+        # Copies of a page found by several searches are fetched once
+        by_url: Dict[str, List[Dict]] = {}
+        for source in pending:
+            try:
+                key = canonicalize_url(source.get("url") or source["source_url"])
+            except ValueError:
+                source["verification"] = {"status": SKIPPED}
+                continue
+            by_url.setdefault(key, []).append(source)
+        tasks = {}
+        for group in by_url.values():
+            url = group[0].get("url") or group[0]["source_url"]
+            if self.allow_private or is_public_url(url):
+                tasks[asyncio.ensure_future(self.fetch(url))] = group
+            else:
+                for source in group:
+                    source["verification"] = {"status": SKIPPED}
+        done, not_done = await asyncio.wait(tasks, timeout=deadline) if tasks else (set(), set())
+        for task in not_done:
+            task.cancel()
+        await asyncio.gather(*not_done, return_exceptions=True)
+
+        counts: Dict[str, int] = {}
+        for task, group in tasks.items():
+            if task not in done:
+                page = {"status": TIMEOUT}
+            elif task.exception() is not None:
+                # One page failing in an unexpected way doesn't cost the others their verdicts
+                page = {"status": UNREACHABLE, "error": type(task.exception()).__name__}
+            else:
+                page = task.result()
+            for source in group:
+                source["verification"] = self._verdict(source, page, claim)
+                if page.get("published") and not source_date(source):
+                    source["date"] = page["published"]
+        for source in pending:
+            status = source["verification"]["status"]
+            counts[status] = counts.get(status, 0) + 1
+        return counts
+
+    @staticmethod
+    def _verdict(source: Dict, page: Dict, claim: str) -> Dict:
+        fields = ("status", "http_status", "final_url", "published", "error", "elapsed_ms")
+        verdict = {name: page[name] for name in fields if page.get(name)}
+        if page["status"] != "fetched":
+            return verdict
+        description = source.get("description") or source.get("source_description") or ""
+        statement = description if len(terms(description)) >= 3 else claim
+        support, evidence = support_of(statement, page["text"])
+        verdict.update({
+            "status": SUPPORTED if support >= SUPPORT_THRESHOLD else UNSUPPORTED,
+            "support": round(support, 3),
+            "evidence": evidence,
+            "bytes": page["bytes"],
+        })
+        if claim:
+            # How much of the user's question the page covers
+            verdict["relevance"] = round(support_of(claim, page["text"])[0], 3)
+        return verdict
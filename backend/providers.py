@@ -0,0 +1,228 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from sonar import SourceStreamParser
+from source_index import canonicalize_url
+
+# Samples needed before a provider's p95 latency is trusted for hedging
+MIN_HEDGE_SAMPLES = 20
+# Consecutive failures after which a provider is skipped for FAILURE_COOLDOWN seconds
+MAX_CONSECUTIVE_FAILURES = 3
+FAILURE_COOLDOWN = 30.0
+
+
+SOURCE_LIST_PROMPT = (
+    "List up to {max_results} real, verifiable sources (news articles, papers, posts, videos) about: {query}\n"
+    "Respond ONLY with a JSON array of objects with the keys title, url, description and date."
+)
+
+
+def sources_from_result(result) -> List[Dict]:
+    """Flatten a search tool result (``data.results`` or ``data.web.results`` shaped) into source dicts."""
+    if isinstance(result, list):
+        return [source for item in result for source in sources_from_result(item)]
+    if not isinstance(result, dict):
+        return []
+    if "url" in result:
+        return [{
+            "title": result.get("title", ""),
+            "url": result["url"],
+            "description": result.get("description") or result.get("summary", ""),
+            "date": result.get("page_age") or result.get("date") or result.get("year", ""),
+            "type": result.get("type", ""),
+        }]
+    return [source for value in result.values() for source in sources_from_result(value)]
+
+
+def source_list_messages(query: str, max_results: int = 8) -> List[Dict]:
+    return [{"role": "user", "content": SOURCE_LIST_PROMPT.format(max_results=max_results, query=query)}]
+
+
+def llm_search(client, model: str, max_results: int = 8, on_usage: Optional[Callable[[Any], None]] = None):
+    """Provider search function that asks an OpenAI-compatible chat model for sources.
+
+    ``on_usage`` is called with each completion's ``usage`` (which may be None).
+    """
+    async def search(query: str) -> List[Dict]:
+        completion = await client.chat.completions.create(
+            model=model,
+            messages=source_list_messages(query, max_results),
+        )
+        if on_usage is not None:
+            on_usage(getattr(completion, "usage", None))
+        parser = SourceStreamParser()
+        return sources_from_result(parser.feed(completion.choices[0].message.content or "") + parser.finish())
+    return search
+
+
+class Provider:
+    def __init__(
+        self,
+        name: str,
+        search: Callable[[str], Awaitable[List[Dict]]],
+        weight: float = 1.0,
+        hedge: bool = True,
+        streaming: bool = False,
+    ):
+        """A source backend the orchestrator can query.
+
+        Args:
+            name: Label attached to every source the provider returns.
+            search: Coroutine function taking a query and returning source dicts with at least a ``url``.
+            weight: How much the provider's ranking counts when results are merged.
+            hedge: Whether a duplicate request may be fired when the first one is slower than usual.
+            streaming: ``search`` is called as ``search(query, on_sources)`` and awaits
+                ``on_sources(sources)`` for each batch as it arrives, before returning the full
+                list. Streaming providers are never hedged.
+        """
+        self.name = name
+        self.search = search
+        self.weight = weight
+        self.hedge = hedge and not streaming
+        self.streaming = streaming
+        self.latencies = deque(maxlen=200)
+        self.consecutive_failures = 0
+        self.unhealthy_until = 0.0
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.unhealthy_until
+
+    def p95_latency(self) -> Optional[float]:
+        if len(self.latencies) < MIN_HEDGE_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+    def record_success(self, latency: float):
+        self.latencies.append(latency)
+        self.consecutive_failures = 0
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= MAX_CONSECUTIVE_FAILURES:
+            self.unhealthy_until = time.monotonic() + FAILURE_COOLDOWN
+
+
+class ProviderOrchestrator:
+    def __init__(self, providers: List[Provider], min_sources: int = 8, min_providers: int = 2, timeout: float = 20.0):
+        """Queries several providers at once and merges their sources as they arrive.
+
+        Args:
+            providers: Backends to query.
+            min_sources: Distinct sources that, together with ``min_providers``, count as good enough.
+                Once reached, providers that haven't answered yet are cancelled.
+            min_providers: Providers that must have answered before stopping early.
+            timeout: Upper bound for the whole fan-out in seconds.
+        """
+        self.providers = providers
+        self.min_sources = min_sources
+        self.min_providers = min_providers
+        self.timeout = timeout
+
+    async def search(self, query: str, on_sources=None) -> List[Dict]:
+        """Return merged, ranked sources for ``query``.
+
+        ``on_sources`` is awaited with ``(provider_name, sources)`` as each provider answers, or
+        for each batch a streaming provider sends. Sources are ranked by weighted reciprocal rank
+        across providers, so results several providers agree on come first.
+        """
+        providers = [provider for provider in self.providers if provider.healthy]
+        if not providers:
+            return []
+        merged: Dict[str, Dict] = {}
+        # Provider name -> sources already merged and reported while it was still streaming
+        reported: Dict[str, int] = {}
+
+        async def report(provider: Provider, sources: List[Dict]):
+            self._merge(merged, provider, sources, start_rank=reported.get(provider.name, 0))
+            reported[provider.name] = reported.get(provider.name, 0) + len(sources)
+            if on_sources and sources:
+                await on_sources(provider.name, sources)
+
+        tasks = {asyncio.create_task(self._hedged(provider, query, report)): provider for provider in providers}
+        answered = 0
+        deadline = time.monotonic() + self.timeout
+        try:
+            pending = set(tasks)
+            while pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    provider = tasks[task]
+                    if task.exception() is not None:
+                        print(f"Provider {provider.name} failed: {task.exception()}")
+                        continue
+                    answered += 1
+                    # Whatever a streaming provider already reported isn't sent twice
+                    await report(provider, task.result()[reported.get(provider.name, 0):])
+                if len(merged) >= self.min_sources and answered >= min(self.min_providers, len(providers)):
+                    break
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        return sorted(merged.values(), key=lambda source: source["score"], reverse=True)
+
+    async def _hedged(self, provider: Provider, query: str, report=None) -> List[Dict]:
+        """Run a provider query, firing a duplicate if the first one outlives the provider's p95 latency."""
+        first = asyncio.create_task(self._timed(provider, query, report))
+        hedge_after = provider.p95_latency() if provider.hedge else None
+        if hedge_after is None:
+            return await first
+
+        done, _ = await asyncio.wait({first}, timeout=hedge_after)
+        if done:
+            return first.result()
+        second = asyncio.create_task(self._timed(provider, query))
+        attempts = {first, second}
+        try:
+            while attempts:
+                done, attempts = await asyncio.wait(attempts, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+            # Both attempts failed; surface the first error
+            return first.result()
+        finally:
+            for task in (first, second):
+                task.cancel()
+
+    async def _timed(self, provider: Provider, query: str, report=None) -> List[Dict]:
+        start = time.monotonic()
+        try:
+            if provider.streaming:
+                async def on_sources(sources: List[Dict]):
+                    if report is not None:
+                        await report(provider, self._tag(provider, sources))
+                sources = await provider.search(query, on_sources)
+            else:
+                sources = await provider.search(query)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            provider.record_failure()
+            raise
+        provider.record_success(time.monotonic() - start)
+        return self._tag(provider, sources)
+
+    @staticmethod
+    def _tag(provider: Provider, sources: List[Dict]) -> List[Dict]:
+        return [{**source, "provider": provider.name} for source in sources if source.get("url")]
+
+    @staticmethod
+    def _merge(merged: Dict[str, Dict], provider: Provider, sources: List[Dict], start_rank: int = 0):
+        for rank, source in enumerate(sources, start_rank):
+            key = canonicalize_url(source["url"])
+            contribution = provider.weight / (rank + 1)
+            if key in merged:
+                existing = merged[key]
+                existing["score"] += contribution
+                if provider.name not in existing["providers"]:
+                    existing["providers"].append(provider.name)
+            else:
+                merged[key] = {**source, "score": contribution, "providers": [provider.name]}
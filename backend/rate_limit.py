@@ -0,0 +1,307 @@
+import asyncio
+import random
+import time
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+# Request priorities, most urgent first
+INTERACTIVE = 0  # the first model turn a user is waiting on
+FOLLOW_UP = 1  # later turns and tool calls of a running request
+BACKGROUND = 2  # Grok re-queries and the provider fan-out
+
+# Session a call is queued under for fair sharing; research runs set it to their request ID
+session: ContextVar[str] = ContextVar("rate_limit_session", default="-")
+
+MAX_RETRY_AFTER = 120.0
+
+try:
+    import httpx
+
+    TRANSIENT_ERRORS: tuple = (ConnectionError, TimeoutError, httpx.TransportError)
+except ImportError:  # httpx is only needed for the Deepseek client
+    TRANSIENT_ERRORS = (ConnectionError, TimeoutError)
+try:
+    import openai
+
+    TRANSIENT_ERRORS += (openai.APIConnectionError,)
+except ImportError:
+    pass
+
+
+class RateLimitExceeded(Exception):
+    """A provider kept answering 429 after every retry."""
+
+    def __init__(self, provider: str):
+        super().__init__(f"{provider} is rate limiting requests, try again shortly")
+        self.provider = provider
+
+
+class SystemClock:
+    def monotonic(self) -> float:
+        return time.monotonic()
+
+    async def sleep(self, seconds: float):
+        await asyncio.sleep(seconds)
+
+
+@dataclass
+class Limit:
+    """Requests and tokens a provider allows per minute; None means unlimited.
+
+    ``burst`` is the share of a minute's allowance that may be spent at once. Providers count
+    over a sliding minute, so a full minute's burst followed by the steady refill would exceed it.
+    """
+
+    requests_per_minute: Optional[float] = None
+    tokens_per_minute: Optional[float] = None
+    burst: float = 1 / 6
+    max_retries: int = 4
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float, clock, burst: float = 1.0):
+        """Holds up to ``burst`` of a minute's allowance and refills continuously at ``per_minute``."""
+        self.capacity = max(1.0, per_minute * burst)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.clock = clock
+        self.updated = clock.monotonic()
+
+    def _refill(self):
+        now = self.clock.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until ``amount`` can be taken (0 if it can be taken now)."""
+        self._refill()
+        # A request larger than the whole bucket goes through once the bucket is full
+        missing = min(amount, self.capacity) - self.tokens
+        return max(0.0, missing / self.rate)
+
+    def take(self, amount: float):
+        """Remove ``amount``; negative amounts refund, and the balance may go negative (debt)."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - amount)
+
+
+class ProviderLimiter:
+    def __init__(self, name: str, limit: Limit, clock):
+        """Admits calls to one provider within its rate limits.
+
+        Waiting calls are served strictly by priority; within a priority, sessions take turns
+        so one long research run can't starve the others. After a 429 the whole provider is
+        paused until the server's Retry-After has passed.
+        """
+        self.name = name
+        self.limit = limit
+        self.clock = clock
+        self.requests = TokenBucket(limit.requests_per_minute, clock, limit.burst) if limit.requests_per_minute else None
+        self.tokens = TokenBucket(limit.tokens_per_minute, clock, limit.burst) if limit.tokens_per_minute else None
+        self.paused_until = 0.0
+        self.admitted = 0
+        self.rate_limited = 0
+        # priority -> session -> waiting (tokens, future), sessions in round-robin order
+        self._waiting: Dict[int, "OrderedDict[str, deque]"] = {}
+        self._timer: Optional[asyncio.Task] = None
+
+    @property
+    def queued(self) -> int:
+        return sum(len(waiters) for sessions in self._waiting.values() for waiters in sessions.values())
+
+    async def acquire(self, tokens: float = 0.0, priority: int = FOLLOW_UP, session_id: Optional[str] = None):
+        """Wait until a call costing ``tokens`` may start."""
+        future = asyncio.get_running_loop().create_future()
+        sessions = self._waiting.setdefault(priority, OrderedDict())
+        sessions.setdefault(session_id or session.get(), deque()).append((tokens, future))
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Admitted just as the caller gave up; give the allowance back
+                self.settle(tokens, 0.0)
+                if self.requests:
+                    self.requests.take(-1)
+            else:
+                self._discard(future)
+            raise
+
+    def settle(self, estimated: float, actual: float):
+        """Correct the token bucket once a call's real usage is known."""
+        if self.tokens and actual != estimated:
+            self.tokens.take(actual - estimated)
+
+    def pause(self, seconds: float):
+        """Hold every call to this provider for ``seconds`` (e.g. a 429's Retry-After)."""
+        self.rate_limited += 1
+        self.paused_until = max(self.paused_until, self.clock.monotonic() + seconds)
+        self._dispatch()
+
+    def _next(self):
+        for priority in sorted(self._waiting):
+            sessions = self._waiting[priority]
+            if sessions:
+                return priority, next(iter(sessions))
+        return None
+
+    def _dispatch(self):
+        while True:
+            head = self._next()
+            if head is None:
+                return
+            priority, session_id = head
+            sessions = self._waiting[priority]
+            tokens, future = sessions[session_id][0]
+            if future.done():  # cancelled while waiting
+                self._pop(priority, session_id)
+                continue
+            delay = max(
+                self.paused_until - self.clock.monotonic(),
+                self.requests.wait_time(1) if self.requests else 0.0,
+                self.tokens.wait_time(tokens) if self.tokens else 0.0,
+            )
+            if delay > 0:
+                self._schedule(delay)
+                return
+            if self.requests:
+                self.requests.take(1)
+            if self.tokens:
+                self.tokens.take(tokens)
+            self.admitted += 1
+            self._pop(priority, session_id)
+            future.set_result(None)
+
+    def _pop(self, priority: int, session_id: str):
+        sessions = self._waiting[priority]
+        waiters = sessions[session_id]
+        waiters.popleft()
+        if waiters:
+            # This session had its turn; the next session in line goes first
+            sessions.move_to_end(session_id)
+        else:
+            del sessions[session_id]
+
+    def _discard(self, future: asyncio.Future):
+        for sessions in self._waiting.values():
+            for session_id, waiters in list(sessions.items()):
+                for waiter in waiters:
+                    if waiter[1] is future:
+                        waiters.remove(waiter)
+                        if not waiters:
+                            del sessions[session_id]
+                        self._dispatch()
+                        return
+
+    def _schedule(self, delay: float):
+        loop = asyncio.get_running_loop()
+        if self._timer is not None and not self._timer.done() and self._timer.get_loop() is loop:
+            self._timer.cancel()
+
+        async def wake():
+            await self.clock.sleep(delay)
+            self._timer = None
+            self._dispatch()
+
+        self._timer = loop.create_task(wake())
+
+
+def status_of(error: BaseException) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+
+def is_rate_limited(error: BaseException) -> bool:
+    # The OpenAI and ACI SDKs both raise a RateLimitError; ACI's carries no status code
+    return status_of(error) == 429 or type(error).__name__ == "RateLimitError"
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Seconds from a Retry-After (or retry-after-ms) header on the error's response, if any."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class Scheduler:
+    def __init__(self, limits: Dict[str, Limit], clock=None, backoff_factor: float = 1.0):
+        """Central gate for outbound LLM and search calls.
+
+        Args:
+            limits: Per-provider limits. Providers not listed are called without limits.
+            clock: Object with ``monotonic()`` and ``async sleep()``; a fake one makes the
+                scheduling deterministic in benchmarks.
+            backoff_factor: Base delay for retries when the server gives no Retry-After.
+        """
+        self.clock = clock or SystemClock()
+        self.backoff_factor = backoff_factor
+        self.limiters = {name: ProviderLimiter(name, limit, self.clock) for name, limit in limits.items()}
+
+    async def call(
+        self,
+        provider: str,
+        request: Callable[[], Awaitable[Any]],
+        priority: int = FOLLOW_UP,
+        tokens: float = 0.0,
+    ) -> Any:
+        """Run ``request()`` once ``provider``'s limits allow it, retrying 429s and transient errors.
+
+        A 429 pauses every queued call to the provider for the server's Retry-After (or an
+        exponential backoff); when retries run out RateLimitExceeded is raised. Each attempt
+        reserves ``tokens``; a failed attempt gives its reservation back, so after success
+        only the caller's ``settle`` remains to correct it to the real usage.
+        """
+        limiter = self.limiters.get(provider)
+        if limiter is None:
+            return await request()
+        for attempt in range(limiter.limit.max_retries + 1):
+            await limiter.acquire(tokens, priority)
+            try:
+                return await request()
+            except Exception as e:
+                # A failed attempt used none of the tokens it reserved; the caller settles only a success
+                limiter.settle(tokens, 0.0)
+                if attempt == limiter.limit.max_retries:
+                    if is_rate_limited(e):
+                        raise RateLimitExceeded(provider) from e
+                    raise
+                delay = self.backoff_factor * 2 ** attempt * (1 + random.random())
+                if is_rate_limited(e):
+                    limiter.pause(min(retry_after(e) or delay, MAX_RETRY_AFTER))
+                elif isinstance(e, TRANSIENT_ERRORS) or (status_of(e) or 0) >= 500:
+                    await self.clock.sleep(delay)
+                else:
+                    raise
+                print(f"Retrying {provider} call after {type(e).__name__} (attempt {attempt + 1})")
+
+    def settle(self, provider: str, estimated: float, actual: float):
+        limiter = self.limiters.get(provider)
+        if limiter is not None:
+            limiter.settle(estimated, actual)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        now = self.clock.monotonic()
+        return {
+            name: {
+                "queued": limiter.queued,
+                "admitted": limiter.admitted,
+                "rate_limited": limiter.rate_limited,
+                "paused_for": max(0.0, limiter.paused_until - now),
+            }
+            for name, limiter in self.limiters.items()
+        }
@@ -0,0 +1,276 @@
+"""Record/replay server for the OpenAI, Grok, Deepseek and ACI HTTP APIs.
+
+Record real sessions by pointing the backend at the server in ``record`` mode; every call is
+forwarded upstream and appended to a JSONL fixture file:
+
+    python replay.py record --fixtures fixtures/session.jsonl
+    OPENAI_BASE_URL=http://127.0.0.1:8100/openai GROK_BASE_URL=http://127.0.0.1:8100/grok \\
+    DEEPSEEK_BASE_URL=http://127.0.0.1:8100/deepseek AIPOLABS_ACI_SERVER_URL=http://127.0.0.1:8100/aci/ \\
+    python main.py
+
+Then serve the fixtures without keys or network, with a chosen latency model:
+
+    python replay.py replay --fixtures fixtures/session.jsonl --latency lognormal:0.8,0.5
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+import time
+from typing import Dict, List, Optional
+
+import httpx
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import StreamingResponse
+
+UPSTREAMS = {
+    "openai": "https://api.openai.com/v1",
+    "grok": "https://api.x.ai/v1",
+    "deepseek": "https://api.deepseek.com",
+    "aci": "https://api.aci.dev/v1",
+}
+# Request headers passed on to the upstream API when recording
+FORWARDED_HEADERS = ("authorization", "x-api-key", "content-type", "accept", "openai-organization")
+# Request body fields that identify the account rather than the call; not matched on or stored
+ACCOUNT_FIELDS = ("linked_account_owner_id", "user")
+# Share of a streamed response's latency spent before the first chunk, when not recorded
+DEFAULT_FIRST_BYTE_SHARE = 0.2
+
+
+def first_user_message(body: Optional[Dict]) -> str:
+    messages = body.get("messages") or [] if isinstance(body, dict) else []
+    return next((m.get("content") or "" for m in messages if m.get("role") == "user"), "")
+
+
+def route_key(provider: str, path: str, body: Optional[Dict]) -> str:
+    """Looser key used when no exact recording exists: the endpoint plus the start of the prompt."""
+    return f"{provider} {path} {first_user_message(body)[:60]}"
+
+
+def request_key(provider: str, method: str, path: str, body: Optional[Dict], query: str = "") -> str:
+    """Key a call is matched on when replaying.
+
+    Chat completions match on the model, the first user message, how many assistant turns came
+    before and whether the response streams, so messages whose content varies between runs
+    (provider results arriving earlier or later) still find their recording. Everything else
+    matches on the exact request.
+    """
+    if path.endswith("chat/completions") and isinstance(body, dict):
+        turn = sum(1 for m in body.get("messages") or [] if m.get("role") == "assistant")
+        parts = [provider, path, body.get("model"), first_user_message(body), turn, bool(body.get("stream"))]
+    else:
+        parts = [provider, method, path, query, body]
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()[:32]
+
+
+class FixtureStore:
+    def __init__(self, path: str):
+        """Recorded calls, one JSON object per line, appended to ``path`` while recording."""
+        self.path = path
+        self.records: List[Dict] = []
+        self._by_key: Dict[str, List[Dict]] = {}
+        self._by_route: Dict[str, List[Dict]] = {}
+        self._used: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        self._index(json.loads(line))
+
+    def _index(self, record: Dict):
+        self.records.append(record)
+        self._by_key.setdefault(record["key"], []).append(record)
+        self._by_route.setdefault(route_key(record["provider"], record["path"], record.get("request")), []).append(record)
+
+    def append(self, record: Dict):
+        with self._lock:
+            self._index(record)
+            with open(self.path, "a") as f:
+                f.write(json.dumps(record) + "\n")
+
+    def match(self, key: str, provider: str, path: str, body: Optional[Dict] = None) -> Optional[Dict]:
+        """The recording for ``key``; else, in turn, the recordings of the same endpoint and prompt."""
+        with self._lock:
+            candidates = self._by_key.get(key)
+            if candidates:
+                self.hits += 1
+            else:
+                self.misses += 1
+                key = route_key(provider, path, body)
+                candidates = self._by_route.get(key)
+                if not candidates:
+                    return None
+            # Repeated identical calls cycle through their recordings
+            index = self._used.get(key, 0)
+            self._used[key] = index + 1
+            return candidates[index % len(candidates)]
+
+    def questions(self) -> List[str]:
+        """Distinct user questions of the recorded OpenAI sessions."""
+        seen: Dict[str, None] = {}
+        for record in self.records:
+            if record["provider"] == "openai" and record["path"].endswith("chat/completions"):
+                question = first_user_message(record.get("request"))
+                if question:
+                    seen.setdefault(question, None)
+        return list(seen)
+
+
+class LatencyModel:
+    def __init__(self, spec: str = "recorded", seed: int = 0, scale: float = 1.0):
+        """Response latency for replayed calls.
+
+        ``spec`` is ``recorded`` (the latency captured with the fixture), ``fixed:S``,
+        ``uniform:LO,HI`` or ``lognormal:MEDIAN,SIGMA`` in seconds. Samples are drawn from a
+        generator seeded by the request key and its occurrence, so a run is reproducible no
+        matter how concurrent requests interleave.
+        """
+        self.kind, _, args = spec.partition(":")
+        self.args = [float(value) for value in args.split(",")] if args else []
+        if self.kind not in ("recorded", "fixed", "uniform", "lognormal"):
+            raise ValueError(f"Unknown latency model {spec!r}")
+        self.seed = seed
+        self.scale = scale
+
+    def sample(self, record: Dict, occurrence: str) -> float:
+        rng = random.Random(f"{self.seed}:{occurrence}")
+        if self.kind == "fixed":
+            value = self.args[0]
+        elif self.kind == "uniform":
+            value = rng.uniform(self.args[0], self.args[1])
+        elif self.kind == "lognormal":
+            value = self.args[0] * math.exp(rng.gauss(0.0, self.args[1]))
+        else:
+            value = record.get("latency", 0.0)
+        return value * self.scale
+
+
+def sse_events(body: str) -> List[str]:
+    return [event + "\n\n" for event in body.split("\n\n") if event.strip()]
+
+
+def create_app(mode: str, store: FixtureStore, latency: Optional[LatencyModel] = None) -> FastAPI:
+    """FastAPI app serving ``/{provider}/{path}`` by recording upstream calls or replaying fixtures."""
+    app = FastAPI()
+    latency = latency or LatencyModel()
+    counts: Dict[str, int] = {}
+    occurrences: Dict[str, int] = {}
+    app.state.store = store
+    app.state.counts = counts
+    upstream = httpx.AsyncClient(timeout=120) if mode == "record" else None
+
+    @app.api_route("/{provider}/{path:path}", methods=["GET", "POST"])
+    async def handle(provider: str, path: str, request: Request):
+        raw = await request.body()
+        body = json.loads(raw) if raw else None
+        if isinstance(body, dict):
+            body = {name: value for name, value in body.items() if name not in ACCOUNT_FIELDS}
+        query = str(request.url.query)
+        key = request_key(provider, request.method, path, body, query)
+        counts[provider] = counts.get(provider, 0) + 1
+        if mode == "record":
+            return await record(provider, path, request, raw, body, query, key)
+
+        recording = store.match(key, provider, path, body)
+        if recording is None:
+            return Response(json.dumps({"error": f"no recording for {provider} {path}"}), 404)
+        occurrences[key] = occurrences.get(key, 0) + 1
+        delay = latency.sample(recording, f"{key}:{occurrences[key]}")
+        if not recording["content_type"].startswith("text/event-stream"):
+            await asyncio.sleep(delay)
+            return Response(recording["body"], recording["status"], media_type=recording["content_type"])
+
+        events = sse_events(recording["body"])
+        first_byte = delay * recording.get("first_byte_share", DEFAULT_FIRST_BYTE_SHARE)
+        gap = (delay - first_byte) / max(1, len(events) - 1)
+
+        async def stream():
+            await asyncio.sleep(first_byte)
+            for index, event in enumerate(events):
+                if index:
+                    await asyncio.sleep(gap)
+                yield event
+
+        return StreamingResponse(stream(), recording["status"], media_type="text/event-stream")
+
+    async def record(provider, path, request, raw, body, query, key):
+        url = f"{UPSTREAMS[provider]}/{path}" + (f"?{query}" if query else "")
+        headers = {name: value for name, value in request.headers.items() if name.lower() in FORWARDED_HEADERS}
+        start = time.perf_counter()
+        first_byte = None
+        chunks = []
+        async with upstream.stream(request.method, url, content=raw, headers=headers) as response:
+            async for chunk in response.aiter_bytes():
+                first_byte = first_byte or time.perf_counter() - start
+                chunks.append(chunk)
+        elapsed = time.perf_counter() - start
+        content = b"".join(chunks).decode()
+        content_type = response.headers.get("content-type", "application/json")
+        store.append({
+            "key": key,
+            "provider": provider,
+            "method": request.method,
+            "path": path,
+            "request": body,
+            "status": response.status_code,
+            "content_type": content_type,
+            "body": content,
+            "latency": round(elapsed, 4),
+            "first_byte_share": round((first_byte or elapsed) / elapsed, 4) if elapsed else 0.0,
+        })
+        return Response(content, response.status_code, media_type=content_type)
+
+    return app
+
+
+def serve_in_thread(app: FastAPI, port: int = 0):
+    """Run ``app`` on 127.0.0.1 in a daemon thread; returns ``(server, base_url)`` once it is up."""
+    import uvicorn
+
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    return server, f"http://127.0.0.1:{port}"
+
+
+def client_env(base_url: str) -> Dict[str, str]:
+    """Environment that points the backend's API clients at a record/replay server."""
+    return {
+        "OPENAI_BASE_URL": f"{base_url}/openai",
+        "GROK_BASE_URL": f"{base_url}/grok",
+        "DEEPSEEK_BASE_URL": f"{base_url}/deepseek",
+        "AIPOLABS_ACI_SERVER_URL": f"{base_url}/aci/",
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("mode", choices=("record", "replay"))
+    parser.add_argument("--fixtures", required=True)
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency", default="recorded", help="recorded, fixed:S, uniform:LO,HI or lognormal:MEDIAN,SIGMA")
+    parser.add_argument("--latency-scale", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    app = create_app(args.mode, FixtureStore(args.fixtures), LatencyModel(args.latency, args.seed, args.latency_scale))
+    for name, value in client_env(f"http://127.0.0.1:{args.port}").items():
+        print(f"{name}={value}")
+    uvicorn.run(app, host="127.0.0.1", port=args.port)
+
+
+if __name__ == "__main__":
+    main_cli()
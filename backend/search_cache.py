@@ -0,0 +1,215 @@
+import asyncio
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+# How long results stay fresh, per function. News goes stale quickly, web/media results less so.
+DEFAULT_TTLS = {
+    "BRAVE_SEARCH__NEWS_SEARCH": 10 * 60,
+    "BRAVE_SEARCH__WEB_SEARCH": 6 * 60 * 60,
+    "BRAVE_SEARCH__IMAGE_SEARCH": 24 * 60 * 60,
+    "BRAVE_SEARCH__VIDEO_SEARCH": 24 * 60 * 60,
+    "DEEPSEEK__SEARCH_REFERENCES": 6 * 60 * 60,
+}
+DEFAULT_TTL = 60 * 60
+
+_MISSING = object()
+
+
+def normalize_value(value: Any) -> Any:
+    """Normalize argument values so trivially different queries share a cache entry."""
+    if isinstance(value, str):
+        return re.sub(r"\s+", " ", value).strip().lower()
+    if isinstance(value, dict):
+        return {str(k): normalize_value(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [normalize_value(v) for v in value]
+    return value
+
+
+def make_key(function_name: str, arguments: Dict) -> str:
+    return function_name.strip().upper() + ":" + json.dumps(
+        normalize_value(arguments), sort_keys=True, separators=(",", ":")
+    )
+
+
+class SearchCache:
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttls: Optional[Dict[str, float]] = None,
+        default_ttl: float = DEFAULT_TTL,
+        path: Optional[str] = None,
+        max_disk_entries: int = 100_000,
+    ):
+        """Size-bounded LRU cache for search results with per-function TTLs.
+
+        Args:
+            max_entries: Maximum number of results kept in memory.
+            ttls: Seconds a result stays fresh, keyed by function name. Merged over DEFAULT_TTLS.
+            default_ttl: TTL for functions not listed in ``ttls``.
+            path: Optional SQLite file. When set, results are also written to disk and survive restarts.
+            max_disk_entries: Maximum number of rows kept in the SQLite file.
+        """
+        self.max_entries = max_entries
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.default_ttl = default_ttl
+        self.max_disk_entries = max_disk_entries
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        # key -> last read time of disk entries, written in batches rather than on every hit
+        self._accessed: Dict[str, float] = {}
+        self._entries: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+        # _lock guards the in-memory entries and is never held during disk I/O, which _db_lock guards
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS search_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS search_cache_accessed ON search_cache (accessed_at)")
+            self._db.commit()
+
+    def ttl_for(self, function_name: str) -> float:
+        return self.ttls.get(function_name.strip().upper(), self.default_ttl)
+
+    def get(self, function_name: str, arguments: Dict, default: Any = None) -> Any:
+        """Return the cached result for this call, or ``default`` on a miss."""
+        key = make_key(function_name, arguments)
+        now = time.time()
+        with self._lock:
+            value = self._get_memory(key, now)
+        if value is _MISSING and self._db is not None:
+            value = self._get_disk(key, now)
+        return self._count(value, default)
+
+    async def aget(self, function_name: str, arguments: Dict, default: Any = None) -> Any:
+        """``get`` for the event loop: memory hits return at once, disk lookups run on a thread."""
+        key = make_key(function_name, arguments)
+        now = time.time()
+        with self._lock:
+            value = self._get_memory(key, now)
+        if value is _MISSING and self._db is not None:
+            value = await asyncio.to_thread(self._get_disk, key, now)
+        return self._count(value, default)
+
+    def set(self, function_name: str, arguments: Dict, value: Any) -> None:
+        key = make_key(function_name, arguments)
+        expires_at = time.time() + self.ttl_for(function_name)
+        with self._lock:
+            self._remember(key, expires_at, value)
+        if self._db is not None:
+            self._write(key, value, expires_at)
+
+    async def aset(self, function_name: str, arguments: Dict, value: Any) -> None:
+        """``set`` for the event loop: the memory entry is stored at once, the disk write on a thread."""
+        key = make_key(function_name, arguments)
+        expires_at = time.time() + self.ttl_for(function_name)
+        with self._lock:
+            self._remember(key, expires_at, value)
+        if self._db is not None:
+            await asyncio.to_thread(self._write, key, value, expires_at)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._entries),
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        if self._db is not None:
+            with self._db_lock:
+                self._accessed.clear()
+                self._db.execute("DELETE FROM search_cache")
+                self._db.commit()
+
+    def close(self) -> None:
+        if self._db is not None:
+            with self._db_lock:
+                self._flush_accessed()
+                self._db.commit()
+            self._db.close()
+            self._db = None
+
+    def _count(self, value: Any, default: Any) -> Any:
+        if value is _MISSING:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def _get_memory(self, key: str, now: float) -> Any:
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > now:
+                self._entries.move_to_end(key)
+                return value
+            del self._entries[key]
+        return _MISSING
+
+    def _get_disk(self, key: str, now: float) -> Any:
+        with self._db_lock:
+            # Expired rows are left for _prune_disk, so a read never has to commit
+            row = self._db.execute(
+                "SELECT value, expires_at FROM search_cache WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+            if row is None:
+                return _MISSING
+            self._accessed[key] = now
+            if len(self._accessed) >= 100:
+                self._flush_accessed()
+                self._db.commit()
+        value = json.loads(row[0])
+        with self._lock:
+            self._remember(key, row[1], value)
+        return value
+
+    def _write(self, key: str, value: Any, expires_at: float) -> None:
+        data = json.dumps(value)
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO search_cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, data, expires_at, time.time()),
+            )
+            self._accessed.pop(key, None)
+            self._flush_accessed()
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self._prune_disk()
+            self._db.commit()
+
+    def _flush_accessed(self) -> None:
+        if self._accessed:
+            self._db.executemany(
+                "UPDATE search_cache SET accessed_at = ? WHERE key = ?",
+                [(accessed_at, key) for key, accessed_at in self._accessed.items()],
+            )
+            self._accessed.clear()
+
+    def _remember(self, key: str, expires_at: float, value: Any) -> None:
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _prune_disk(self) -> None:
+        self._db.execute("DELETE FROM search_cache WHERE expires_at <= ?", (time.time(),))
+        self._db.execute(
+            "DELETE FROM search_cache WHERE key IN ("
+            "SELECT key FROM search_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_disk_entries,),
+        )
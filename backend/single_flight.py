@@ -0,0 +1,46 @@
+import asyncio
+import re
+from typing import Any, Awaitable, Callable, Dict
+
+from search_cache import normalize_value
+
+
+def query_key(message: str) -> str:
+    """Key identical questions share a job on: case, spacing and trailing punctuation don't matter."""
+    return re.sub(r"^[\W_]+|[\W_]+$", "", normalize_value(message))
+
+
+class SingleFlight:
+    def __init__(self):
+        """Runs one call per key at a time; callers asking for a key already in flight share its result.
+
+        The call runs as its own task, so a caller that gives up (a cancelled request) doesn't
+        cancel it for the others still waiting on it.
+        """
+        self._calls: Dict[str, asyncio.Task] = {}
+        self.started = 0
+        self.joined = 0
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._calls
+
+    async def do(self, key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is not None and task.get_loop() is asyncio.get_running_loop():
+            self.joined += 1
+        else:
+            task = asyncio.ensure_future(call())
+            self._calls[key] = task
+            self.started += 1
+            task.add_done_callback(lambda done, key=key: self._forget(key, done))
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Retrieved so an error nobody is waiting on anymore isn't logged as unhandled
+            task.exception()
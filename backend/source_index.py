@@ -0,0 +1,198 @@
+import re
+from typing import Any, Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qsl, unquote, urlencode, urlsplit, urlunsplit
+
+# Query parameters that only track where a click came from
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "dclid", "msclkid", "yclid", "igshid", "mc_cid", "mc_eid",
+    "ref", "ref_src", "ref_url", "referrer", "cmpid", "ocid", "smid", "_ga", "_gl",
+    "_hsenc", "_hsmla", "mkt_tok", "spm", "share", "amp", "outputtype",
+}
+TRACKING_PREFIXES = ("utm_", "pk_", "itm_")
+# Trailing " - Site Name" / " | Site Name" suffixes that differ between copies of an article
+TITLE_SUFFIX = re.compile(r"\s+[-|–—:]\s+[^-|–—:]{1,40}$")
+TITLE_SIMILARITY = 0.85
+# Shorter titles ("Home", "Live updates") are too generic to compare
+MIN_TITLE_WORDS = 3
+
+
+def canonicalize_url(url: str) -> str:
+    """Reduce a URL to the form used to detect duplicates.
+
+    Scheme becomes https, ``www.``/``m.``/``amp.`` host prefixes and default ports are dropped,
+    Google AMP cache URLs are unwrapped, ``/amp`` path segments and tracking parameters are
+    removed, the remaining parameters are sorted, and the fragment and trailing slash go.
+    URLs that can't be parsed (a bad port, a broken IPv6 literal) are only trimmed and lowercased.
+    """
+    url = str(url).strip()
+    if "://" not in url:
+        url = "https://" + url
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return url.lower()
+    host = (parts.hostname or "").lower()
+    path = parts.path
+
+    # https://www-example-com.cdn.ampproject.org/c/s/www.example.com/story -> example.com/story
+    if host.endswith(".cdn.ampproject.org"):
+        match = re.match(r"^/[a-z](?:/s)?/([^/]+)(/.*)?$", path)
+        if match:
+            host = match.group(1).lower()
+            path = match.group(2) or "/"
+
+    for prefix in ("www.", "m.", "amp."):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+            break
+    if port and port not in (80, 443):
+        host = f"{host}:{port}"
+
+    segments = [segment for segment in unquote(path).split("/") if segment and segment.lower() != "amp"]
+    path = "/" + "/".join(segments)
+    if path.endswith((".amp", ".amp.html")):
+        path = path[: path.rfind(".amp")]
+
+    query = sorted(
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PREFIXES)
+    )
+    return urlunsplit(("https", host, path.rstrip("/") or "/", urlencode(query), ""))
+
+
+def host_of(url: str) -> str:
+    """Host of the canonical URL, without ``www.``-style prefixes; empty if it can't be parsed."""
+    try:
+        return urlsplit(canonicalize_url(url)).netloc
+    except ValueError:
+        return ""
+
+
+def normalize_title(title: str) -> str:
+    title = TITLE_SUFFIX.sub("", title.strip())
+    return " ".join(re.findall(r"\w+", title.lower()))
+
+
+class SourceIndex:
+    def __init__(self, title_similarity: float = TITLE_SIMILARITY):
+        """Remembers every source seen during one research session.
+
+        A source is a duplicate if its canonical URL was seen before, or if its normalized
+        title has a word-set Jaccard similarity of at least ``title_similarity`` with a seen title.
+        """
+        self.title_similarity = title_similarity
+        self.urls: Set[str] = set()
+        self.titles: List[frozenset] = []
+        # word -> positions in self.titles, so only titles sharing a word are compared
+        self._title_words: Dict[str, List[int]] = {}
+        self.duplicates = 0
+        # Copies of every source kept by filter_result, in the order they were found
+        self.sources: List[Dict] = []
+        # Canonical URL / title position -> index in self.sources of the source that added it
+        self._url_sources: Dict[str, int] = {}
+        self._title_sources: List[Optional[int]] = []
+
+    def __len__(self) -> int:
+        return len(self.urls)
+
+    def is_duplicate(self, url: Optional[str], title: Optional[str] = None) -> bool:
+        return self._original(url, title) is not None
+
+    def add(self, url: Optional[str], title: Optional[str] = None) -> bool:
+        """Record a source; returns False if it duplicates one already in the index."""
+        if self.is_duplicate(url, title):
+            self.duplicates += 1
+            return False
+        self._record(url, title)
+        return True
+
+    def filter_result(self, result: Any, provider: Optional[str] = None) -> Tuple[Any, int, int]:
+        """Drop already-seen sources from a tool result.
+
+        Every dict with a ``url`` inside the result is treated as a source. Returns a filtered
+        copy (the input is not modified, so cached results stay intact) together with the
+        number of new and duplicate sources. The copies kept in ``sources`` are tagged with
+        ``provider`` unless they name one already. When a dropped duplicate comes from another
+        domain, that domain is added to the kept copy's ``corroborating_domains``, so scoring can
+        still count how many outlets carried the story.
+        """
+        counts = [0, 0]
+
+        def walk(value):
+            if isinstance(value, list):
+                kept = []
+                for item in value:
+                    if isinstance(item, dict) and "url" in item:
+                        original = self._original(item.get("url"), item.get("title"))
+                        if original is None:
+                            counts[0] += 1
+                            kept.append(item)
+                            self._record(item.get("url"), item.get("title"), len(self.sources))
+                            self.sources.append({"provider": provider, **item} if provider else dict(item))
+                        else:
+                            counts[1] += 1
+                            self.duplicates += 1
+                            if original >= 0:
+                                self._corroborate(self.sources[original], item.get("url"))
+                    else:
+                        kept.append(walk(item))
+                return kept
+            if isinstance(value, dict):
+                return {key: walk(item) for key, item in value.items()}
+            return value
+
+        filtered = walk(result)
+        return filtered, counts[0], counts[1]
+
+    def _original(self, url: Optional[str], title: Optional[str]) -> Optional[int]:
+        """Index in ``sources`` of the source this one duplicates, -1 if that wasn't kept there, None if new."""
+        if url:
+            key = canonicalize_url(url)
+            if key in self.urls:
+                return self._url_sources.get(key, -1)
+        words = self._words(title)
+        position = self._similar_title(words) if words else None
+        if position is None:
+            return None
+        owner = self._title_sources[position]
+        return -1 if owner is None else owner
+
+    def _record(self, url: Optional[str], title: Optional[str], owner: Optional[int] = None):
+        if url:
+            key = canonicalize_url(url)
+            self.urls.add(key)
+            if owner is not None:
+                self._url_sources[key] = owner
+        words = self._words(title)
+        if words:
+            position = len(self.titles)
+            self.titles.append(words)
+            self._title_sources.append(owner)
+            for word in words:
+                self._title_words.setdefault(word, []).append(position)
+
+    @staticmethod
+    def _corroborate(source: Dict, url: Optional[str]):
+        domain = host_of(url) if url else ""
+        if domain and domain != host_of(source.get("url") or ""):
+            domains = source.setdefault("corroborating_domains", [])
+            if domain not in domains:
+                domains.append(domain)
+
+    @staticmethod
+    def _words(title: Optional[str]) -> frozenset:
+        words = frozenset(normalize_title(title).split()) if title else frozenset()
+        return words if len(words) >= MIN_TITLE_WORDS else frozenset()
+
+    def _similar_title(self, words: frozenset) -> Optional[int]:
+        candidates = {position for word in words for position in self._title_words.get(word, ())}
+        for position in candidates:
+            other = self.titles[position]
+            # Jaccard can't reach the threshold if the sizes differ too much
+            if min(len(words), len(other)) < self.title_similarity * max(len(words), len(other)):
+                continue
+            if len(words & other) / len(words | other) >= self.title_similarity:
+                return position
+        return None
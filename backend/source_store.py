@@ -0,0 +1,546 @@
+"""Append-only columnar store for every source the providers return.
+
+Each writer (one per process) appends to its own segment directory under the store's path:
+
+- fixed-width numeric columns, one raw little-endian file each, read back as memory maps;
+- string columns as a data file plus a file of end offsets;
+- domain, type, provider and status as small ids into append-only dictionary files.
+
+Rows live on disk and are read through memory maps, so RAM stays bounded no matter how many
+rows the store holds. Filters are evaluated column-wise with numpy. Export writes standard
+``.npy`` files (memory-mappable with ``np.load(..., mmap_mode="r")``) or, with pyarrow
+installed, Parquet:
+
+    python source_store.py stats --path sources
+    python source_store.py export --path sources --format parquet sources.parquet
+"""
+import argparse
+import json
+import math
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from uuid import uuid4
+
+import numpy as np
+
+from credibility import domain_of, parse_timestamp, source_date
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is optional
+    pa = None
+    pq = None
+
+# Numeric columns and their on-disk types
+NUMERIC_COLUMNS = {
+    "published": np.dtype("<f8"),
+    "score": np.dtype("<f4"),
+    "domain": np.dtype("<u4"),
+    "type": np.dtype("<u2"),
+    "provider": np.dtype("<u2"),
+    "status": np.dtype("<u1"),
+    # Written last on every flush, so its length is the number of complete rows
+    "found_at": np.dtype("<f8"),
+}
+STRING_COLUMNS = ("url", "title", "summary", "authors", "query")
+DICTIONARY_COLUMNS = ("domain", "type", "provider", "status")
+# Keyword filters accepted by SourceStore.query and SourceStore.count
+FILTERS = ("domain", "provider", "type", "status", "since", "until", "min_score")
+# Longest summary kept per source
+MAX_SUMMARY_CHARS = 500
+AUTHOR_SEPARATOR = "\x1f"
+
+
+class Source:
+    """One source as found by a provider.
+
+    Slotted, with the low-cardinality strings interned, so holding many of them at once stays
+    cheap. ``published`` and ``score`` are NaN when unknown.
+    """
+
+    __slots__ = (
+        "url", "title", "domain", "type", "provider", "status", "published", "score",
+        "summary", "authors", "query", "found_at",
+    )
+
+    def __init__(
+        self,
+        url: str,
+        title: str = "",
+        domain: Optional[str] = None,
+        type: str = "",
+        provider: str = "",
+        status: str = "",
+        published: float = math.nan,
+        score: float = math.nan,
+        summary: str = "",
+        authors: Sequence[str] = (),
+        query: str = "",
+        found_at: Optional[float] = None,
+    ):
+        self.url = url
+        self.title = title
+        self.domain = sys.intern(domain if domain is not None else domain_of(url))
+        self.type = sys.intern(type.lower())
+        self.provider = sys.intern(provider)
+        self.status = sys.intern(status)
+        self.published = published
+        self.score = score
+        self.summary = summary[:MAX_SUMMARY_CHARS]
+        self.authors = tuple(authors)
+        self.query = query
+        self.found_at = time.time() if found_at is None else found_at
+
+    @classmethod
+    def from_dict(cls, source: Dict, provider: str = "", query: str = "") -> "Source":
+        """Build from a Brave result, a provider or Deepseek source dict, or a scored final source."""
+        url = source.get("url") or source.get("source_url") or ""
+        date = source_date(source)
+        authors = source.get("authors") or ()
+        return cls(
+            url=url,
+            title=source.get("title") or source.get("source_name") or "",
+            type=str(source.get("type") or source.get("source_type") or ""),
+            provider=source.get("provider") or provider,
+            status=(source.get("verification") or {}).get("status", ""),
+            published=parse_timestamp(date) if date else math.nan,
+            score=(source.get("credibility") or {}).get("score", math.nan),
+            summary=source.get("description") or source.get("summary") or source.get("source_description") or "",
+            authors=[authors] if isinstance(authors, str) else [str(author) for author in authors],
+            query=query,
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {name: getattr(self, name) for name in self.__slots__}
+        data["authors"] = list(self.authors)
+        for name in ("published", "score"):
+            if math.isnan(data[name]):
+                data[name] = None
+        if data["score"] is not None:
+            # Stored as float32; drop the noise that adds to a 3-decimal score
+            data["score"] = round(data["score"], 4)
+        return data
+
+    def __repr__(self) -> str:
+        return f"Source({self.url!r}, provider={self.provider!r}, score={self.score:.3f})"
+
+
+class Segment:
+    def __init__(self, directory: str, writable: bool = False):
+        """The columns written by one writer.
+
+        Only the writer's own process appends to a segment; everyone else maps it read-only and
+        re-maps the files as they grow. Columns a dead writer left longer than ``found_at`` are
+        ignored.
+        """
+        self.directory = directory
+        self.writable = writable
+        os.makedirs(directory, exist_ok=True)
+        self.dictionaries: Dict[str, List[str]] = {name: [] for name in DICTIONARY_COLUMNS}
+        self._ids: Dict[str, Dict[str, int]] = {name: {} for name in DICTIONARY_COLUMNS}
+        self._maps: Dict[str, Tuple[int, np.ndarray]] = {}
+        self._load_dictionaries()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _load_dictionaries(self):
+        """Read dictionary entries added since the last call."""
+        for name in DICTIONARY_COLUMNS:
+            path = self._path(f"{name}.dict")
+            if not os.path.exists(path):
+                continue
+            with open(path, encoding="utf-8") as f:
+                values = f.read().split("\n")[:-1]
+            for value in values[len(self.dictionaries[name]):]:
+                self._ids[name][value] = len(self.dictionaries[name])
+                self.dictionaries[name].append(value)
+
+    @property
+    def rows(self) -> int:
+        path = self._path("found_at.col")
+        return os.path.getsize(path) // 8 if os.path.exists(path) else 0
+
+    def column(self, name: str, dtype: np.dtype, rows: Optional[int] = None) -> np.ndarray:
+        """Memory map of a column file, limited to ``rows`` rows; re-mapped when the file grew."""
+        path = self._path(name)
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        cached = self._maps.get(name)
+        if cached is None or cached[0] != size:
+            array = np.memmap(path, dtype=dtype, mode="r") if size else np.zeros(0, dtype)
+            cached = self._maps[name] = (size, array)
+        return cached[1] if rows is None else cached[1][:rows]
+
+    def numeric(self, name: str, rows: int) -> np.ndarray:
+        return self.column(f"{name}.col", NUMERIC_COLUMNS[name], rows)
+
+    def strings(self, name: str, indices: Iterable[int]) -> List[str]:
+        ends = self.column(f"{name}.end", np.dtype("<u8"))
+        data = self.column(f"{name}.data", np.dtype("u1"))
+        values = []
+        for index in indices:
+            start = int(ends[index - 1]) if index else 0
+            values.append(bytes(data[start:int(ends[index])]).decode("utf-8", errors="replace"))
+        return values
+
+    def snapshot(self) -> int:
+        """Rows complete right now, with the dictionary entries they use loaded."""
+        rows = self.rows
+        if not self.writable:
+            # Entries are written before the rows using them, so reading them second covers every row
+            self._load_dictionaries()
+        return rows
+
+    def id_of(self, column: str, value: str) -> Optional[int]:
+        return self._ids[column].get(value)
+
+    def intern(self, column: str, value: str) -> int:
+        # Newlines would split the dictionary file's entries
+        value = value.replace("\n", " ")
+        ids = self._ids[column]
+        if value not in ids:
+            ids[value] = len(self.dictionaries[column])
+            self.dictionaries[column].append(value)
+            with open(self._path(f"{column}.dict"), "a", encoding="utf-8") as f:
+                f.write(value + "\n")
+        return ids[value]
+
+    def append(self, sources: List[Source]):
+        """Append rows column by column; found_at goes last so readers never see a partial row."""
+        for name in STRING_COLUMNS:
+            encoded = [
+                (AUTHOR_SEPARATOR.join(source.authors) if name == "authors" else getattr(source, name)).encode("utf-8")
+                for source in sources
+            ]
+            data_path = self._path(f"{name}.data")
+            base = os.path.getsize(data_path) if os.path.exists(data_path) else 0
+            ends = base + np.cumsum([len(value) for value in encoded], dtype=np.uint64)
+            with open(data_path, "ab") as f:
+                f.write(b"".join(encoded))
+            with open(self._path(f"{name}.end"), "ab") as f:
+                ends.astype("<u8").tofile(f)
+        for name, dtype in NUMERIC_COLUMNS.items():
+            if name in DICTIONARY_COLUMNS:
+                values = [self.intern(name, getattr(source, name)) for source in sources]
+            else:
+                values = [getattr(source, name) for source in sources]
+            with open(self._path(f"{name}.col"), "ab") as f:
+                np.asarray(values, dtype=dtype).tofile(f)
+
+    def rows_at(self, indices: List[int], rows: int) -> List[Source]:
+        """Materialize the rows at ``indices`` (all below ``rows``) as Source records."""
+        strings = {name: self.strings(name, indices) for name in STRING_COLUMNS}
+        numeric = {name: self.numeric(name, rows)[indices].tolist() for name in NUMERIC_COLUMNS}
+        names = {name: self.dictionaries[name] for name in DICTIONARY_COLUMNS}
+        return [
+            Source(
+                url=strings["url"][i],
+                title=strings["title"][i],
+                domain=names["domain"][numeric["domain"][i]],
+                type=names["type"][numeric["type"][i]],
+                provider=names["provider"][numeric["provider"][i]],
+                status=names["status"][numeric["status"][i]],
+                published=numeric["published"][i],
+                score=numeric["score"][i],
+                summary=strings["summary"][i],
+                authors=strings["authors"][i].split(AUTHOR_SEPARATOR) if strings["authors"][i] else (),
+                query=strings["query"][i],
+                found_at=numeric["found_at"][i],
+            )
+            for i in range(len(indices))
+        ]
+
+
+class SourceStore:
+    def __init__(self, path: Optional[str] = None, flush_rows: int = 4096):
+        """Sources from every provider, kept column-wise on disk.
+
+        Args:
+            path: Directory holding the store. Several processes may share it; each writes its
+                own segment and reads everyone's. Without a path the store lives in a temporary
+                directory that is removed on close.
+            flush_rows: Rows buffered in memory before they are appended to disk.
+        """
+        self.temporary = path is None
+        self._path = path
+        self.flush_rows = flush_rows
+        self._buffer: List[Source] = []
+        self._lock = threading.Lock()
+        self._writer: Optional[Segment] = None
+        self._segments: Dict[str, Segment] = {}
+
+    @property
+    def path(self) -> str:
+        # Created on first use, so a store that is never written leaves nothing behind
+        if self._path is None:
+            self._path = tempfile.mkdtemp(prefix="sources-")
+        os.makedirs(self._path, exist_ok=True)
+        return self._path
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(rows for _, rows in self._refresh()) + len(self._buffer)
+
+    def add(self, source: Source):
+        self.add_many([source])
+
+    def add_many(self, sources: Iterable[Source]):
+        with self._lock:
+            self._buffer.extend(sources)
+            if len(self._buffer) >= self.flush_rows:
+                self._flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        if self._writer is None:
+            name = f"segment-{os.getpid()}-{uuid4().hex[:8]}"
+            self._writer = self._segments[name] = Segment(os.path.join(self.path, name), writable=True)
+        self._writer.append(self._buffer)
+        self._buffer = []
+
+    def _refresh(self) -> List[Tuple[Segment, int]]:
+        """Every segment in the store with its complete rows, including segments other processes started."""
+        for name in sorted(os.listdir(self.path)):
+            if name.startswith("segment-") and name not in self._segments:
+                self._segments[name] = Segment(os.path.join(self.path, name))
+        return [(segment, segment.snapshot()) for segment in self._segments.values()]
+
+    @staticmethod
+    def _mask(segment: Segment, rows: int, filters: Dict[str, Any]) -> np.ndarray:
+        unknown = set(filters) - set(FILTERS)
+        if unknown:
+            raise TypeError(f"Unknown source filters: {', '.join(sorted(unknown))}")
+        mask = np.ones(rows, dtype=bool)
+        for column in DICTIONARY_COLUMNS:
+            value = filters.get(column)
+            if value is None:
+                continue
+            value_id = segment.id_of(column, value.lower() if column in ("domain", "type") else value)
+            if value_id is None:
+                return np.zeros(rows, dtype=bool)
+            mask &= segment.numeric(column, rows) == value_id
+        if filters.get("since") is not None:
+            mask &= segment.numeric("published", rows) >= filters["since"]
+        if filters.get("until") is not None:
+            mask &= segment.numeric("published", rows) < filters["until"]
+        if filters.get("min_score") is not None:
+            # Compared in float64, so a score stored as float32 just below the bound doesn't pass
+            mask &= segment.numeric("score", rows).astype(np.float64) >= filters["min_score"]
+        return mask
+
+    def query(self, limit: Optional[int] = 100, **filters) -> List[Source]:
+        """Sources matching every filter, most recently found first.
+
+        Filters are ``domain``, ``provider``, ``type`` and ``status`` (exact values), ``since``
+        and ``until`` (publish date, seconds since the epoch) and ``min_score``. Sources with an
+        unknown date or score never match a date or score filter. ``limit=None`` returns every
+        match; a limit of 0 or less returns none.
+        """
+        if limit is not None and limit <= 0:
+            return []
+        matches: List[Tuple[float, Segment, int]] = []
+        with self._lock:
+            self._flush()
+            snapshot = self._refresh()
+            for segment, rows in snapshot:
+                indices = np.flatnonzero(self._mask(segment, rows, filters))
+                found_at = segment.numeric("found_at", rows)[indices]
+                if limit is not None and limit < len(indices):
+                    keep = np.argpartition(-found_at, limit - 1)[:limit]
+                    indices, found_at = indices[keep], found_at[keep]
+                matches.extend(zip(found_at.tolist(), [segment] * len(indices), indices.tolist()))
+            matches.sort(key=lambda match: -match[0])
+            # Read the winners segment by segment, then put them back in order
+            chosen: Dict[Segment, List[Tuple[int, int]]] = {}
+            for position, (_, segment, index) in enumerate(matches[:limit]):
+                chosen.setdefault(segment, []).append((position, index))
+            results: List[Optional[Source]] = [None] * len(matches[:limit])
+            for segment, rows in snapshot:
+                picks = chosen.get(segment, [])
+                for (position, _), source in zip(picks, segment.rows_at([index for _, index in picks], rows)):
+                    results[position] = source
+            return results
+
+    def count(self, **filters) -> int:
+        """Number of sources matching the filters ``query`` takes."""
+        with self._lock:
+            self._flush()
+            return sum(int(self._mask(segment, rows, filters).sum()) for segment, rows in self._refresh())
+
+    def stats(self, by: str = "provider") -> Dict[str, Dict[str, float]]:
+        """Per ``by`` value (provider, domain, type or status): sources, mean score and verification outcomes."""
+        if by not in DICTIONARY_COLUMNS:
+            raise ValueError(f"Can only group by one of {', '.join(DICTIONARY_COLUMNS)}")
+        totals: Dict[str, Dict[str, float]] = {}
+        with self._lock:
+            self._flush()
+            for segment, rows in self._refresh():
+                groups = segment.numeric(by, rows).astype(np.int64)
+                scores = segment.numeric("score", rows).astype(np.float64)
+                statuses = segment.numeric("status", rows).astype(np.int64)
+                scored = ~np.isnan(scores)
+                size = len(segment.dictionaries[by])
+                counts = np.bincount(groups, minlength=size)
+                score_sums = np.bincount(groups[scored], weights=scores[scored], minlength=size)
+                score_counts = np.bincount(groups[scored], minlength=size)
+                by_status = {
+                    name: np.bincount(groups[statuses == status_id], minlength=size)
+                    for status_id, name in enumerate(segment.dictionaries["status"]) if name
+                }
+                for group_id in np.flatnonzero(counts).tolist():
+                    entry = totals.setdefault(segment.dictionaries[by][group_id], {"sources": 0, "scored": 0, "score_sum": 0.0})
+                    entry["sources"] += int(counts[group_id])
+                    entry["scored"] += int(score_counts[group_id])
+                    entry["score_sum"] += float(score_sums[group_id])
+                    for name, status_counts in by_status.items():
+                        entry[name] = entry.get(name, 0) + int(status_counts[group_id])
+        for entry in totals.values():
+            scored, score_sum = entry.pop("scored"), entry.pop("score_sum")
+            entry["mean_score"] = round(score_sum / scored, 3) if scored else None
+        return dict(sorted(totals.items(), key=lambda item: -item[1]["sources"]))
+
+    def _chunks(self, segments: List[Tuple[Segment, int]], chunk_rows: int) -> Iterator[Tuple[Segment, int, int]]:
+        for segment, rows in segments:
+            for start in range(0, rows, chunk_rows):
+                yield segment, start, min(rows, start + chunk_rows)
+
+    def export_npy(self, directory: str, chunk_rows: int = 1 << 20) -> int:
+        """Write every column as a ``.npy`` file (strings as ``<name>.data`` plus ``<name>.end.npy``).
+
+        Dictionary columns hold ids into ``dictionaries.json``. Data is copied a chunk at a time,
+        so exporting doesn't need the store in memory. Returns the number of rows written.
+        """
+        os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            self._flush()
+            segments = self._refresh()
+            total = sum(rows for _, rows in segments)
+            # Segments intern independently; map their ids onto one dictionary per column
+            dictionaries = {name: {} for name in DICTIONARY_COLUMNS}
+            remaps = {}
+            for segment, _ in segments:
+                for name in DICTIONARY_COLUMNS:
+                    ids = dictionaries[name]
+                    remaps[segment.directory, name] = np.array(
+                        [ids.setdefault(value, len(ids)) for value in segment.dictionaries[name]] or [0],
+                        dtype=NUMERIC_COLUMNS[name],
+                    )
+            outputs = {
+                name: np.lib.format.open_memmap(os.path.join(directory, f"{name}.npy"), "w+", dtype, (total,))
+                for name, dtype in NUMERIC_COLUMNS.items()
+            }
+            ends = {
+                name: np.lib.format.open_memmap(os.path.join(directory, f"{name}.end.npy"), "w+", np.dtype("<u8"), (total,))
+                for name in STRING_COLUMNS
+            }
+            position = 0
+            data_base = dict.fromkeys(STRING_COLUMNS, 0)
+            data_files = {name: open(os.path.join(directory, f"{name}.data"), "wb") for name in STRING_COLUMNS}
+            try:
+                for segment, start, stop in self._chunks(segments, chunk_rows):
+                    count = stop - start
+                    for name in NUMERIC_COLUMNS:
+                        values = segment.numeric(name, stop)[start:stop]
+                        if name in DICTIONARY_COLUMNS:
+                            values = remaps[segment.directory, name][values]
+                        outputs[name][position:position + count] = values
+                    for name in STRING_COLUMNS:
+                        segment_ends = segment.column(f"{name}.end", np.dtype("<u8"), stop)
+                        first = int(segment_ends[start - 1]) if start else 0
+                        last = int(segment_ends[stop - 1])
+                        data_files[name].write(segment.column(f"{name}.data", np.dtype("u1"))[first:last].tobytes())
+                        ends[name][position:position + count] = segment_ends[start:stop] - first + data_base[name]
+                        data_base[name] += last - first
+                    position += count
+            finally:
+                for f in data_files.values():
+                    f.close()
+            for array in (*outputs.values(), *ends.values()):
+                array.flush()
+            with open(os.path.join(directory, "dictionaries.json"), "w") as f:
+                json.dump({name: list(ids) for name, ids in dictionaries.items()}, f)
+        return total
+
+    def export_parquet(self, path: str, chunk_rows: int = 1 << 16) -> int:
+        """Write the store to a Parquet file, one row group per chunk. Requires pyarrow."""
+        if pq is None:
+            raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+        schema = pa.schema(
+            [pa.field(name, pa.large_string()) for name in STRING_COLUMNS]
+            + [pa.field(name, pa.dictionary(pa.int32(), pa.string())) for name in DICTIONARY_COLUMNS]
+            + [pa.field("published", pa.timestamp("s", tz="UTC")), pa.field("score", pa.float32()),
+               pa.field("found_at", pa.timestamp("s", tz="UTC"))]
+        )
+        total = 0
+        with self._lock:
+            self._flush()
+            with pq.ParquetWriter(path, schema) as writer:
+                for segment, start, stop in self._chunks(self._refresh(), chunk_rows):
+                    columns = []
+                    for name in STRING_COLUMNS:
+                        segment_ends = segment.column(f"{name}.end", np.dtype("<u8"), stop)
+                        first = int(segment_ends[start - 1]) if start else 0
+                        offsets = np.concatenate([[0], segment_ends[start:stop] - first]).astype(np.int64)
+                        data = segment.column(f"{name}.data", np.dtype("u1"))[first:int(segment_ends[stop - 1])]
+                        columns.append(pa.LargeStringArray.from_buffers(
+                            stop - start, pa.py_buffer(offsets.tobytes()), pa.py_buffer(data.tobytes())
+                        ))
+                    for name in DICTIONARY_COLUMNS:
+                        columns.append(pa.DictionaryArray.from_arrays(
+                            pa.array(segment.numeric(name, stop)[start:stop].astype(np.int32)),
+                            pa.array(segment.dictionaries[name], pa.string()),
+                        ))
+                    for name in ("published", "score", "found_at"):
+                        values = segment.numeric(name, stop)[start:stop]
+                        if name == "score":
+                            columns.append(pa.array(values, pa.float32(), mask=np.isnan(values)))
+                        else:
+                            seconds = np.nan_to_num(values).astype(np.int64)
+                            columns.append(pa.array(seconds, pa.int64(), mask=np.isnan(values)).cast(pa.timestamp("s", tz="UTC")))
+                    writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+                    total += stop - start
+        return total
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self._segments = {}
+            self._writer = None
+        if self.temporary and self._path is not None:
+            shutil.rmtree(self._path, ignore_errors=True)
+            self._path = None
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=("stats", "export"))
+    parser.add_argument("output", nargs="?", help="export target: a directory for npy, a file for parquet")
+    parser.add_argument("--path", required=True, help="store directory (SOURCE_STORE_PATH)")
+    parser.add_argument("--format", choices=("npy", "parquet"), default="npy")
+    parser.add_argument("--by", default="provider", choices=DICTIONARY_COLUMNS)
+    args = parser.parse_args()
+
+    store = SourceStore(args.path)
+    if args.command == "stats":
+        print(json.dumps(store.stats(args.by), indent=2))
+    elif not args.output:
+        parser.error("export needs an output path")
+    else:
+        start = time.perf_counter()
+        rows = store.export_npy(args.output) if args.format == "npy" else store.export_parquet(args.output)
+        print(f"Exported {rows} sources to {args.output} in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main_cli()
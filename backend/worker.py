@@ -0,0 +1,62 @@
+"""Standalone research workers that share the WebSocket server's job store.
+
+Run the server with a shared store and no in-process workers, then start as many worker
+processes as needed:
+
+    JOB_STORE_PATH=jobs.db JOB_WORKERS=0 python main.py
+    JOB_STORE_PATH=jobs.db python worker.py --processes 4 --workers 32
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+
+
+async def serve(workers: int):
+    import main
+    from jobs import JobQueue
+
+    await asyncio.get_running_loop().run_in_executor(None, main.function_registry.load)
+    queue = JobQueue(
+        main.job_queue.store, main.run_research, workers=workers, lease=main.job_queue.lease,
+        max_attempts=main.job_queue.max_attempts,
+    )
+    queue.start()
+    print(f"Worker {queue.worker_id} running {workers} jobs at a time from {os.environ['JOB_STORE_PATH']}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await queue.stop()
+
+
+def run(workers: int):
+    try:
+        asyncio.run(serve(workers))
+    except KeyboardInterrupt:
+        pass
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("JOB_WORKERS", "64")) or 64,
+                        help="concurrent jobs per process")
+    args = parser.parse_args()
+
+    if os.getenv("JOB_STORE_PATH", ":memory:") == ":memory:":
+        parser.error("set JOB_STORE_PATH to the SQLite file the WebSocket server uses")
+    # The worker's own copy of main must not start a second queue of its own
+    os.environ["JOB_WORKERS"] = "0"
+
+    if args.processes == 1:
+        run(args.workers)
+        return
+    processes = [multiprocessing.Process(target=run, args=(args.workers,)) for _ in range(args.processes)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main_cli()
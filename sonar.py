@@ -1,16 +1,122 @@
+import asyncio
 import os
 from dotenv import load_dotenv
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
-from typing import List, Dict, Optional
+import re
+from typing import AsyncIterator, Callable, List, Dict, Optional, Tuple
+
+# Upstream statuses worth retrying with backoff
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+CACHE_FUNCTION_NAME = "DEEPSEEK__SEARCH_REFERENCES"
+# Where one array item ends and the next begins
+ITEM_BOUNDARY = re.compile(r"\}\s*,\s*\{")
+
+class SourceStreamParser:
+    """Incrementally extracts source objects from a (streamed) JSON array.
+
+    Text can be fed in arbitrary chunks; every top-level ``{...}`` object is returned as soon
+    as its closing brace arrives. Anything outside objects (prose, code fences, brackets,
+    commas) is ignored, and objects that fail to decode are skipped and counted in ``skipped``
+    instead of invalidating the rest of the array. An unbalanced quote can swallow the items
+    after it; those are recovered by re-scanning from the next item boundary (``}, {``) when
+    the swallowing object fails to decode, or in ``finish`` if it never closes.
+    """
+
+    def __init__(self):
+        self.skipped = 0
+        self._buffer: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, text: str) -> List[Dict]:
+        results = []
+        for char in text:
+            if self._depth == 0:
+                if char == '{':
+                    self._depth = 1
+                    self._buffer = [char]
+                continue
+
+            self._buffer.append(char)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == '{':
+                self._depth += 1
+            elif char == '}':
+                self._depth -= 1
+                if self._depth == 0:
+                    text = ''.join(self._buffer)
+                    source = self._decode(text)
+                    results.extend([source] if source is not None else self._resync(text))
+        return results
+
+    def finish(self) -> List[Dict]:
+        """Call once the text has ended: the sources held behind an object that never closed."""
+        if self._depth == 0:
+            return []
+        text = ''.join(self._buffer)
+        self._depth = 0
+        self._buffer = []
+        self._in_string = self._escape = False
+        self.skipped += 1
+        return self._resync(text)
+
+    def _resync(self, text: str) -> List[Dict]:
+        # The part before the first boundary is lost; it is already counted in ``skipped``
+        match = ITEM_BOUNDARY.search(text)
+        if match is None:
+            return []
+        return self.feed(text[match.end() - 1:]) + self.finish()
+
+    def _decode(self, text: str) -> Optional[Dict]:
+        try:
+            # strict=False accepts raw newlines inside strings, which models often emit
+            source = json.loads(text, strict=False)
+        except json.JSONDecodeError:
+            self.skipped += 1
+            return None
+        if not isinstance(source, dict):
+            self.skipped += 1
+            return None
+        return source
 
 class DeepseekSonar:
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        cache=None,
+        timeout: Tuple[float, float] = (5.0, 60.0),
+        max_retries: int = 3,
+        backoff_factor: float = 0.5,
+        pool_size: int = 10,
+        max_concurrency: int = 5,
+    ):
         """Initialize the DeepseekSonar client.
         
         Args:
             api_key: Deepseek API key. If not provided, will try to get from environment variable.
+            cache: Optional result cache with ``get(name, arguments)`` and ``set(name, arguments, value)``,
+                e.g. the backend's ``SearchCache``. Repeated queries are then answered from it. The
+                async methods use its ``aget``/``aset`` when it has them.
+            timeout: (connect, read) timeout in seconds for each request.
+            max_retries: Retries on connection errors and 429/5xx responses.
+            backoff_factor: Base delay for exponential backoff; a Retry-After header takes precedence.
+            pool_size: Number of keep-alive connections kept open to the API.
+            max_concurrency: Default number of queries in flight for ``search_references_many``.
         """
+        self.cache = cache
         # Load environment variables from .env file
         load_dotenv()
         
@@ -24,6 +130,32 @@ class DeepseekSonar:
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.pool_size = pool_size
+        self.max_concurrency = max_concurrency
+
+        # Pooled keep-alive session for synchronous calls, retrying 429/5xx with backoff
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset(["POST"]),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        # Created on first async use so it binds to the running event loop
+        self._async_client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def endpoint(self) -> str:
+        return f"{self.base_url}/v1/chat/completions"
 
     def search_references(self, query: str, max_results: int = 5) -> List[Dict]:
         """Search for references using Deepseek Chat API.
@@ -32,8 +164,236 @@ class DeepseekSonar:
             query: The search query string
             max_results: Maximum number of results to return
         """
-        endpoint = f"{self.base_url}/v1/chat/completions"
+        cache_arguments = {"query": query, "max_results": max_results}
+        if self.cache is not None:
+            cached = self.cache.get(CACHE_FUNCTION_NAME, cache_arguments)
+            if cached is not None:
+                return cached
+
+        try:
+            response = self.session.post(
+                self.endpoint,
+                json=self._build_payload(query, max_results),
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+            
+            results = self._handle_response(response.json())
+            if results and self.cache is not None:
+                self.cache.set(CACHE_FUNCTION_NAME, cache_arguments, results)
+            return results
+            
+        except requests.exceptions.RequestException as e:
+            print(f"Error making request to Deepseek API: {str(e)}")
+            if hasattr(e, 'response') and hasattr(e.response, 'text'):
+                print(f"Response details: {e.response.text}")
+            return []
+
+    async def async_search_references(
+        self,
+        query: str,
+        max_results: int = 5,
+        raise_errors: bool = False,
+        on_usage: Optional[Callable[[Dict], None]] = None,
+    ) -> List[Dict]:
+        """Async variant of ``search_references`` sharing one pooled connection set across calls.
+        
+        Args:
+            query: The search query string
+            max_results: Maximum number of results to return
+            raise_errors: Raise the ``httpx.HTTPError`` once retries are used up (e.g. an
+                ``HTTPStatusError`` for a 429) instead of returning ``[]``, so callers can tell
+                a failed request from one that found nothing.
+            on_usage: Called with the response's ``usage`` dict (prompt, completion and total
+                tokens). Not called when the results come from the cache.
+        """
+        cache_arguments = {"query": query, "max_results": max_results}
+        cached = await self._cache_get(cache_arguments)
+        if cached is not None:
+            return cached
+
+        try:
+            response = await self._send_with_retries(self._build_payload(query, max_results))
+            response.raise_for_status()
+
+            chat_response = response.json()
+            if on_usage is not None and chat_response.get("usage"):
+                on_usage(chat_response["usage"])
+            results = self._handle_response(chat_response)
+            if results:
+                await self._cache_set(cache_arguments, results)
+            return results
+
+        except httpx.HTTPError as e:
+            if raise_errors:
+                raise
+            print(f"Error making request to Deepseek API: {str(e)}")
+            if isinstance(e, httpx.HTTPStatusError):
+                print(f"Response details: {e.response.text}")
+            return []
+
+    async def search_references_many(
+        self, queries: List[str], max_results: int = 5, max_concurrency: Optional[int] = None
+    ) -> List[List[Dict]]:
+        """Run several queries concurrently, at most ``max_concurrency`` at a time.
         
+        Args:
+            queries: The search query strings
+            max_results: Maximum number of results to return per query
+            max_concurrency: Queries in flight at once. Defaults to the client's ``max_concurrency``.
+        
+        Returns:
+            One result list per query, in the same order as ``queries``.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency or self.max_concurrency)
+
+        async def search(query: str) -> List[Dict]:
+            async with semaphore:
+                return await self.async_search_references(query, max_results)
+
+        return await asyncio.gather(*(search(query) for query in queries))
+
+    async def stream_references(
+        self,
+        query: str,
+        max_results: int = 5,
+        raise_errors: bool = False,
+        on_usage: Optional[Callable[[Dict], None]] = None,
+    ) -> AsyncIterator[Dict]:
+        """Stream the completion and yield each source as soon as it has been fully received.
+        
+        Args:
+            query: The search query string
+            max_results: Maximum number of results to return
+            raise_errors: Raise the ``httpx.HTTPError`` once retries are used up instead of
+                ending the stream quietly.
+            on_usage: Called with the ``usage`` dict the stream ends with. Not called when the
+                sources come from the cache.
+        """
+        cache_arguments = {"query": query, "max_results": max_results}
+        cached = await self._cache_get(cache_arguments)
+        if cached is not None:
+            for source in cached:
+                yield source
+            return
+
+        # Ask for the token usage in a last chunk, as non-streamed responses carry it
+        payload = {**self._build_payload(query, max_results), "stream": True, "stream_options": {"include_usage": True}}
+        parser = SourceStreamParser()
+        results = []
+        malformed_lines = 0
+        try:
+            response = await self._send_with_retries(payload, stream=True)
+            try:
+                if response.is_error:
+                    await response.aread()
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    try:
+                        chunk = json.loads(data)
+                        choices = chunk.get("choices") or []
+                        content = choices[0].get("delta", {}).get("content") if choices else None
+                    except (ValueError, AttributeError, IndexError):
+                        # One bad event loses its text, not the rest of the stream
+                        malformed_lines += 1
+                        continue
+                    if on_usage is not None and chunk.get("usage"):
+                        on_usage(chunk["usage"])
+                    for source in parser.feed(content or ""):
+                        results.append(source)
+                        yield source
+                for source in parser.finish():
+                    results.append(source)
+                    yield source
+            finally:
+                await response.aclose()
+
+        except httpx.HTTPError as e:
+            if raise_errors:
+                raise
+            print(f"Error making request to Deepseek API: {str(e)}")
+            if isinstance(e, httpx.HTTPStatusError):
+                print(f"Response details: {e.response.text}")
+            return
+
+        if malformed_lines:
+            print(f"Skipped {malformed_lines} malformed stream event(s)")
+        if parser.skipped:
+            print(f"Skipped {parser.skipped} malformed source(s)")
+        if results:
+            await self._cache_set(cache_arguments, results)
+
+    def close(self):
+        self.session.close()
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
+    async def _cache_get(self, cache_arguments: Dict) -> Optional[List[Dict]]:
+        if self.cache is None:
+            return None
+        if hasattr(self.cache, "aget"):
+            return await self.cache.aget(CACHE_FUNCTION_NAME, cache_arguments)
+        return self.cache.get(CACHE_FUNCTION_NAME, cache_arguments)
+
+    async def _cache_set(self, cache_arguments: Dict, results: List[Dict]):
+        if self.cache is None:
+            return
+        if hasattr(self.cache, "aset"):
+            await self.cache.aset(CACHE_FUNCTION_NAME, cache_arguments, results)
+        else:
+            self.cache.set(CACHE_FUNCTION_NAME, cache_arguments, results)
+
+    def _get_async_client(self) -> httpx.AsyncClient:
+        if self._async_client is None or self._async_client.is_closed:
+            connect_timeout, read_timeout = self.timeout
+            self._async_client = httpx.AsyncClient(
+                headers=self.headers,
+                timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+                limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+            )
+        return self._async_client
+
+    async def _send_with_retries(self, payload: Dict, stream: bool = False) -> httpx.Response:
+        """POST ``payload``, retrying connection errors and 429/5xx before any body is consumed."""
+        client = self._get_async_client()
+        attempt = 0
+        while True:
+            try:
+                request = client.build_request("POST", self.endpoint, json=payload)
+                response = await client.send(request, stream=stream)
+                if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    return response
+                await response.aclose()
+                delay = self._retry_after(response)
+            except httpx.TransportError:
+                if attempt >= self.max_retries:
+                    raise
+                delay = None
+            if delay is None:
+                delay = self.backoff_factor * (2 ** attempt)
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    def _retry_after(response: httpx.Response) -> Optional[float]:
+        try:
+            return max(0.0, float(response.headers["Retry-After"]))
+        except (KeyError, ValueError):
+            return None
+
+    def prompt_messages(self, query: str, max_results: int = 5) -> List[Dict]:
+        """The chat messages sent for ``query``, e.g. to estimate a request's tokens before sending it."""
+        return self._build_payload(query, max_results)["messages"]
+
+    def _build_payload(self, query: str, max_results: int) -> Dict:
         # Updated prompt for general sources
         prompt = f"""Find {max_results} relevant sources related to: {query}
 
@@ -58,7 +418,7 @@ Please format your response as a valid JSON array where each item has this exact
 
 Return ONLY the JSON array with no additional text or formatting."""
 
-        payload = {
+        return {
             "model": "deepseek-chat",
             "messages": [
                 {"role": "system", "content": "You are a helpful research assistant. Always respond with valid JSON arrays."},
@@ -67,42 +427,19 @@ Return ONLY the JSON array with no additional text or formatting."""
             "temperature": 0.1
         }
 
-        try:
-            response = requests.post(
-                endpoint,
-                headers=self.headers,
-                json=payload
-            )
-            response.raise_for_status()
-            
-            # Parse the response content as JSON
-            chat_response = response.json()
-            content = chat_response['choices'][0]['message']['content'].strip()
-            
-            # Clean up the content to ensure it's valid JSON
-            content = content.replace('\n', ' ').strip()
-            if not content.startswith('['):
-                content = content[content.find('['):]
-            if not content.endswith(']'):
-                content = content[:content.rfind(']')+1]
-            
-            # Extract the JSON array from the response
-            try:
-                results = json.loads(content)
-                if not isinstance(results, list):
-                    print("Response was not a JSON array")
-                    return []
-                return results
-            except json.JSONDecodeError as e:
-                print(f"Failed to parse results as JSON: {str(e)}")
-                print(f"Raw content: {content}")
-                return []
-            
-        except requests.exceptions.RequestException as e:
-            print(f"Error making request to Deepseek API: {str(e)}")
-            if hasattr(e, 'response') and hasattr(e.response, 'text'):
-                print(f"Response details: {e.response.text}")
+    def _handle_response(self, chat_response: Dict) -> List[Dict]:
+        content = chat_response['choices'][0]['message']['content']
+
+        # Parse each source on its own so one malformed item doesn't discard the rest
+        parser = SourceStreamParser()
+        results = parser.feed(content) + parser.finish()
+        if parser.skipped:
+            print(f"Skipped {parser.skipped} malformed source(s)")
+        if not results:
+            print("Failed to parse any sources from the response")
+            print(f"Raw content: {content}")
             return []
+        return results
 
 def main():
     # Example usage
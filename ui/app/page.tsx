@@ -236,6 +236,8 @@ export default function Home() {
   const chatContainerRef = useRef<HTMLDivElement>(null)
   const audioRef = useRef<HTMLAudioElement | null>(null)
   const wsRef = useRef<WebSocket | null>(null)
+  // Job being followed and the last event seen, so a dropped connection can resume where it left off
+  const jobRef = useRef<{ id: string; seq: number } | null>(null)
 
   // Scroll to bottom of chat when messages change
   useEffect(() => {
@@ -254,73 +256,129 @@ export default function Home() {
     // Use wss:// for https, ws:// for http
     const protocol = window.location.protocol === "https:" ? "wss:" : "ws:"
     const wsUrl = `${protocol}//localhost:8000/ws`
-    console.log("Connecting to WebSocket:", wsUrl)
+    let reconnectTimer: ReturnType<typeof setTimeout> | undefined
+    let closed = false
+
+    const connect = () => {
+      console.log("Connecting to WebSocket:", wsUrl)
+
+      wsRef.current = new WebSocket(wsUrl)
+      // The server may send frames as binary UTF-8 JSON
+      wsRef.current.binaryType = "arraybuffer"
+
+      wsRef.current.onopen = () => {
+        console.log("WebSocket connection established")
+        // The research job keeps running server-side while we're away; replay what we missed
+        if (jobRef.current) {
+          wsRef.current?.send(
+            JSON.stringify({ type: "resume", job_id: jobRef.current.id, after: jobRef.current.seq }),
+          )
+        }
+      }
 
-    wsRef.current = new WebSocket(wsUrl)
+      const handleEvent = (data: any) => {
+        if (data.job_id) {
+          // A new job's log starts over; only frames of the same job carry its position forward
+          const seen = data.job_id === jobRef.current?.id ? jobRef.current.seq : 0
+          jobRef.current = { id: data.job_id, seq: data.seq ?? seen }
+        }
 
-    wsRef.current.onopen = () => {
-      console.log("WebSocket connection established")
-    }
+        switch (data.type) {
+          case "progress":
+            setMessages((prev) => [
+              ...prev,
+              {
+                // Several progress events can arrive in the same batch, so key them by sequence number
+                id: data.seq ? `${data.job_id}-${data.seq}` : Date.now().toString(),
+                content: `🔄 ${data.content}`,
+                role: "progress",
+              },
+            ])
+            break
+
+          case "delta":
+            // Append streamed tokens to the assistant message they belong to
+            setMessages((prev) => {
+              if (prev.some((m) => m.id === data.id)) {
+                return prev.map((m) => (m.id === data.id ? { ...m, content: m.content + data.content } : m))
+              }
+              return [...prev, { id: data.id, content: data.content, role: "assistant" }]
+            })
+            break
+
+          case "message":
+            // Replace the streamed message with the complete content, or add it if nothing was streamed
+            setMessages((prev) => {
+              if (data.id && prev.some((m) => m.id === data.id)) {
+                return prev.map((m) => (m.id === data.id ? { ...m, content: data.content } : m))
+              }
+              return [
+                ...prev,
+                {
+                  id: data.id ?? Date.now().toString(),
+                  content: data.content,
+                  role: "assistant",
+                },
+              ]
+            })
+            // Play TTS for regular messages
+            if (data.content) {
+              console.log("Playing TTS for message:", data.content)
+              // await playTTS(data.content);
+            }
+            break
+
+          case "done":
+            // Refinement rounds can follow the first final list; only now is there nothing left to resume
+            if (jobRef.current?.id === data.job_id) {
+              jobRef.current = null
+            }
+            break
+
+          case "error":
+            console.error("WebSocket error:", data.content)
+            setMessages((prev) => [
+              ...prev,
+              {
+                id: Date.now().toString(),
+                content: `❌ Error: ${data.content}`,
+                role: "progress",
+              },
+            ])
+            break
+        }
+      }
 
-    wsRef.current.onmessage = async (event) => {
-      console.log("Received WebSocket message:", event.data)
-      const data = JSON.parse(event.data)
-
-      switch (data.type) {
-        case "progress":
-          setMessages((prev) => [
-            ...prev,
-            {
-              id: Date.now().toString(),
-              content: `🔄 ${data.content}`,
-              role: "progress",
-            },
-          ])
-          break
-
-        case "message":
-          setMessages((prev) => [
-            ...prev,
-            {
-              id: Date.now().toString(),
-              content: data.content,
-              role: "assistant",
-            },
-          ])
-          // Play TTS for regular messages
-          if (data.content) {
-            console.log("Playing TTS for message:", data.content)
-            // await playTTS(data.content);
-          }
-          break
-
-        case "final":
-          break
-
-        case "error":
-          console.error("WebSocket error:", data.content)
-          setMessages((prev) => [
-            ...prev,
-            {
-              id: Date.now().toString(),
-              content: `❌ Error: ${data.content}`,
-              role: "progress",
-            },
-          ])
-          break
+      wsRef.current.onmessage = (event) => {
+        const text = typeof event.data === "string" ? event.data : new TextDecoder().decode(event.data)
+        console.log("Received WebSocket message:", text)
+        const data = JSON.parse(text)
+        // Events that queued up while the connection was busy arrive together in one batch frame
+        if (data.type === "batch") {
+          data.events.forEach(handleEvent)
+        } else {
+          handleEvent(data)
+        }
       }
-    }
 
-    wsRef.current.onerror = (error) => {
-      console.error("WebSocket error:", error)
-    }
+      wsRef.current.onerror = (error) => {
+        console.error("WebSocket error:", error)
+      }
 
-    wsRef.current.onclose = () => {
-      console.log("WebSocket connection closed")
+      wsRef.current.onclose = () => {
+        console.log("WebSocket connection closed")
+        if (!closed) {
+          reconnectTimer = setTimeout(connect, 1000)
+        }
+      }
     }
 
+    connect()
+
     // Cleanup on unmount
     return () => {
+      closed = true
+      clearTimeout(reconnectTimer)
       if (wsRef.current) {
         wsRef.current.close()
       }
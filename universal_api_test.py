@@ -1,5 +1,6 @@
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 from dotenv import load_dotenv
 from openai import OpenAI
@@ -17,6 +18,8 @@ if not LINKED_ACCOUNT_OWNER_ID:
 openai = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 # gets AIPOLABS_ACI_API_KEY from your environment variables
 aci = ACI(api_key=os.getenv("AIPOLABS_KEY"))
+# maximum number of tool calls from one LLM turn that are executed at the same time
+TOOL_FANOUT_LIMIT = int(os.getenv("TOOL_FANOUT_LIMIT", "4"))
 
 prompt = (
     "You are a helpful assistant with access to a unlimited number of tools via four meta functions: "
@@ -37,6 +40,16 @@ tools_meta = [
 ]
 
 
+def execute_tool_call(tool_call) -> dict:
+    return aci.handle_function_call(
+        tool_call.function.name,
+        json.loads(tool_call.function.arguments),
+        linked_account_owner_id=LINKED_ACCOUNT_OWNER_ID,
+        allowed_apps_only=True,
+        format=FunctionDefinitionFormat.OPENAI,
+    )
+
+
 def main() -> None:
     # Start the LLM processing loop
     chat_history: list[dict] = []
@@ -58,40 +71,32 @@ def main() -> None:
             + chat_history,
             tools=tools_meta,
             # tool_choice="required",  # force the model to generate a tool call
-            parallel_tool_calls=False,
         )
 
-        # Process LLM response and potential function call (there can only be at most one function call)
+        # Process LLM response and any function calls (the model may request several at once)
         content = response.choices[0].message.content
-        tool_call = (
-            response.choices[0].message.tool_calls[0]
-            if response.choices[0].message.tool_calls
-            else None
-        )
+        tool_calls = response.choices[0].message.tool_calls or []
         if content:
             print(f"{create_headline('LLM Message')} \n {content}")
             chat_history.append({"role": "assistant", "content": content})
 
-        # Handle function call if any
-        if tool_call:
-            print(
-                f"{create_headline(f'Function Call: {tool_call.function.name}')} \n arguments: {tool_call.function.arguments}"
-            )
-
-            chat_history.append({"role": "assistant", "tool_calls": [tool_call]})
-            result = aci.handle_function_call(
-                tool_call.function.name,
-                json.loads(tool_call.function.arguments),
-                linked_account_owner_id=LINKED_ACCOUNT_OWNER_ID,
-                allowed_apps_only=True,
-                format=FunctionDefinitionFormat.OPENAI,
-            )
-
-            print(f"{create_headline('Function Call Result')} \n {result}")
-            # Continue loop, feeding the result back to the LLM for further instructions
-            chat_history.append(
-                {"role": "tool", "tool_call_id": tool_call.id, "content": json.dumps(result)}
-            )
+        # Handle function calls if any, executing them concurrently
+        if tool_calls:
+            for tool_call in tool_calls:
+                print(
+                    f"{create_headline(f'Function Call: {tool_call.function.name}')} \n arguments: {tool_call.function.arguments}"
+                )
+
+            chat_history.append({"role": "assistant", "tool_calls": tool_calls})
+            with ThreadPoolExecutor(max_workers=TOOL_FANOUT_LIMIT) as executor:
+                results = list(executor.map(execute_tool_call, tool_calls))
+
+            # Feed every result back to the LLM, in the order the calls were made
+            for tool_call, result in zip(tool_calls, results):
+                print(f"{create_headline(f'Function Call Result: {tool_call.function.name}')} \n {result}")
+                chat_history.append(
+                    {"role": "tool", "tool_call_id": tool_call.id, "content": json.dumps(result)}
+                )
         else:
             # If there's no further function call, exit the loop
             print(create_headline("Task Completed"))